@@ -0,0 +1,60 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Drives generate_dql end to end at a fixed concurrency and reports throughput
+# and latency percentiles. Record a cassette once against live services, then
+# benchmark offline against it:
+#
+#   CASSETTE_MODE=record python3 backend/benchmark_pipeline.py
+#   CASSETTE_MODE=replay CASSETTE_REPLAY_LATENCY=1 python3 backend/benchmark_pipeline.py
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PROMPTS_FILE = os.path.join(PROJECT_ROOT, "context/examples_revised.json")
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "8"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "10"))
+
+sys.path.insert(0, PROJECT_ROOT)
+from dql_prompt_framework import generate_dql
+
+
+def timed_generate(prompt):
+    start = time.perf_counter()
+    try:
+        generate_dql(prompt)
+        ok = True
+    except Exception as e:
+        print(f"❌ {prompt!r}: {e}")
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def percentile(ordered, p):
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def benchmark():
+    with open(PROMPTS_FILE, "r", encoding="utf-8") as f:
+        prompts = [item["nl"] for item in json.load(f) if item.get("nl")]
+    workload = prompts * ROUNDS
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        results = list(pool.map(timed_generate, workload))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, ok in results if ok)
+    failures = sum(1 for _, ok in results if not ok)
+    print(f"\n{len(workload)} requests at concurrency {CONCURRENCY} in {elapsed:.2f}s "
+          f"({len(workload) / elapsed:.1f} req/s), {failures} failed")
+    if latencies:
+        print(f"latency p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    benchmark()
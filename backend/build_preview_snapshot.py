@@ -0,0 +1,178 @@
+import argparse
+import csv
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import logging
+from datetime import datetime
+
+# Builds the SQLite snapshot behind DQL previews (dql_preview.py) from metadata
+# exports, e.g. the CSV result of
+#   SELECT r_object_id, object_name, owner_name, r_creation_date, r_folder_path, ... FROM dm_document
+# Each export is streamed once and reservoir-sampled down to --sample-rows rows.
+# The sampling fraction is stored so previews can scale counts back up.
+# Columns are typed from the schema catalog and the standard dm_sysobject
+# attributes. Repeating folder paths (r_folder_path / folder_path, "|"-separated
+# in CSV) go into a separate table for FOLDER()/CABINET() predicates.
+#
+# Usage: python3 backend/build_preview_snapshot.py dm_document=exports/documents.csv \
+#            business_cab=exports/cabinets.jsonl [--sample-rows 50000] [--output path]
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+from dql_preview import (
+    DATE_FORMAT, FOLDERS_TABLE, META_TABLE, PREVIEW_SNAPSHOT_FILE, SYSOBJECT_ATTRIBUTES,
+    is_date_type, load_schema_types, sqlite_type
+)
+
+FOLDER_COLUMNS = ("r_folder_path", "folder_path")
+# Export date formats, tried in order (Documentum's default first)
+EXPORT_DATE_FORMATS = ["%m/%d/%Y %I:%M:%S %p", "%m/%d/%Y %H:%M:%S", "%m/%d/%Y", "%Y-%m-%dT%H:%M:%S",
+                       "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"]
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def read_records(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(f):
+                yield row
+
+
+def reservoir_sample(records, size, rng):
+    """(up to `size` uniformly sampled records, total record count) in one pass"""
+    sample, total = [], 0
+    for record in records:
+        total += 1
+        if len(sample) < size:
+            sample.append(record)
+        else:
+            j = rng.randrange(total)
+            if j < size:
+                sample[j] = record
+    return sample, total
+
+
+def parse_date(text):
+    for date_format in EXPORT_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).strftime(DATE_FORMAT)
+        except ValueError:
+            continue
+    return None
+
+
+def infer_datatype(values):
+    """Schema-style datatype for an exported column the schema does not describe"""
+    values = [str(v).strip() for v in values if v not in (None, "") and not isinstance(v, (list, dict))]
+    if not values:
+        return "Char"
+    if all(v.upper() in ("T", "F", "TRUE", "FALSE") for v in values):
+        return "Boolean"
+    if all(re.fullmatch(r"-?\d+", v) for v in values):
+        return "Integer"
+    if all(parse_date(v) for v in values):
+        return "Time/Date"
+    return "Char"
+
+
+def convert(value, datatype):
+    if value is None or value == "" or isinstance(value, (list, dict)):
+        return None
+    text = str(value).strip()
+    if is_date_type(datatype):
+        return parse_date(text)
+    column_type = sqlite_type(datatype)
+    if datatype.lower().startswith("boolean"):
+        return 1 if text.lower() in ("1", "t", "true", "yes") else 0
+    try:
+        if column_type == "INTEGER":
+            return int(float(text))
+        if column_type == "REAL":
+            return float(text)
+    except ValueError:
+        return None
+    return text
+
+
+def folder_paths(record):
+    for column in FOLDER_COLUMNS:
+        value = record.get(column)
+        if value:
+            values = value if isinstance(value, list) else str(value).split("|")
+            return [v.strip().rstrip("/") or "/" for v in values if v.strip()]
+    return []
+
+
+def build_snapshot(exports, sample_rows, output, seed=0):
+    schema_types = load_schema_types()
+    rng = random.Random(seed)
+    tmp_path = f"{output}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    db = sqlite3.connect(tmp_path)
+    db.execute(f"CREATE TABLE {META_TABLE} (object_type TEXT PRIMARY KEY, columns TEXT, sampled INTEGER, total INTEGER)")
+    db.execute(f"CREATE TABLE {FOLDERS_TABLE} (object_type TEXT, r_object_id TEXT, folder_path TEXT)")
+
+    for object_type, path in exports:
+        object_type = object_type.lower()
+        sample, total = reservoir_sample(read_records(path), sample_rows, rng)
+        sample = [{str(k).lower(): v for k, v in record.items()} for record in sample]
+
+        columns = dict(SYSOBJECT_ATTRIBUTES)
+        columns.update(schema_types.get(object_type, {}))
+        exported = {k for record in sample for k in record if k not in FOLDER_COLUMNS}
+        columns.update({k: infer_datatype(r.get(k) for r in sample) for k in sorted(exported) if k not in columns})
+        if object_type not in schema_types:
+            logging.info(f"'{object_type}' is not in the schema catalog; typing other columns from the export")
+
+        column_sql = ", ".join(f'"{name}" {sqlite_type(datatype)}' for name, datatype in columns.items())
+        db.execute(f'CREATE TABLE "{object_type}" ({column_sql})')
+        placeholders = ", ".join("?" for _ in columns)
+        db.executemany(
+            f'INSERT INTO "{object_type}" VALUES ({placeholders})',
+            ([convert(record.get(name), datatype) for name, datatype in columns.items()] for record in sample)
+        )
+        db.executemany(
+            f"INSERT INTO {FOLDERS_TABLE} VALUES (?, ?, ?)",
+            ((object_type, record.get("r_object_id"), p) for record in sample for p in folder_paths(record))
+        )
+        db.execute(f"INSERT INTO {META_TABLE} VALUES (?, ?, ?, ?)",
+                   (object_type, json.dumps(columns), len(sample), total))
+        logging.info(f"✅ {object_type}: sampled {len(sample)} of {total} rows, {len(columns)} columns")
+
+    db.execute(f"CREATE INDEX {FOLDERS_TABLE}_path ON {FOLDERS_TABLE} (folder_path, object_type)")
+    db.commit()
+    db.execute("VACUUM")
+    db.close()
+    os.replace(tmp_path, output)
+    logging.info(f"✅ Preview snapshot written to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the SQLite snapshot used for DQL previews")
+    parser.add_argument("exports", nargs="+", help="object_type=path to a CSV or .jsonl metadata export")
+    parser.add_argument("--sample-rows", type=int, default=50000, help="rows kept per object type")
+    parser.add_argument("--output", default=PREVIEW_SNAPSHOT_FILE)
+    args = parser.parse_args()
+
+    exports = []
+    for spec in args.exports:
+        object_type, _, path = spec.partition("=")
+        if not path:
+            parser.error(f"Expected object_type=path, got '{spec}'")
+        exports.append((object_type, path))
+    build_snapshot(exports, args.sample_rows, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import json
+import os
+import sys
+import logging
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+# Builds one summary vector per object type for type-scoped schema retrieval
+# (dql_type_index.py). A type's vector is the normalized centroid of its
+# attribute embeddings, so it reflects every attribute, not just the first few
+# that would fit in a single summary sentence. Schema sources are the corpus's
+# (dql_corpus.DATA_SOURCES), i.e. the ingested schema_catalog.jsonl, which
+# is streamed in batches: only a running vector sum and the attribute names are
+# kept per type.
+
+# --- Configuration ---
+MODEL_NAME = 'all-MiniLM-L6-v2'
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+OUTPUT_FILE = os.path.join(PROJECT_ROOT, "context/type_summaries.json")
+BATCH_SIZE = 256
+
+sys.path.insert(0, PROJECT_ROOT)
+from dql_corpus import DATA_SOURCES, batches, load_items
+
+SCHEMA_SOURCES = [s for s in DATA_SOURCES if s["type"] == "schema"]
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def schema_records():
+    for source_info in SCHEMA_SOURCES:
+        path = source_info["source"]
+        if source_info.get("optional") and not os.path.exists(path):
+            continue
+        try:
+            records = load_items(path)
+            for record in records:
+                if record.get("object_type") and record.get("source_text"):
+                    yield record
+        except Exception as e:
+            logging.error(f"❌ Failed to load schema from {path}: {e}")
+
+
+def build_type_summaries():
+    logging.info(f"Loading embedding model: {MODEL_NAME}")
+    model = SentenceTransformer(MODEL_NAME)
+
+    sums, attributes = {}, {}
+    for batch in batches(schema_records(), BATCH_SIZE):
+        vectors = model.encode([r["source_text"] for r in batch], batch_size=BATCH_SIZE,
+                               normalize_embeddings=True)
+        for record, vector in zip(batch, vectors):
+            object_type = record["object_type"]
+            if object_type in sums:
+                sums[object_type] += vector
+            else:
+                sums[object_type] = np.array(vector, dtype=np.float64)
+            attributes.setdefault(object_type, []).append(record["attribute"])
+    if not sums:
+        logging.error("❌ No schema attributes found")
+        return
+
+    summaries = []
+    for object_type, total in sorted(sums.items()):
+        names = attributes[object_type]
+        centroid = total / len(names)
+        centroid /= np.linalg.norm(centroid) or 1.0
+        summaries.append({
+            "object_type": object_type,
+            "attribute_count": len(names),
+            "source_text": f"Object: {object_type}\nAttributes: " + ", ".join(names),
+            "embedding": centroid.tolist()
+        })
+        logging.info(f"✅ Summarized {object_type} ({len(names)} attributes)")
+
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        json.dump(summaries, f, indent=2)
+    logging.info(f"✅ Saved {len(summaries)} type summaries to {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    build_type_summaries()
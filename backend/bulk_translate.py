@@ -0,0 +1,213 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Offline bulk NL -> DQL translation for spreadsheets of legacy report requests.
+# Rows are streamed from a CSV or JSON Lines file in batches; each batch is
+# embedded in one call (optionally across a process pool) and retrieved with a
+# single _msearch. LLM calls run in a bounded window that is kept full across
+# batches, so the next batch is embedded while earlier rows are still being
+# translated. Translations are appended to the output as they finish and their
+# row IDs are written to a checkpoint, so an interrupted run picks up where it
+# stopped:
+#
+#   python3 backend/bulk_translate.py requests.csv translated.jsonl --embed-workers 4 --llm-concurrency 8
+#
+# Failed rows go to a separate file (<output>.failed), rewritten on every run,
+# and are retried on the next run; each row ID appears in the output at most once.
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TEXT_COLUMNS = ["nl", "input", "query", "prompt", "request"]
+ID_COLUMNS = ["id", "request_id", "row_id"]
+
+sys.path.insert(0, PROJECT_ROOT)
+import dql_prompt_framework as framework
+
+
+def read_rows(path, text_column=None, id_column=None):
+    """Yield (row_id, text) pairs one at a time; rows without an ID are numbered"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".jsonl"):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = csv.DictReader(f)
+        for number, record in enumerate(records, start=1):
+            text_key = text_column or next((c for c in TEXT_COLUMNS if c in record), None)
+            id_key = id_column or next((c for c in ID_COLUMNS if c in record), None)
+            text = str(record.get(text_key) or "").strip() if text_key else ""
+            row_id = str(record[id_key]) if id_key and record.get(id_key) not in (None, "") else str(number)
+            yield row_id, text
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def load_translated(path):
+    """IDs already translated in the output; covers rows written just before a crash but not checkpointed"""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Cut short by a crash; the row is translated again
+            if record.get("error") is None and record.get("id") is not None:
+                done.add(str(record["id"]))
+    return done
+
+
+def end_with_newline(path):
+    """A line cut short by a crash must not swallow the next record appended after it"""
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+
+def prepared(rows, batch_size, pool):
+    """(row_id, text, context, query vector) for non-empty rows, embedded and retrieved a batch at a time"""
+    for batch in batches(rows, batch_size):
+        batch = [(row_id, text) for row_id, text in batch if text]
+        if not batch:
+            continue
+        texts = [text for _, text in batch]
+        vectors = framework.embed_queries(texts, pool)
+        contexts = framework.retrieve_contexts(texts, query_vectors=vectors)
+        for (row_id, text), context, vector in zip(batch, contexts, vectors):
+            yield row_id, text, context, vector
+
+
+def translate(row_id, text, context, query_vector):
+    """Result record for one row; errors are reported in the record instead of raised"""
+    start = time.perf_counter()
+    try:
+        if framework.reranker is not None:
+            context = framework.reranker.rerank(text, context)
+        text_out, model_used = framework.llm.generate(framework.build_prompt(text, context),
+                                                      preferred=framework.choose_model(text, query_vector))
+        return {"id": row_id, "input": text, "dql": text_out.strip(), "model": model_used,
+                "error": None, "seconds": round(time.perf_counter() - start, 3)}
+    except Exception as e:
+        return {"id": row_id, "input": text, "dql": None, "model": None,
+                "error": f"{type(e).__name__}: {e}", "seconds": round(time.perf_counter() - start, 3)}
+
+
+def run(args):
+    checkpoint_path = args.checkpoint or args.output + ".checkpoint"
+    failed_path = args.failed or args.output + ".failed"
+    done = load_checkpoint(checkpoint_path) | load_translated(args.output)
+    if done:
+        print(f"↩️ Resuming: {len(done)} rows already translated")
+
+    pool = None
+    if args.embed_workers > 1:
+        pool = framework.embed_model.start_multi_process_pool(["cpu"] * args.embed_workers)
+
+    translated, failures, skipped = 0, [], 0
+    start = time.perf_counter()
+    last_report = 0
+
+    def pending_rows():
+        nonlocal skipped
+        for row_id, text in read_rows(args.input, args.text_column, args.id_column):
+            if row_id in done:
+                continue
+            if not text:
+                skipped += 1
+            yield row_id, text
+
+    # Twice the LLM concurrency in flight, so workers never idle while the next batch is embedded
+    window = args.llm_concurrency * 2
+    end_with_newline(args.output)
+    try:
+        with open(args.output, "a", encoding="utf-8") as out, \
+                open(checkpoint_path, "a", encoding="utf-8") as checkpoint, \
+                open(failed_path, "w", encoding="utf-8") as failed, \
+                ThreadPoolExecutor(max_workers=args.llm_concurrency) as executor:
+            rows = prepared(pending_rows(), args.batch_size, pool)
+            in_flight = set()
+            exhausted = False
+            while in_flight or not exhausted:
+                while not exhausted and len(in_flight) < window:
+                    row = next(rows, None)
+                    if row is None:
+                        exhausted = True
+                    else:
+                        in_flight.add(executor.submit(translate, *row))
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    if result["error"] is None:
+                        translated += 1
+                        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        # Output first, then checkpoint; resuming also reads the output, so no row is written twice
+                        out.flush()
+                        checkpoint.write(result["id"] + "\n")
+                    else:
+                        failures.append(result)
+                        failed.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        print(f"❌ Row {result['id']}: {result['error']}")
+                checkpoint.flush()
+                failed.flush()
+
+                finished_rows = translated + len(failures)
+                if finished_rows - last_report >= args.batch_size:
+                    last_report = finished_rows
+                    total_seconds = time.perf_counter() - start
+                    print(f"📦 {finished_rows} rows done: {translated} ok, {len(failures)} failed, "
+                          f"{translated / total_seconds:.2f} rows/s overall")
+    finally:
+        if pool is not None:
+            framework.embed_model.stop_multi_process_pool(pool)
+
+    elapsed = time.perf_counter() - start
+    print(f"\n✅ Translated {translated} rows in {elapsed:.1f}s, {len(failures)} failed, {skipped} empty rows skipped")
+    for result in failures:
+        print(f"  - {result['id']}: {result['error']}")
+    if failures:
+        print(f"Failed rows are in {failed_path} and are retried on the next run")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Translate a CSV/JSONL file of NL requests into DQL")
+    parser.add_argument("input", help="CSV or .jsonl file with one request per row")
+    parser.add_argument("output", help="JSON Lines file the translations are appended to")
+    parser.add_argument("--checkpoint", help="IDs of finished rows (default: <output>.checkpoint)")
+    parser.add_argument("--failed", help="JSON Lines file of this run's failed rows (default: <output>.failed)")
+    parser.add_argument("--text-column", help=f"column with the request text (default: first of {TEXT_COLUMNS})")
+    parser.add_argument("--id-column", help=f"column with a stable row ID (default: first of {ID_COLUMNS}, else row number)")
+    parser.add_argument("--batch-size", type=int, default=64, help="rows embedded and retrieved together")
+    parser.add_argument("--embed-workers", type=int, default=1, help="embedding processes (1 = in-process)")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="LLM calls in flight at once")
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sys
+import logging
+import numpy as np
+
+# Collapses near-duplicate feedback examples ("how many documents in my cabinet",
+# "count the docs in my cabinet", ...) into one representative each, so repeated
+# good ratings do not crowd diverse examples out of the retrieved context.
+#
+# Examples are grouped greedily: each one joins the most similar existing cluster
+# if the cosine similarity of their NL embeddings reaches CLUSTER_THRESHOLD,
+# otherwise it starts a new cluster. Similarities are computed block-wise as one
+# matrix product against all representatives. Good and bad feedback are never
+# merged. The representative is the member with the highest score (newest on
+# ties) and carries the summed score and the cluster size.
+#
+# Cluster membership is kept in CLUSTERS_FILE, so later runs only place examples
+# that are new since the last run; pass --full (or change the threshold) to
+# recluster everything.
+#
+# Usage: python3 backend/compact_feedback_examples.py [--full]
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+EXAMPLES_FILE = os.path.join(PROJECT_ROOT, "context/feedback_examples.json")
+CLUSTERS_FILE = os.path.join(PROJECT_ROOT, "context/feedback_clusters.json")
+CLUSTER_THRESHOLD = float(os.getenv("FEEDBACK_CLUSTER_THRESHOLD", "0.92"))
+BLOCK_ROWS = 1024
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def example_key(entry):
+    text = " ".join(str(entry.get("nl", "")).lower().split()) + "\n" + " ".join(str(entry.get("dql", "")).split())
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def load_examples(path=EXAMPLES_FILE):
+    """Examples keyed by content; exact repeats are folded together with their scores summed"""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+
+    examples = {}
+    for entry in entries:
+        if not entry.get("nl") or not entry.get("dql") or not entry.get("embedding"):
+            continue
+        # Already-compacted entries keep the weight of the ratings they stand for
+        size = entry.get("cluster_size", 1)
+        key = example_key(entry)
+        if key in examples:
+            examples[key]["score"] += entry.get("score", 0)
+            examples[key]["cluster_size"] += size
+            examples[key]["timestamp"] = max(examples[key].get("timestamp", ""), entry.get("timestamp", ""))
+        else:
+            examples[key] = dict(entry, score=entry.get("score", 0), cluster_size=size)
+    return examples
+
+
+def load_clusters(path, threshold):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("threshold") != threshold:
+        logging.info(f"Threshold changed ({state.get('threshold')} -> {threshold}), reclustering everything")
+        return []
+    return state.get("clusters", [])
+
+
+def rank(example):
+    return example["score"], example.get("timestamp", "")
+
+
+def unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+
+def assign(keys, examples, clusters, threshold):
+    """Add `keys` to `clusters` (lists of keys, representative first) in place"""
+    representatives = unit_rows([examples[c[0]]["embedding"] for c in clusters]) if clusters else None
+
+    for start in range(0, len(keys), BLOCK_ROWS):
+        block = keys[start:start + BLOCK_ROWS]
+        vectors = unit_rows([examples[k]["embedding"] for k in block])
+        if representatives is not None:
+            similarities = vectors @ representatives.T
+            best = similarities.argmax(axis=1)
+            best_scores = similarities[np.arange(len(block)), best]
+        else:
+            best_scores = np.full(len(block), -1.0)
+
+        # Members of this block that start new clusters are compared to each other as they appear
+        new_rows = []
+        for i, key in enumerate(block):
+            if best_scores[i] >= threshold:
+                clusters[best[i]].append(key)
+                continue
+            if new_rows:
+                local = vectors[new_rows] @ vectors[i]
+                j = int(local.argmax())
+                if local[j] >= threshold:
+                    clusters[len(clusters) - len(new_rows) + j].append(key)
+                    continue
+            clusters.append([key])
+            new_rows.append(i)
+
+        if new_rows:
+            added = vectors[new_rows]
+            representatives = added if representatives is None else np.vstack([representatives, added])
+
+
+def compact(full=False, threshold=CLUSTER_THRESHOLD, examples_file=EXAMPLES_FILE, clusters_file=CLUSTERS_FILE):
+    examples = load_examples(examples_file)
+    previous = [] if full else load_clusters(clusters_file, threshold)
+
+    # Keep previous clusters for examples that still exist; feedback removed from the CSV drops out
+    clustered = set()
+    groups = {True: [], False: []}
+    for members in previous:
+        members = [k for k in members if k in examples and k not in clustered]
+        if members:
+            clustered.update(members)
+            groups[examples[members[0]]["score"] > 0].append(members)
+
+    new_keys = [k for k in examples if k not in clustered]
+    # Strongest examples first, so they become the representatives new variants are matched against
+    new_keys.sort(key=lambda k: rank(examples[k]), reverse=True)
+    for positive, clusters in groups.items():
+        assign([k for k in new_keys if (examples[k]["score"] > 0) == positive], examples, clusters, threshold)
+
+    compacted, clusters = [], []
+    for members in groups[True] + groups[False]:
+        members.sort(key=lambda k: rank(examples[k]), reverse=True)
+        clusters.append(members)
+        representative = dict(examples[members[0]])
+        representative["score"] = sum(examples[k]["score"] for k in members)
+        representative["cluster_size"] = sum(examples[k]["cluster_size"] for k in members)
+        compacted.append(representative)
+
+    with open(examples_file, "w", encoding="utf-8") as f:
+        json.dump(compacted, f, indent=2)
+    with open(clusters_file, "w", encoding="utf-8") as f:
+        json.dump({"threshold": threshold, "clusters": clusters}, f)
+
+    logging.info(f"✅ {len(examples)} distinct feedback examples ({len(new_keys)} new) compacted into "
+                 f"{len(compacted)} representatives at similarity >= {threshold}")
+
+
+if __name__ == "__main__":
+    compact(full="--full" in sys.argv[1:])
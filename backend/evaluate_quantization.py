@@ -0,0 +1,72 @@
+import json
+import os
+import sys
+import numpy as np
+
+# Measures how much top-k retrieval changes when the corpus is stored compressed.
+# Every example/feedback NL in all_embeddings.json is used as a query; the float32
+# top-k over the full corpus is the ground truth for each storage mode.
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+INPUT_FILE = os.path.join(PROJECT_ROOT, "context/all_embeddings.json")
+TOP_K = int(os.getenv("EVAL_TOP_K", "10"))
+PCA_DIMS = [int(d) for d in os.getenv("EVAL_PCA_DIMS", "64,128,192").split(",") if d]
+
+sys.path.insert(0, PROJECT_ROOT)
+from dql_vectors import VECTOR_DTYPES, dot_scores, fit_pca, project, quantize
+
+
+def load_corpus(path):
+    with open(path, "r", encoding="utf-8") as f:
+        all_data = json.load(f)
+    docs = [
+        doc
+        for records in all_data.values() if isinstance(records, list)
+        for doc in records if isinstance(doc, dict) and isinstance(doc.get("embedding"), list)
+    ]
+    vectors = np.asarray([doc["embedding"] for doc in docs], dtype=np.float32)
+    query_rows = [i for i, doc in enumerate(docs) if doc.get("nl")]
+    return vectors, query_rows
+
+
+def top_k(scores, exclude, k):
+    scores = scores.copy()
+    scores[exclude] = -np.inf
+    return set(np.argpartition(-scores, k)[:k])
+
+
+def recall(vectors, query_rows, pca, dtype, truth):
+    matrix = quantize(project(vectors, pca), dtype)
+    queries = project(vectors[query_rows], pca)
+    hits = 0
+    for row, query, expected in zip(query_rows, queries, truth):
+        hits += len(top_k(dot_scores(matrix, query), row, TOP_K) & expected)
+    return hits / (len(query_rows) * TOP_K), matrix.nbytes
+
+
+def evaluate():
+    vectors, query_rows = load_corpus(INPUT_FILE)
+    if not query_rows or len(vectors) <= TOP_K:
+        print("❌ Not enough documents in all_embeddings.json to evaluate. Run generate_embeddings.py first.")
+        return
+
+    exact = project(vectors, None)
+    truth = [top_k(exact @ exact[row], row, TOP_K) for row in query_rows]
+    print(f"Corpus: {len(vectors)} vectors, {len(query_rows)} example queries, recall@{TOP_K} vs float32\n")
+    print(f"{'dims':>6} {'dtype':>8} {'recall':>8} {'size (KB)':>10}")
+
+    configs = [(None, dtype) for dtype in VECTOR_DTYPES]
+    for dims in PCA_DIMS:
+        if dims < min(vectors.shape):
+            pca = fit_pca(vectors, dims)
+            configs += [(pca, dtype) for dtype in VECTOR_DTYPES]
+
+    for pca, dtype in configs:
+        dims = vectors.shape[1] if pca is None else pca[1].shape[0]
+        score, size = recall(vectors, query_rows, pca, dtype, truth)
+        print(f"{dims:>6} {dtype:>8} {score:>8.3f} {size / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    evaluate()
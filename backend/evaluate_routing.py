@@ -0,0 +1,123 @@
+import argparse
+import os
+import re
+import sys
+import time
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+# Offline evaluation of complexity-based model routing (dql_router.py) on our
+# NL -> DQL examples. Each example is classified leave-one-out (the router
+# never sees the example itself), and the gold DQL's structural complexity is
+# used as the label. For a sweep of thresholds the script reports routing
+# accuracy, the share of requests sent to the fast model, complex requests
+# wrongly sent to it, and the projected median latency.
+#
+# With --live, both models answer every example through the real prompt
+# pipeline. The report then shows measured latencies and exact-match DQL
+# accuracy for each routing threshold instead of projections.
+#
+# Usage: python3 backend/evaluate_routing.py [--thresholds 0.5,1,1.5,2] [--live]
+
+# --- Configuration ---
+MODEL_NAME = 'all-MiniLM-L6-v2'
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# Typical latencies used for projections when not measuring live
+FAST_MODEL_LATENCY_MS = float(os.getenv("FAST_MODEL_LATENCY_MS", "1500"))
+STRONG_MODEL_LATENCY_MS = float(os.getenv("STRONG_MODEL_LATENCY_MS", "7000"))
+
+sys.path.insert(0, PROJECT_ROOT)
+from dql_entities import EntityRecognizer
+from dql_router import ComplexityRouter, dql_complexity, load_examples
+from dql_vectors import load_pca, project
+
+
+def normalize_dql(dql):
+    text = re.sub(r"^```\w*|```$", "", str(dql).strip()).strip().rstrip(";")
+    return re.sub(r"\s+", " ", text).lower()
+
+
+def leave_one_out(examples, vectors, recognizer, threshold):
+    decisions = []
+    for i, (nl, _) in enumerate(examples):
+        others = [e for j, e in enumerate(examples) if j != i]
+        router = ComplexityRouter(others, np.delete(vectors, i, axis=0), simple_max=threshold, log_path=None)
+        decisions.append(router.classify(nl, vectors[i], recognizer))
+    return decisions
+
+
+def measure_live(examples):
+    """Per example: {model: (latency ms, exact match)} for the fast and the strong model"""
+    import dql_prompt_framework as framework
+    if not framework.GEMINI_FAST_MODEL:
+        sys.exit("Set GEMINI_FAST_MODEL (and GEMINI_MODEL) to measure live")
+
+    results = []
+    for nl, gold in examples:
+        prompt = framework.build_prompt(nl, framework.retrieve_context(nl))
+        measured = {}
+        for model_name in (framework.GEMINI_FAST_MODEL, framework.GEMINI_MODEL):
+            start = time.perf_counter()
+            try:
+                text = framework.llm.clients[model_name](prompt, framework.llm.deadline)
+                match = normalize_dql(text) == normalize_dql(gold)
+            except Exception as e:
+                print(f"❌ {model_name} failed on {nl!r}: {e}")
+                match = False
+            measured[model_name] = ((time.perf_counter() - start) * 1000, match)
+        results.append(measured)
+    return results, framework.GEMINI_FAST_MODEL, framework.GEMINI_MODEL
+
+
+def evaluate(thresholds, live=False):
+    examples = load_examples()
+    if len(examples) < 2:
+        sys.exit("Need at least two examples to evaluate routing")
+    model = SentenceTransformer(MODEL_NAME)
+    vectors = project(model.encode([nl for nl, _ in examples]), load_pca())
+    recognizer = EntityRecognizer.load()
+    live_results = measure_live(examples) if live else None
+
+    print(f"\n{len(examples)} examples; projected latencies fast {FAST_MODEL_LATENCY_MS:.0f} ms, "
+          f"strong {STRONG_MODEL_LATENCY_MS:.0f} ms" if not live else f"\n{len(examples)} examples, measured live")
+    print(f"{'threshold':>9} {'accuracy':>9} {'to fast':>8} {'complex->fast':>14} {'p50 ms':>8} "
+          f"{'mean ms':>8} {'dql match':>10}")
+
+    for threshold in thresholds:
+        labels = [dql_complexity(dql) <= threshold for _, dql in examples]
+        decisions = leave_one_out(examples, vectors, recognizer, threshold)
+        routed_fast = [d.simple for d in decisions]
+        accuracy = np.mean([r == l for r, l in zip(routed_fast, labels)])
+        under_routed = sum(1 for r, l in zip(routed_fast, labels) if r and not l)
+
+        match = None
+        if live_results:
+            results, fast_name, strong_name = live_results
+            picked = [r[fast_name] if fast else r[strong_name] for r, fast in zip(results, routed_fast)]
+            latencies = [latency for latency, _ in picked]
+            match = np.mean([ok for _, ok in picked])
+        else:
+            latencies = [FAST_MODEL_LATENCY_MS if fast else STRONG_MODEL_LATENCY_MS for fast in routed_fast]
+
+        print(f"{threshold:>9.2f} {accuracy:>9.1%} {np.mean(routed_fast):>8.1%} {under_routed:>14} "
+              f"{np.median(latencies):>8.0f} {np.mean(latencies):>8.0f} "
+              f"{'' if match is None else f'{match:.1%}':>10}")
+
+    if live_results:
+        results, fast_name, strong_name = live_results
+        for name in (fast_name, strong_name):
+            latencies = [r[name][0] for r in results]
+            print(f"all to {name}: p50 {np.median(latencies):.0f} ms, "
+                  f"dql match {np.mean([r[name][1] for r in results]):.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate complexity-based model routing on the examples")
+    parser.add_argument("--thresholds", default="0.5,1,1.5,2,3", help="comma-separated ROUTER_SIMPLE_MAX values")
+    parser.add_argument("--live", action="store_true", help="call both models and measure real latency/accuracy")
+    args = parser.parse_args()
+    evaluate([float(t) for t in args.thresholds.split(",")], args.live)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import logging
+
+# Streams schema sources into clean schema records, context/schema_catalog.jsonl,
+# the only schema source of the retrieval corpus (dql_corpus.py), the entity
+# recognizer and previews. The hand-maintained flattened_schema.json and the
+# OCR'd business_doc_schema.json are always ingested; Documentum type dumps
+# (CSV, JSON array or JSON Lines) can be added. Rows are read, normalized and
+# written one at a time, so catalogs with 100k+ attributes never have to fit
+# in memory; only the (type, attribute) keys needed for dedup are kept. A first
+# pass collects every type's supertype, so inherited attributes are dropped
+# whatever order the types are listed in.
+#
+# Usage: python3 backend/ingest_schema.py [type_dump.csv|.json|.jsonl ...] [--output path]
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+OUTPUT_FILE = os.path.join(PROJECT_ROOT, "context/schema_catalog.jsonl")
+# Ingested on every run, ahead of any type dumps given on the command line
+SCHEMA_INPUTS = [
+    os.path.join(PROJECT_ROOT, "flattened_schema.json"),
+    os.path.join(PROJECT_ROOT, "context/business_doc_schema.json")
+]
+READ_CHUNK_SIZE = 1 << 16
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Accepted column names for each field, as found in dm_type exports and our hand-built files
+FIELD_ALIASES = {
+    "object_type": ["object_type", "type_name", "r_type_name", "name"],
+    "attribute": ["attribute", "attr_name"],
+    "datatype": ["type", "attr_type", "datatype", "data_type"],
+    "length": ["attr_length", "length"],
+    "description": ["description", "label", "label_text", "attr_label"],
+    "super_type": ["super_type", "super_name"],
+    "inherited": ["inherited", "is_inherited"]
+}
+
+# dm_type attr_type codes
+DATATYPE_CODES = {"0": "Boolean", "1": "Integer", "2": "Char", "3": "ID", "4": "Time/Date", "5": "Double"}
+SIMPLE_DATATYPES = {
+    "boolean": "Boolean", "bool": "Boolean",
+    "integer": "Integer", "int": "Integer",
+    "double": "Double", "float": "Double",
+    "id": "ID",
+    "time/date": "Time/Date", "time": "Time/Date", "date": "Time/Date", "datetime": "Time/Date"
+}
+# OCR sometimes reads a leading table border as "I" or "l", e.g. "Ichar(5)"
+SIZED_DATATYPE = re.compile(r"^[il]?(char|string)\s*\(\s*(\d+)\s*\)$")
+NAME_PATTERN = re.compile(r"^[a-z][a-z0-9_-]*$")
+# Table borders and quotes left around names and datatypes by OCR
+DATATYPE_DEBRIS = re.compile(r"[|\s'\"“”‘’]+")
+NAME_DEBRIS = re.compile(r"^[|\[\]'\"“”‘’]+|[|\[\]'\"“”‘’.]+$")
+DESCRIPTION_JUNK = re.compile(r"[|\[\]{}<>~=*«»“”‘’\\]+")
+
+
+# --- Readers ---
+
+def iter_csv(path):
+    csv.field_size_limit(sys.maxsize)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def iter_json(path):
+    """Records from a top-level JSON array (decoded element by element) or JSON Lines"""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(READ_CHUNK_SIZE).lstrip()
+        if not buf.startswith("["):
+            for line in (buf + f.readline()).splitlines():
+                if line.strip():
+                    yield json.loads(line)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        buf, eof = buf[1:], False
+        while True:
+            buf = buf.lstrip().lstrip(",").lstrip()
+            if buf.startswith("]"):
+                return
+            try:
+                record, end = decoder.raw_decode(buf)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buf += chunk
+                continue
+            yield record
+            buf = buf[end:]
+            if len(buf) < READ_CHUNK_SIZE and not eof:
+                chunk = f.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buf += chunk
+
+
+def iter_rows(path):
+    """Flat attribute rows; type definitions with a nested "attributes" list are expanded"""
+    records = iter_csv(path) if path.lower().endswith(".csv") else iter_json(path)
+    for record in records:
+        if isinstance(record, dict) and isinstance(record.get("attributes"), list):
+            type_fields = {k: v for k, v in record.items() if k != "attributes"}
+            type_name = pick(type_fields, "object_type")
+            for attr in record["attributes"]:
+                if isinstance(attr, dict):
+                    # Nested attributes often use "name" for the attribute itself
+                    attribute = pick(attr, "attribute") or attr.get("name")
+                    yield {**type_fields, **attr, "object_type": type_name, "attribute": attribute}
+        elif isinstance(record, dict):
+            yield record
+
+
+# --- Normalization ---
+
+def pick(row, field):
+    for key in FIELD_ALIASES[field]:
+        value = row.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def normalize_name(value):
+    name = NAME_DEBRIS.sub("", re.sub(r"\s+", "", str(value or ""))).lower()
+    return name if NAME_PATTERN.match(name) else None
+
+
+def normalize_datatype(value, length=None):
+    # Pipes are table borders from OCR'd documentation, e.g. "|char(128)"
+    key = DATATYPE_DEBRIS.sub("", str(value or ""))
+    key = DATATYPE_CODES.get(key, key).lower()
+    if key in SIMPLE_DATATYPES:
+        return SIMPLE_DATATYPES[key]
+    sized = SIZED_DATATYPE.match(key)
+    if sized:
+        return f"Char ({int(sized.group(2))})"
+    if key in ("char", "string") and str(length or "").strip().isdigit():
+        return f"Char ({int(length)})"
+    return None
+
+
+def normalize_description(value, attribute):
+    text = DESCRIPTION_JUNK.sub(" ", str(value or ""))
+    text = re.sub(r"\s+", " ", text).strip(" .,;:-_()")
+    # Descriptions with no real words fall back to the attribute name, as in flattened_schema.json
+    if len(re.findall(r"[A-Za-z]{2,}", text)) == 0:
+        text = attribute.replace("_", " ")
+    return text
+
+
+def normalize_row(row):
+    object_type = normalize_name(pick(row, "object_type"))
+    attribute = normalize_name(pick(row, "attribute"))
+    datatype = normalize_datatype(pick(row, "datatype"), pick(row, "length"))
+    if not object_type or not attribute or not datatype:
+        return None
+    description = normalize_description(pick(row, "description"), attribute)
+    return {
+        "object_type": object_type,
+        "attribute": attribute,
+        "type": datatype,
+        "description": description,
+        "source_text": f"Object: {object_type}\nAttribute: {attribute}\nType: {datatype}\nDescription: {description}",
+        "super_type": normalize_name(pick(row, "super_type")),
+        "inherited": str(pick(row, "inherited") or "").strip().lower() in ("1", "true", "t", "yes", "y")
+    }
+
+
+# --- Ingestion ---
+
+def normalized_rows(input_paths):
+    for path in input_paths:
+        for row in iter_rows(path):
+            yield normalize_row(row)
+
+
+def ingest_schema(input_paths=(), output_path=OUTPUT_FILE, include_defaults=True):
+    input_paths = (SCHEMA_INPUTS if include_defaults else []) + list(input_paths)
+
+    # First pass: supertypes and the attributes each type defines itself
+    super_types, defined = {}, set()
+    for record in normalized_rows(input_paths):
+        if record is None:
+            continue
+        object_type, super_type = record["object_type"], record["super_type"]
+        if super_type and super_type != object_type:
+            super_types.setdefault(object_type, super_type)
+        if not record["inherited"]:
+            defined.add((object_type, record["attribute"]))
+
+    def defined_by_ancestor(object_type, attribute):
+        seen = set()
+        parent = super_types.get(object_type)
+        while parent and parent not in seen:
+            if (parent, attribute) in defined:
+                return True
+            seen.add(parent)
+            parent = super_types.get(parent)
+        return False
+
+    # Second pass: write each attribute once, on the type that defines it
+    emitted = set()
+    stats = {"read": 0, "malformed": 0, "inherited": 0, "duplicate": 0, "written": 0}
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        for record in normalized_rows(input_paths):
+            stats["read"] += 1
+            if record is None:
+                stats["malformed"] += 1
+                continue
+
+            object_type, attribute = record["object_type"], record["attribute"]
+            record.pop("super_type")
+            if record.pop("inherited") or defined_by_ancestor(object_type, attribute):
+                stats["inherited"] += 1
+                continue
+            if (object_type, attribute) in emitted:
+                stats["duplicate"] += 1
+                continue
+
+            emitted.add((object_type, attribute))
+            out.write(json.dumps(record) + "\n")
+            stats["written"] += 1
+            if stats["written"] % 10000 == 0:
+                logging.info(f"... {stats['written']} attributes written")
+    # The corpus watcher never sees a half-written catalog
+    os.replace(tmp_path, output_path)
+
+    logging.info(f"✅ Read {stats['read']} rows: wrote {stats['written']}, dropped {stats['malformed']} malformed, "
+                 f"{stats['inherited']} inherited and {stats['duplicate']} duplicate -> {output_path}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize schema sources into context/schema_catalog.jsonl")
+    parser.add_argument("dumps", nargs="*", help="Documentum type dumps (.csv, .json or .jsonl) to add")
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    args = parser.parse_args()
+    ingest_schema(args.dumps, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+import sys
+
+# Reports the memory of a running gunicorn deployment of dql_server and checks
+# each worker against the per-worker budget from dql_project_summary.txt.
+# RSS counts shared pages in every process, so the figures that matter are
+# USS (pages private to a process: what one more worker costs) and PSS (shared
+# pages split between their users: the sum is the true total). Linux only.
+#
+# Usage: python3 backend/measure_worker_memory.py [master_pid]
+# (defaults to the pid in GUNICORN_PIDFILE, as written by gunicorn.conf.py)
+
+# --- Configuration ---
+PIDFILE = os.getenv("GUNICORN_PIDFILE", "/tmp/dql_server.pid")
+WORKER_BUDGET_MB = float(os.getenv("WORKER_MEMORY_BUDGET_MB", "150"))
+
+
+def memory_kb(pid):
+    """RSS, PSS and USS of a process in kB, from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    }
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children", "r") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def measure(master_pid):
+    processes = [("master", master_pid)] + [("worker", pid) for pid in children(master_pid)]
+    totals = {"rss": 0, "pss": 0}
+    over_budget = []
+
+    print(f"{'role':<8} {'pid':>8} {'RSS MB':>9} {'PSS MB':>9} {'USS MB':>9}")
+    for role, pid in processes:
+        memory = memory_kb(pid)
+        totals["rss"] += memory["rss"]
+        totals["pss"] += memory["pss"]
+        print(f"{role:<8} {pid:>8} {memory['rss'] / 1024:>9.1f} {memory['pss'] / 1024:>9.1f} {memory['uss'] / 1024:>9.1f}")
+        if role == "worker" and memory["uss"] / 1024 > WORKER_BUDGET_MB:
+            over_budget.append(pid)
+
+    workers = len(processes) - 1
+    print(f"\n{workers} workers: total PSS {totals['pss'] / 1024:.1f} MB "
+          f"(naive RSS sum {totals['rss'] / 1024:.1f} MB)")
+    if over_budget:
+        print(f"❌ Workers over the {WORKER_BUDGET_MB:.0f} MB private budget: {over_budget}")
+        return 1
+    print(f"✅ All workers within the {WORKER_BUDGET_MB:.0f} MB private budget")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        master = int(sys.argv[1])
+    else:
+        with open(PIDFILE, "r") as f:
+            master = int(f.read().strip())
+    sys.exit(measure(master))
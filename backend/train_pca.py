@@ -0,0 +1,46 @@
+import json
+import os
+import sys
+import logging
+import numpy as np
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+INPUT_FILE = os.path.join(PROJECT_ROOT, "context/all_embeddings.json")
+OUTPUT_FILE = os.path.join(PROJECT_ROOT, "context/pca.npz")
+PCA_DIMS = int(os.getenv("PCA_DIMS", "128"))
+
+sys.path.insert(0, PROJECT_ROOT)
+from dql_vectors import fit_pca, save_pca
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def load_corpus_vectors(path):
+    with open(path, "r", encoding="utf-8") as f:
+        all_data = json.load(f)
+    return [
+        doc["embedding"]
+        for records in all_data.values() if isinstance(records, list)
+        for doc in records if isinstance(doc, dict) and isinstance(doc.get("embedding"), list)
+    ]
+
+
+def train_pca():
+    vectors = np.asarray(load_corpus_vectors(INPUT_FILE), dtype=np.float32)
+    if len(vectors) < PCA_DIMS:
+        logging.error(f"❌ Need at least {PCA_DIMS} vectors to train {PCA_DIMS} components, found {len(vectors)}")
+        return
+
+    mean, components = fit_pca(vectors, PCA_DIMS)
+    centered = vectors - mean
+    kept = np.linalg.norm(centered @ components.T) ** 2 / np.linalg.norm(centered) ** 2
+    save_pca(OUTPUT_FILE, (mean, components))
+    logging.info(f"✅ Trained PCA {vectors.shape[1]} -> {PCA_DIMS} dims on {len(vectors)} vectors "
+                 f"({kept:.1%} of variance kept), saved to {OUTPUT_FILE}")
+    logging.info("Set PCA_FILE to this path for both upload_to_elasticsearch.py and the server, "
+                 "and check recall with backend/evaluate_quantization.py")
+
+
+if __name__ == "__main__":
+    train_pca()
@@ -35,6 +35,21 @@ const msalConfig = {
   }
 };
 const msalInstance = new PublicClientApplication(msalConfig);
+// Scope of the DQL API's app registration; the server takes the user and groups from this token
+const API_SCOPES = [import.meta.env.VITE_API_SCOPE || `api://${msalConfig.auth.clientId}/access_as_user`];
+
+// Bearer token for the DQL API, or no header when signed out (the server then answers anonymously)
+async function apiAuthHeaders() {
+  const account = msalInstance.getActiveAccount() || msalInstance.getAllAccounts()[0];
+  if (!account) return {};
+  try {
+    const { accessToken } = await msalInstance.acquireTokenSilent({ account, scopes: API_SCOPES });
+    return { Authorization: `Bearer ${accessToken}` };
+  } catch (error) {
+    console.error(error);
+    return {};
+  }
+}
 
 // Helper to fetch the user's profile photo from Microsoft Graph
 async function fetchUserPhoto(accessToken) {
@@ -182,20 +197,97 @@ const DQLApp = () => {
   const [showCommentModal, setShowCommentModal] = useState(false);
   const [commentText, setCommentText] = useState("");
   const [pendingFeedbackType, setPendingFeedbackType] = useState(null); // 'good' or 'bad'
+  const [sessionId, setSessionId] = useState(null); // Session of the current query, used by "Refine DQL"
+  const [suggestions, setSuggestions] = useState([]); // Known NL -> DQL pairs matching the input
+  const [preview, setPreview] = useState(null); // Estimated count and sample rows for the current query
+  const pickedSuggestion = useRef(null); // Text of the last picked suggestion, which must not reopen the list
 
-  const handleSubmit = async (e) => {
-    e.preventDefault();
+  // Debounced type-ahead: ready answers for known questions, without a Gemini call
+  useEffect(() => {
+    if (input.trim().length < 3 || input === pickedSuggestion.current) {
+      setSuggestions([]);
+      return;
+    }
+    pickedSuggestion.current = null;
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const res = await fetch(
+          `http://localhost:8000/suggest?q=${encodeURIComponent(input)}`,
+          { signal: controller.signal }
+        );
+        const data = await res.json();
+        setSuggestions(data.suggestions || []);
+      } catch (error) {
+        if (error.name !== "AbortError") console.error(error);
+      }
+    }, 150);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [input]);
+
+  const endSession = () => {
+    if (sessionId) {
+      fetch(`http://localhost:8000/session/${sessionId}`, { method: "DELETE" }).catch(console.error);
+    }
+    setSessionId(null);
+  };
+
+  // Shows a known answer and seeds a new session with it, so "Refine DQL" refines what is on screen
+  const useSuggestion = async (suggestion) => {
+    const newQueryData = {
+      input: suggestion.nl,
+      query: suggestion.dql,
+      timestamp: new Date().toISOString()
+    };
+    endSession();
+    pickedSuggestion.current = suggestion.nl;
+    setInput(suggestion.nl);
+    setSuggestions([]);
+    setGeneratedQuery(suggestion.dql);
+    setCurrentQueryData(newQueryData);
+    setFeedbackGiven(false);
+    setQueryHistory([newQueryData, ...queryHistory]);
+    try {
+      const res = await fetch("http://localhost:8000/session", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ input: suggestion.nl, dql: suggestion.dql })
+      });
+      const data = await res.json();
+      setSessionId(data.session_id);
+    } catch (error) {
+      console.error(error);
+    }
+  };
+
+  // A new question starts a new session; only "Refine DQL" continues the current one
+  const submitQuery = async (refine) => {
     if (!input.trim()) return;
 
     setIsLoading(true);
+    setSuggestions([]);
+    if (!refine) endSession();
     try {
       const res = await fetch("http://localhost:8000/generate", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ query: input })
+        headers: { "Content-Type": "application/json", ...(await apiAuthHeaders()) },
+        body: JSON.stringify(refine ? { query: input, session_id: sessionId, refine: true } : { query: input })
       });
       const data = await res.json();
-      const newQueryData = { input, query: data.dql, timestamp: data.timestamp };
+      if (!res.ok) {
+        // e.g. 401 when the sign-in expired, 503 when the model is unavailable
+        setGeneratedQuery(`-- ${data.detail || "Error contacting backend"}`);
+        setCurrentQueryData(null);
+        setFeedbackGiven(false);
+        setIsLoading(false);
+        return;
+      }
+      setSessionId(data.session_id);
+      // cache_key goes back with feedback, so a bad rating evicts the cached answer
+      const newQueryData = { input, query: data.dql, timestamp: data.timestamp, cache_key: data.cache_key };
       setGeneratedQuery(data.dql);
       setCurrentQueryData(newQueryData); // Store current query details
       setFeedbackGiven(false); // Reset feedback status for new query
@@ -209,6 +301,11 @@ const DQLApp = () => {
     setIsLoading(false);
   };
 
+  const handleSubmit = (e) => {
+    e.preventDefault();
+    submitQuery(false);
+  };
+
   const handleFeedbackClick = (feedbackType) => {
     if (feedbackGiven || !currentQueryData) return;
     setPendingFeedbackType(feedbackType);
@@ -240,6 +337,30 @@ const DQLApp = () => {
     }
   };
 
+  // Dry run against the sampled metadata snapshot instead of the Content Server
+  const previewQuery = async () => {
+    setPreview({ loading: true });
+    try {
+      const res = await fetch("http://localhost:8000/preview", {
+        method: "POST",
+        headers: { "Content-Type": "application/json", ...(await apiAuthHeaders()) },
+        body: JSON.stringify({ dql: generatedQuery })
+      });
+      const data = await res.json();
+      if (res.status === 503) {
+        // No snapshot on the server: nothing is known about the query itself
+        setPreview({ unavailable: data.detail });
+      } else {
+        setPreview(res.ok ? data : { error: data.detail });
+      }
+    } catch (error) {
+      setPreview({ error: "Error contacting backend" });
+      console.error(error);
+    }
+  };
+
+  useEffect(() => setPreview(null), [generatedQuery]);
+
   const useExample = (text) => setInput(text);
   const copyToClipboard = () => navigator.clipboard.writeText(generatedQuery);
 
@@ -277,6 +398,22 @@ const DQLApp = () => {
                     }
                   }}
                 ></textarea>
+                {suggestions.length > 0 && (
+                  <ul className="mt-1 border border-gray-200 rounded-md divide-y divide-gray-100">
+                    {suggestions.map((suggestion, index) => (
+                      <li key={index}>
+                        <button
+                          type="button"
+                          className="w-full text-left px-3 py-2 hover:bg-blue-50"
+                          onClick={() => useSuggestion(suggestion)}
+                        >
+                          <div className="text-sm text-gray-800">{suggestion.nl}</div>
+                          <div className="text-xs text-gray-500 font-mono truncate">{suggestion.dql}</div>
+                        </button>
+                      </li>
+                    ))}
+                  </ul>
+                )}
               </div>
 
               <div className="flex justify-between items-center">
@@ -287,6 +424,17 @@ const DQLApp = () => {
                 >
                   {isLoading ? "Generating..." : "Generate DQL"}
                 </button>
+                {sessionId && generatedQuery && (
+                  <button
+                    type="button"
+                    className="text-blue-600 hover:text-blue-800 text-sm"
+                    onClick={() => submitQuery(true)}
+                    disabled={isLoading}
+                    title="Apply this request as a change to the current query"
+                  >
+                    Refine DQL
+                  </button>
+                )}
               </div>
 
               {showHelp && (
@@ -313,12 +461,20 @@ const DQLApp = () => {
             <div className="flex justify-between items-center mb-2">
               <h2 className="text-lg font-semibold">Generated DQL Query:</h2>
               {generatedQuery && (
-                <button
-                  className="text-blue-600 hover:text-white-800 text-sm"
-                  onClick={copyToClipboard}
-                >
-                  Copy to Clipboard
-                </button>
+                <div className="space-x-4">
+                  <button
+                    className="text-blue-600 hover:text-blue-800 text-sm"
+                    onClick={previewQuery}
+                  >
+                    Preview results
+                  </button>
+                  <button
+                    className="text-blue-600 hover:text-white-800 text-sm"
+                    onClick={copyToClipboard}
+                  >
+                    Copy to Clipboard
+                  </button>
+                </div>
               )}
             </div>
             <div className="bg-gray-800 rounded-md p-3 overflow-x-auto text-white">
@@ -349,6 +505,43 @@ const DQLApp = () => {
               )}
             </div>
 
+            {preview && (
+              <div className="mt-3 p-3 bg-gray-50 rounded-md text-sm">
+                {preview.loading && <p className="text-gray-500">Running preview...</p>}
+                {preview.error && <p className="text-red-700">This query would fail: {preview.error}</p>}
+                {preview.unavailable && <p className="text-gray-600">Preview unavailable: {preview.unavailable}</p>}
+                {preview.supported === false && (
+                  <p className="text-gray-600">Preview not available: {preview.reason}</p>
+                )}
+                {preview.supported && (
+                  <>
+                    <p className="text-gray-700">
+                      About <strong>{preview.estimated_count}</strong> matching objects
+                      (estimated from a {Math.round(preview.sample_fraction * 100)}% sample, {preview.took_ms} ms)
+                    </p>
+                    {preview.rows.length > 0 && (
+                      <div className="overflow-x-auto mt-2">
+                        <table className="text-xs font-mono">
+                          <thead>
+                            <tr>{Object.keys(preview.rows[0]).map(column => (
+                              <th key={column} className="text-left pr-4 text-gray-600">{column}</th>
+                            ))}</tr>
+                          </thead>
+                          <tbody>
+                            {preview.rows.map((row, index) => (
+                              <tr key={index}>{Object.values(row).map((value, i) => (
+                                <td key={i} className="pr-4 whitespace-nowrap">{value === null ? "" : String(value)}</td>
+                              ))}</tr>
+                            ))}
+                          </tbody>
+                        </table>
+                      </div>
+                    )}
+                  </>
+                )}
+              </div>
+            )}
+
             {generatedQuery && generatedQuery !== "-- Error contacting backend" && (
               <div className="mt-3 flex items-center justify-end space-x-3">
                 <span className={`text-sm ${feedbackGiven ? 'text-gray-500' : 'text-gray-700'}`}>
@@ -0,0 +1,91 @@
+# dql_auth.py
+#
+# Who is asking. The UI signs in with MSAL and sends its access token as
+# "Authorization: Bearer ...". The token's signature, issuer, audience and
+# expiry are checked against the tenant's published keys, and the user and
+# groups that drive retrieval scope (dql_scope.py) come from its claims, never
+# from the request body. Body fields can only narrow that scope.
+#
+#   AUTH_TENANT_ID=<tenant id>        enables token checks (PyJWT needed)
+#   AUTH_AUDIENCE=api://<client id>   accepted audiences, comma-separated
+#   AUTH_USER_CLAIM=preferred_username
+#
+# Without AUTH_TENANT_ID every request is anonymous and only sees context
+# documents that are not restricted to users or groups.
+
+import os
+
+from dql_scope import RequestScope, keywords
+
+AUTH_TENANT_ID = os.getenv("AUTH_TENANT_ID")
+AUTH_AUDIENCE = [a.strip() for a in os.getenv("AUTH_AUDIENCE", "").split(",") if a.strip()]
+AUTH_USER_CLAIM = os.getenv("AUTH_USER_CLAIM", "preferred_username")
+# Claims whose values are matched against scope_groups: Entra group object ids and app role names
+GROUP_CLAIMS = ("groups", "roles")
+
+
+class AuthError(Exception):
+    pass
+
+
+class Principal:
+    def __init__(self, user=None, groups=()):
+        # Login name without the domain, as Documentum and the context files' scope_users know it
+        self.user = (keywords(str(user).split("@")[0]) or [None])[0] if user else None
+        self.groups = keywords(groups)
+
+    @classmethod
+    def from_claims(cls, claims):
+        user = next((claims[c] for c in (AUTH_USER_CLAIM, "upn", "email") if claims.get(c)), None)
+        groups = [g for claim in GROUP_CLAIMS for g in claims.get(claim) or []]
+        return cls(user, groups)
+
+    def scope(self, groups=(), cabinet_prefixes=()):
+        """Retrieval scope for this principal; requested groups can only narrow the token's groups"""
+        requested = keywords(groups)
+        allowed = [g for g in self.groups if g in requested] if requested else self.groups
+        return RequestScope(self.user, allowed, cabinet_prefixes)
+
+
+ANONYMOUS = Principal()
+
+
+class TokenVerifier:
+    def __init__(self, tenant_id=AUTH_TENANT_ID, audience=AUTH_AUDIENCE):
+        import jwt
+        self.jwt = jwt
+        self.audience = audience
+        # v2.0 and v1.0 tokens name the issuer differently
+        self.issuers = {f"https://login.microsoftonline.com/{tenant_id}/v2.0", f"https://sts.windows.net/{tenant_id}/"}
+        # Signing keys are fetched once and cached, and refetched for an unknown key id
+        self.keys = jwt.PyJWKClient(f"https://login.microsoftonline.com/{tenant_id}/discovery/v2.0/keys")
+
+    def claims(self, token):
+        try:
+            key = self.keys.get_signing_key_from_jwt(token).key
+            claims = self.jwt.decode(token, key, algorithms=["RS256"], audience=self.audience,
+                                     options={"require": ["exp", "iss", "aud"]})
+        except self.jwt.PyJWTError as e:
+            raise AuthError(f"Invalid access token: {e}")
+        if claims["iss"] not in self.issuers:
+            raise AuthError("Access token was issued by another tenant")
+        return claims
+
+
+verifier = None
+if AUTH_TENANT_ID:
+    if not AUTH_AUDIENCE:
+        raise ValueError("AUTH_AUDIENCE must be set with AUTH_TENANT_ID")
+    verifier = TokenVerifier()
+else:
+    print("⚠️ AUTH_TENANT_ID is not set: requests are anonymous and only see unrestricted context")
+
+
+def authenticate(authorization=None):
+    """Principal for an Authorization header value; raises AuthError when it cannot be trusted"""
+    if verifier is None:
+        return ANONYMOUS
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        raise AuthError("Sign in required")
+    return Principal.from_claims(verifier.claims(token.strip()))
@@ -0,0 +1,95 @@
+# dql_cache.py
+#
+# Key/value cache shared by all server workers. With REDIS_URL set, entries
+# live in Redis so every gunicorn worker sees the same responses and sessions;
+# without it, an in-process TTL/LRU dict stands in, which is exact for a
+# single worker. Values are JSON-serializable.
+#
+#   REDIS_URL=redis://localhost:6379/0
+#   RESPONSE_CACHE_TTL_SECONDS=3600   cache answers to new questions (0, the default, disables it)
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+REDIS_URL = os.getenv("REDIS_URL")
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "0"))
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", "10000"))
+
+
+class LocalCache:
+    shared = False
+
+    def __init__(self, namespace, ttl, max_entries=LOCAL_CACHE_MAX_ENTRIES):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if now >= expires:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class RedisCache:
+    shared = True
+
+    def __init__(self, namespace, ttl, url=REDIS_URL):
+        import redis
+        self.namespace = namespace
+        self.ttl = ttl
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, key):
+        return f"dql:{self.namespace}:{key}"
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self._key(key))
+        except Exception as e:
+            # A cache outage degrades to misses rather than failed requests
+            print(f"⚠️ Redis get failed: {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        try:
+            self.client.set(self._key(key), json.dumps(value, separators=(",", ":")), ex=self.ttl)
+        except Exception as e:
+            print(f"⚠️ Redis set failed: {e}")
+
+    def delete(self, key):
+        try:
+            self.client.delete(self._key(key))
+        except Exception as e:
+            print(f"⚠️ Redis delete failed: {e}")
+
+
+def make_cache(namespace, ttl=RESPONSE_CACHE_TTL_SECONDS):
+    """Redis-backed cache when REDIS_URL is set, otherwise the in-process stand-in"""
+    if REDIS_URL:
+        return RedisCache(namespace, ttl)
+    return LocalCache(namespace, ttl)
@@ -0,0 +1,101 @@
+# dql_cassette.py
+#
+# Record/replay layer for the external calls in generate_dql (Elasticsearch
+# searches and LLM generations). In record mode every call's normalized
+# request, response and latency are stored in a compact SQLite file; in replay
+# mode calls are served from that file, optionally sleeping for the recorded
+# latency, so the full pipeline can be benchmarked offline and deterministically.
+#
+#   CASSETTE_MODE=record|replay   (default off)
+#   CASSETTE_PATH=cassettes/dql.sqlite
+#   CASSETTE_REPLAY_LATENCY=1     replay with the recorded latencies
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off")
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassettes/dql.sqlite")
+CASSETTE_REPLAY_LATENCY = os.getenv("CASSETTE_REPLAY_LATENCY", "0") == "1"
+
+# Query vectors differ in the last bits between runs and machines; round before hashing
+FLOAT_DIGITS = 4
+
+
+class CassetteMiss(KeyError):
+    pass
+
+
+def normalize(value):
+    if isinstance(value, float):
+        return round(value, FLOAT_DIGITS)
+    if isinstance(value, dict):
+        return {k: normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    return value
+
+
+def request_key(kind, request):
+    canonical = json.dumps([kind, normalize(request)], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    def __init__(self, path=CASSETTE_PATH, mode=CASSETTE_MODE, replay_latency=CASSETTE_REPLAY_LATENCY):
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.lock = threading.Lock()
+        self.db = None
+        if mode in ("record", "replay"):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS calls (key TEXT PRIMARY KEY, kind TEXT, response BLOB, latency REAL)"
+            )
+            count = self.db.execute("SELECT COUNT(*) FROM calls").fetchone()[0]
+            print(f"\U0001F4FC Cassette {mode} mode: {path} ({count} recorded calls)")
+
+    def lookup(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT response, latency FROM calls WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0])), row[1]
+
+    def store(self, key, kind, response, latency):
+        blob = zlib.compress(json.dumps(response, separators=(",", ":")).encode("utf-8"))
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO calls VALUES (?, ?, ?, ?)", (key, kind, blob, latency))
+            self.db.commit()
+
+    def wrap(self, kind, fn, key_fn=lambda *args, **kwargs: [args, kwargs]):
+        """Wrap `fn` so its calls are recorded or replayed; `key_fn` picks the request
+        arguments that identify a call (e.g. the prompt but not the timeout)"""
+        if self.db is None:
+            return fn
+
+        def wrapped(*args, **kwargs):
+            key = request_key(kind, key_fn(*args, **kwargs))
+            if self.mode == "replay":
+                entry = self.lookup(key)
+                if entry is None:
+                    raise CassetteMiss(f"No recorded {kind} call for this request")
+                response, latency = entry
+                if self.replay_latency:
+                    time.sleep(latency)
+                return response
+
+            start = time.monotonic()
+            response = fn(*args, **kwargs)
+            self.store(key, kind, response, time.monotonic() - start)
+            return response
+
+        return wrapped
+
+
+cassette = Cassette()
@@ -0,0 +1,319 @@
+# dql_corpus.py
+#
+# The retrieval corpus: which context files are embedded, and how each record
+# becomes an indexed document. Used by backend/generate_embeddings.py for full
+# rebuilds and by dql_reload.py for hot reloads. Embeddings are cached by
+# text hash (EmbeddingCache), so a rebuild only encodes records whose text
+# changed since the last one. Hot reloads rebuild under a file lock and record
+# the source files they were built from, so with several server workers the
+# first one rebuilds and the others just load the result.
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+from contextlib import contextmanager
+import numpy as np
+
+from dql_reload import file_signature, signature_version
+from dql_scope import scope_metadata
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
+CONTEXT_DIR = os.path.join(PROJECT_ROOT, "context")
+EMBEDDINGS_FILE = os.path.join(CONTEXT_DIR, "all_embeddings.json")
+EMBEDDING_CACHE_FILE = os.path.join(CONTEXT_DIR, "embedding_cache.npz")
+# Version of the source files EMBEDDINGS_FILE was last rebuilt from by refresh_corpus()
+CORPUS_STAMP_FILE = os.path.join(CONTEXT_DIR, "all_embeddings.sources")
+CORPUS_LOCK_FILE = os.path.join(CONTEXT_DIR, ".corpus.lock")
+# Records encoded per batch; .jsonl sources are read one batch at a time
+EMBED_BATCH_SIZE = 512
+
+# --- Data Sources ---
+DATA_SOURCES = [
+    {
+        "type": "guidelines",
+        "source": "hardcoded",
+        "text_field": "nl",
+        "data": [
+            {
+                "type": "synonyms",
+                "nl": "documents, folders and attributes might be defined differently by the user.",
+                "document": ["record", "item", "stuff", "files", "doc"],
+                "folder": ["directory", "folder", "location", "subfolder"],
+                "attribute": ["property", "metadata", "info"]
+            },
+            {
+                "type": "patterns",
+                "trigger": ["pre-provision", "preprovision"],
+                "pattern": "pp\\d+",
+                "prefix": "pp",
+                "nl": "Pre provisioned cabinet ids begin with pp followed by a number. pp1, pp2, pp3, ppN..."
+            },
+            {
+                "type": "queryTemplates",
+                "basicSelect": "SELECT {attributes} FROM {objectType} WHERE {conditions}",
+                "folderQuery": "SELECT {attributes} FROM {objectType} WHERE FOLDER('/{folderPath}')",
+                "subfolderQuery": "SELECT {attributes} FROM {objectType} WHERE FOLDER('/{folderPath}', DESCEND)'",
+                "nl": "Basic SELECT statements"
+            },
+            {
+                "type": "Migration",
+                "trigger": ["RIMA", "Migration"],
+                "pattern": "RIMA_\\d+",
+                "prefix": "RIMA_",
+                "nl": "Cabinets that begin with 'RIMA_' are reserved for the RIMA to DMS migration."
+            }
+        ]
+    },
+    {
+        "type": "examples",
+        "source": os.path.join(PROJECT_ROOT, "context/examples_revised.json"),
+        "text_field": "nl"
+    },
+    {
+        "type": "rules",
+        "source": os.path.join(PROJECT_ROOT, "context/rules_embedding.json"),
+        "text_field": "source_text"
+    },
+    {
+        # Output of backend/ingest_schema.py: flattened_schema.json, business_doc_schema.json
+        # and any ingested type dumps, normalized and deduplicated
+        "type": "schema",
+        "source": os.path.join(PROJECT_ROOT, "context/schema_catalog.jsonl"),
+        "text_field": "source_text"
+    },
+    {
+        "type": "user_context",
+        "source": os.path.join(PROJECT_ROOT, "context/user_context.json"),
+        "text_field": "content"
+    },
+    {
+        "type": "feedback",
+        "source": os.path.join(PROJECT_ROOT, "context/feedback_examples.json"),
+        "text_field": "nl"
+    }
+]
+
+
+def load_items(path):
+    """Items from a JSON file, or lazily line by line from a .jsonl file"""
+    if path.endswith(".jsonl"):
+        def iter_lines(f):
+            with f:
+                for number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        logging.error(f"Skipping malformed line {number} of {path}: {e}")
+        return iter_lines(open(path, "r", encoding="utf-8"))
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def source_files():
+    """Context files the corpus is built from"""
+    return [s["source"] for s in DATA_SOURCES if s["source"] != "hardcoded"]
+
+
+class EmbeddingCache:
+    """Text -> vector cache persisted as one .npz file, keyed by model and text hash"""
+
+    def __init__(self, model_name, path=EMBEDDING_CACHE_FILE):
+        self.model_name = model_name
+        self.path = path
+        self.vectors = {}
+        self.used = set()
+        if os.path.exists(path):
+            data = np.load(path)
+            self.vectors = dict(zip(data["keys"].tolist(), data["vectors"]))
+
+    def key(self, text):
+        return hashlib.sha1(f"{self.model_name}\n{text}".encode("utf-8")).hexdigest()
+
+    def embed(self, texts, encode):
+        """Vectors for `texts`, encoding only those not seen before in one batch"""
+        keys = [self.key(text) for text in texts]
+        missing = list({k: t for k, t in zip(keys, texts) if k not in self.vectors}.items())
+        if missing:
+            encoded = encode([text for _, text in missing])
+            for (k, _), vector in zip(missing, encoded):
+                self.vectors[k] = np.asarray(vector, dtype=np.float32)
+            logging.info(f"Encoded {len(missing)} new or changed texts ({len(texts) - len(missing)} cached)")
+        self.used.update(keys)
+        return [self.vectors[k].tolist() for k in keys]
+
+    def save(self):
+        """Persist the vectors used since loading; entries for deleted or edited records are dropped"""
+        keys = sorted(self.used)
+        if not keys:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, keys=np.asarray(keys), vectors=np.stack([self.vectors[k] for k in keys]))
+        os.replace(tmp_path, self.path)
+
+
+def source_items(source_info):
+    """Records of one data source, or None if it cannot be loaded"""
+    if source_info["source"] == "hardcoded":
+        return source_info["data"]
+    if source_info.get("optional") and not os.path.exists(source_info["source"]):
+        logging.info(f"Skipping {source_info['source']}: not generated yet")
+        return None
+    try:
+        return load_items(source_info["source"])
+    except Exception as e:
+        logging.error(f"❌ Failed to load data for {source_info['type']}: {e}")
+        return None
+
+
+def batches(items, size=EMBED_BATCH_SIZE):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def describe(item, limit=80):
+    text = json.dumps(item, default=str) if isinstance(item, (dict, list)) else str(item)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def with_text(items, text_field):
+    """Records that have text to embed; anything that is not a record is logged and skipped"""
+    for item in items:
+        if not isinstance(item, dict):
+            logging.error(f"Skipping malformed item: {describe(item)}")
+        elif item.get(text_field):
+            yield item
+
+
+def embedded(batch, texts, embed):
+    """(item, embedding) pairs; when a batch fails, its items are embedded one by one"""
+    try:
+        return list(zip(batch, embed(texts)))
+    except Exception as e:
+        logging.warning(f"Failed to embed a batch of {len(batch)} items, retrying one by one: {e}")
+    pairs = []
+    for item, text in zip(batch, texts):
+        try:
+            pairs.append((item, embed([text])[0]))
+        except Exception as e:
+            logging.error(f"Skipping item that failed to embed: {describe(item)}: {e}")
+    return pairs
+
+
+def build_documents(source_info, items, embed):
+    """Indexed documents for one source's records; `embed` maps a list of texts to vectors.
+
+    A record that cannot be embedded or indexed is logged and skipped; the rest of the source is kept.
+    """
+    source_type = source_info["type"]
+    documents = []
+
+    # Special handling for feedback
+    if source_type == "feedback":
+        for batch in batches(e for e in with_text(items, "nl") if e.get("dql")):
+            for entry, embedding in embedded(batch, [e["nl"] for e in batch], embed):
+                try:
+                    documents.append({
+                        "type": "feedback_positive" if entry.get("score", 0) > 0 else "feedback_negative",
+                        "source": "feedback",
+                        "nl": entry["nl"],
+                        "dql": entry["dql"],
+                        "embedding": embedding,
+                        "tags": entry.get("tags", []) + ["feedback"],
+                        "score": entry.get("score", 0),
+                        "cluster_size": entry.get("cluster_size", 1),
+                        "comment": entry.get("comment", ""),
+                        **scope_metadata(entry)
+                    })
+                except Exception as e:
+                    logging.error(f"Skipping feedback entry: {describe(entry)}: {e}")
+        return documents
+
+    text_field = source_info["text_field"]
+    for batch in batches(with_text(items, text_field)):
+        for item, embedding in embedded(batch, [item[text_field] for item in batch], embed):
+            try:
+                output_item = item.copy()
+                output_item["embedding"] = embedding
+                if 'type' not in output_item:
+                    output_item["type"] = source_type
+                # Keyword fields for per-request scope filters (see dql_scope.py)
+                output_item.update(scope_metadata(item))
+                documents.append(output_item)
+            except Exception as e:
+                logging.error(f"Skipping {source_type} item: {describe(item)}: {e}")
+    return documents
+
+
+def build_corpus(encode, cache=None):
+    """{source type: [documents with embeddings]} for every data source.
+
+    `encode` maps a list of texts to vectors; with `cache`, only unseen texts are encoded.
+    """
+    embed = (lambda texts: cache.embed(texts, encode)) if cache else \
+        (lambda texts: [np.asarray(v, dtype=np.float32).tolist() for v in encode(texts)])
+
+    if cache:
+        cache.used.clear()
+    all_embeddings = {}
+    for source_info in DATA_SOURCES:
+        logging.info(f"Processing source type: {source_info['type']}")
+        items = source_items(source_info)
+        if items is None:
+            continue
+        documents = build_documents(source_info, items, embed)
+        all_embeddings.setdefault(source_info["type"], []).extend(documents)
+        logging.info(f"✅ Embedded {len(documents)} items for {source_info['type']}")
+
+    if cache:
+        cache.save()
+    return all_embeddings
+
+
+def save_corpus(all_embeddings, path=EMBEDDINGS_FILE):
+    """Write the corpus atomically, so readers never see a partially written file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(all_embeddings, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def corpus_lock(path=CORPUS_LOCK_FILE):
+    """Exclusive lock, across processes, for rebuilding the corpus and the files derived from it"""
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def refresh_corpus(encode, model_name):
+    """Rebuild EMBEDDINGS_FILE unless it already reflects the current source files.
+
+    Call under corpus_lock(). Returns True if this call rebuilt it, False if another
+    process already had.
+    """
+    version = signature_version(file_signature(source_files()))
+    if os.path.exists(EMBEDDINGS_FILE) and os.path.exists(CORPUS_STAMP_FILE):
+        with open(CORPUS_STAMP_FILE, "r", encoding="utf-8") as f:
+            if f.read().strip() == version:
+                return False
+    # Fresh from disk: another process may have extended the cache since this one loaded it
+    save_corpus(build_corpus(encode, EmbeddingCache(model_name, EMBEDDING_CACHE_FILE)), EMBEDDINGS_FILE)
+    tmp_path = f"{CORPUS_STAMP_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, CORPUS_STAMP_FILE)
+    return True
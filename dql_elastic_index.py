@@ -0,0 +1,260 @@
+# dql_elastic_index.py
+#
+# Keeps the Elasticsearch index in step with the corpus (context/all_embeddings.json)
+# without taking it offline. INDEX_NAME is an alias. Documents get stable ids
+# (a hash of their content and vector), so a sync only indexes the documents
+# that are new or changed and deletes the ones that are gone; the live index
+# is never deleted. A full rebuild (first upload, a new vector mapping, or
+# --rebuild) loads a fresh versioned index (dql_schema_<timestamp>) and moves
+# the alias to it in one atomic _aliases call.
+#
+# Used by backend/upload_to_elasticsearch.py and, with CONTEXT_RELOAD=1, by the
+# server's hot reload, where the embedding cache means only changed records are
+# re-embedded before the sync.
+
+import hashlib
+import json
+import os
+import time
+import requests
+
+from dql_corpus import CONTEXT_DIR, CORPUS_STAMP_FILE, EMBEDDINGS_FILE
+from dql_vectors import project
+
+ELASTIC_URL = os.getenv("ELASTIC_URL")
+INDEX_NAME = "dql_schema"
+# id -> document table (without vectors) used by dql_prompt_framework to hydrate slim search hits
+METADATA_FILE = os.getenv("DOC_METADATA_FILE") or os.path.join(CONTEXT_DIR, "doc_metadata.json")
+# Corpus version the index was last synced with by refresh_index()
+INDEX_STAMP_FILE = os.path.join(CONTEXT_DIR, "elastic_index.sources")
+
+# Vector index settings. int8_hnsw keeps a quantized copy of every vector in the HNSW graph
+# (about 4x less memory); use "hnsw" for full precision.
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "int8_hnsw")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "100"))
+# Documents per _bulk request
+BULK_BATCH_SIZE = 500
+READY_TIMEOUT_SECONDS = 120
+
+
+class IndexSyncError(RuntimeError):
+    pass
+
+
+def index_mapping(dims):
+    return {
+        "mappings": {
+            "properties": {
+                "object_type": {"type": "keyword"},
+                "attribute": {"type": "keyword", "fields": {"text": {"type": "text"}}},
+                "type": {"type": "keyword"},
+                "source": {"type": "keyword"},
+                "description": {"type": "text"},
+                "source_text": {"type": "text"},
+                # Per-request scope pre-filters (dql_scope.py)
+                "scope_users": {"type": "keyword"},
+                "scope_groups": {"type": "keyword"},
+                "cabinet_prefixes": {"type": "keyword"},
+                "embedding": {
+                    "type": "dense_vector",
+                    "dims": dims,
+                    "index": True,
+                    "similarity": "cosine",
+                    "index_options": {
+                        "type": VECTOR_INDEX_TYPE,
+                        "m": HNSW_M,
+                        "ef_construction": HNSW_EF_CONSTRUCTION
+                    }
+                }
+            }
+        }
+    }
+
+
+# --- Documents ---
+
+def document_id(doc):
+    """Stable id: equal for identical documents in every run, different once text or vector changes"""
+    text = json.dumps(doc, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def prepare_documents(all_embeddings, pca=None):
+    """{id: document} for every valid corpus document, vectors projected with `pca`"""
+    documents = {}
+    for data_type, records in all_embeddings.items():
+        if not isinstance(records, list):
+            print(f"⚠️ Skipping '{data_type}': Expected a list, but got {type(records)}.")
+            continue
+        for doc in records:
+            if not isinstance(doc, dict) or not isinstance(doc.get("embedding"), list):
+                print(f"⚠️ Skipping item in '{data_type}' without a valid 'embedding': {str(doc)[:100]}...")
+                continue
+            if pca is not None:
+                doc = dict(doc, embedding=project(doc["embedding"], pca).tolist())
+            documents[document_id(doc)] = doc
+    return documents
+
+
+def metadata(documents):
+    return {doc_id: {k: v for k, v in doc.items() if k not in ("embedding", "embedding_nl")}
+            for doc_id, doc in documents.items()}
+
+
+def write_metadata(doc_metadata, path=METADATA_FILE):
+    """Atomic, since servers hot-reload this file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(doc_metadata, f)
+    os.replace(tmp_path, path)
+
+
+def plan_sync(live_ids, documents):
+    """(ids to index, ids to delete) to turn an index holding `live_ids` into `documents`"""
+    return [i for i in documents if i not in live_ids], sorted(set(live_ids) - set(documents))
+
+
+# --- Elasticsearch ---
+
+def es(method, path, **kwargs):
+    response = requests.request(method, f"{ELASTIC_URL}/{path}", timeout=kwargs.pop("timeout", 60), **kwargs)
+    if response.status_code >= 400 and response.status_code != 404:
+        raise IndexSyncError(f"{method} /{path} failed ({response.status_code}): {response.text[:500]}")
+    return response
+
+
+def alias_indices(alias=INDEX_NAME):
+    """Concrete indices behind `alias`; [] if it is not an alias (absent, or a legacy concrete index)"""
+    response = es("GET", f"_alias/{alias}")
+    return sorted(response.json()) if response.status_code == 200 else []
+
+
+def mapping_matches(index, dims):
+    properties = es("GET", f"{index}/_mapping").json()[index]["mappings"].get("properties", {})
+    embedding = properties.get("embedding", {})
+    return (embedding.get("dims") == dims
+            and embedding.get("index_options", {}).get("type") == VECTOR_INDEX_TYPE)
+
+
+def live_ids(index):
+    """Ids of every document in `index`, scrolled without their sources"""
+    ids = set()
+    response = es("POST", f"{index}/_search?scroll=1m",
+                  json={"size": 1000, "_source": False, "sort": ["_doc"], "query": {"match_all": {}}}).json()
+    scroll_id = response.get("_scroll_id")
+    try:
+        while response["hits"]["hits"]:
+            ids.update(hit["_id"] for hit in response["hits"]["hits"])
+            response = es("POST", "_search/scroll", json={"scroll": "1m", "scroll_id": scroll_id}).json()
+            scroll_id = response.get("_scroll_id", scroll_id)
+    finally:
+        if scroll_id:
+            es("DELETE", "_search/scroll", json={"scroll_id": scroll_id})
+    return ids
+
+
+def bulk(index, actions):
+    """Send (action, doc_id, document or None) triples in batches; raises if any item failed"""
+    for start in range(0, len(actions), BULK_BATCH_SIZE):
+        lines = []
+        for action, doc_id, doc in actions[start:start + BULK_BATCH_SIZE]:
+            lines.append(json.dumps({action: {"_index": index, "_id": doc_id}}))
+            if doc is not None:
+                lines.append(json.dumps(doc))
+        response = es("POST", "_bulk", data="\n".join(lines) + "\n",
+                      headers={"Content-Type": "application/x-ndjson"}).json()
+        if response.get("errors"):
+            # Deleting a document that is already gone is fine
+            failed = [result for item in response["items"] for kind, result in item.items()
+                      if result.get("status", 500) >= 300 and not (kind == "delete" and result.get("status") == 404)]
+            if failed:
+                raise IndexSyncError(f"{len(failed)} bulk items failed, e.g. {json.dumps(failed[0])[:500]}")
+
+
+def wait_until_ready(index):
+    deadline = time.time() + READY_TIMEOUT_SECONDS
+    while time.time() < deadline:
+        status = es("GET", f"_cluster/health/{index}", timeout=10).json().get("status")
+        if status in ("green", "yellow"):
+            return
+        print(f"Index status: {status}. Waiting...")
+        time.sleep(5)
+    explanation = es("GET", "_cluster/allocation/explain", timeout=10).text
+    raise IndexSyncError(f"Index '{index}' not ready after {READY_TIMEOUT_SECONDS}s: {explanation[:1000]}")
+
+
+def rebuild_index(documents, dims, alias=INDEX_NAME):
+    """Load `documents` into a new versioned index, then point the alias at it atomically"""
+    index = f"{alias}_{time.strftime('%Y%m%d%H%M%S')}"
+    es("PUT", index, json=index_mapping(dims))
+    wait_until_ready(index)
+    print(f"✅ Created index '{index}', uploading {len(documents)} documents...")
+    bulk(index, [("index", doc_id, doc) for doc_id, doc in documents.items()])
+    es("POST", f"{index}/_refresh")
+
+    previous = alias_indices(alias)
+    actions = [{"remove": {"index": old, "alias": alias}} for old in previous]
+    if not previous and es("HEAD", alias).status_code == 200:
+        # A concrete index from before aliases: replaced in the same atomic call
+        actions.append({"remove_index": {"index": alias}})
+    actions.append({"add": {"index": index, "alias": alias}})
+    es("POST", "_aliases", json={"actions": actions})
+    print(f"✅ Alias '{alias}' now points to '{index}'")
+    for old in previous:
+        es("DELETE", old)
+    return index
+
+
+def sync_index(all_embeddings, pca=None, rebuild=False, alias=INDEX_NAME, metadata_path=METADATA_FILE):
+    """Make the index serve `all_embeddings` (a corpus as written by dql_corpus.save_corpus)"""
+    documents = prepare_documents(all_embeddings, pca)
+    if not documents:
+        raise IndexSyncError("No valid documents found to upload")
+    dims = len(next(iter(documents.values()))["embedding"])
+    doc_metadata = metadata(documents)
+
+    current = alias_indices(alias)
+    if rebuild or len(current) != 1 or not mapping_matches(current[0], dims):
+        rebuild_index(documents, dims, alias)
+        write_metadata(doc_metadata, metadata_path)
+        return {"indexed": len(documents), "deleted": 0, "rebuilt": True}
+
+    to_index, to_delete = plan_sync(live_ids(alias), documents)
+    if to_index:
+        # New ids are hydratable before they become searchable; stale ones stay until deleted
+        previous = {}
+        if os.path.exists(metadata_path):
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+        write_metadata({**previous, **doc_metadata}, metadata_path)
+        bulk(alias, [("index", doc_id, documents[doc_id]) for doc_id in to_index])
+    if to_delete:
+        bulk(alias, [("delete", doc_id, None) for doc_id in to_delete])
+    if to_index or to_delete:
+        es("POST", f"{alias}/_refresh")
+    write_metadata(doc_metadata, metadata_path)
+    print(f"✅ Index '{alias}' synced: {len(to_index)} documents indexed, {len(to_delete)} deleted, "
+          f"{len(documents) - len(to_index)} unchanged")
+    return {"indexed": len(to_index), "deleted": len(to_delete), "rebuilt": False}
+
+
+def refresh_index(pca=None):
+    """Sync the index with EMBEDDINGS_FILE unless it already has the corpus's current version.
+
+    Call under dql_corpus.corpus_lock() after refresh_corpus(), so one worker syncs and
+    the others find the stamp current. Returns True if this call synced.
+    """
+    with open(CORPUS_STAMP_FILE, "r", encoding="utf-8") as f:
+        version = f.read().strip()
+    if os.path.exists(INDEX_STAMP_FILE):
+        with open(INDEX_STAMP_FILE, "r", encoding="utf-8") as f:
+            if f.read().strip() == version:
+                return False
+    with open(EMBEDDINGS_FILE, "r", encoding="utf-8") as f:
+        sync_index(json.load(f), pca)
+    tmp_path = f"{INDEX_STAMP_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, INDEX_STAMP_FILE)
+    return True
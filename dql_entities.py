@@ -0,0 +1,153 @@
+# dql_entities.py
+#
+# Exact entity recognition for user requests. Embeddings are poor at matching
+# literal identifiers, so record class codes (ADM100, AUD140, ...), schema
+# attribute names (cabinet_id, record_class_codes, ...) and cabinet/document ID
+# patterns (pp12, RIMA_3, fin2024) are found here with an Aho-Corasick
+# automaton and precompiled regexes, built once at startup.
+
+import json
+import os
+import re
+from collections import deque
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
+# Built by backend/ingest_schema.py from the raw schema files and type dumps
+SCHEMA_FILES = [os.path.join(PROJECT_ROOT, "context", "schema_catalog.jsonl")]
+RECORD_CLASS_CODES_FILE = os.path.join(PROJECT_ROOT, "context", "record_class_codes.json")
+MAPPINGS_FILE = os.path.join(PROJECT_ROOT, "context", "mapping_embeddings.json")
+# Everything load() reads, for callers that watch for changes
+INPUT_FILES = SCHEMA_FILES + [RECORD_CLASS_CODES_FILE, MAPPINGS_FILE]
+
+# Schema attributes that hold record class codes, injected whenever a code is mentioned
+CODE_ATTRIBUTES = [("record_class", "record_class_code"), ("business_cab", "record_class_codes")]
+
+
+def is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+class AhoCorasick:
+    """Multi-keyword matcher: one pass over the text finds every keyword occurrence"""
+
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for keyword in keywords:
+            state = 0
+            for ch in keyword:
+                if ch not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][ch] = len(self.goto) - 1
+                state = self.goto[state][ch]
+            self.output[state].append(keyword)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text):
+        """(start, end, keyword) for every occurrence bounded by non-word characters"""
+        matches = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for keyword in self.output[state]:
+                start, end = i - len(keyword) + 1, i + 1
+                if (start == 0 or not is_word_char(text[start - 1])) and \
+                        (end == len(text) or not is_word_char(text[end])):
+                    matches.append((start, end, keyword))
+        return matches
+
+
+def load_records(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+class EntityRecognizer:
+    def __init__(self, schema_records, record_class_codes, id_patterns):
+        # Only identifier-like attribute names (cabinet_id, not comments) are matched,
+        # so ordinary words in a request do not pull in schema attributes
+        self.attributes = {}
+        for record in schema_records:
+            name = str(record.get("attribute", "")).lower()
+            if record.get("object_type") and ("_" in name or "-" in name):
+                self.attributes.setdefault(name, []).append(record)
+        self.schema_by_key = {(r["object_type"], r["attribute"]): r for rs in self.attributes.values() for r in rs}
+
+        self.codes = {code.lower(): code for code in record_class_codes}
+        self.matcher = AhoCorasick(list(self.attributes) + list(self.codes))
+
+        self.id_patterns = [
+            (re.compile(rf"(?<![A-Za-z0-9_]){p['pattern']}(?![A-Za-z0-9_])", re.IGNORECASE), p)
+            for p in id_patterns
+        ]
+
+    @classmethod
+    def load(cls):
+        schema_records = [r for path in SCHEMA_FILES for r in load_records(path)]
+        with open(RECORD_CLASS_CODES_FILE, "r", encoding="utf-8") as f:
+            codes = [c["name"] for c in json.load(f).get("record_class_codes", []) if c.get("name")]
+        with open(MAPPINGS_FILE, "r", encoding="utf-8") as f:
+            mappings = json.load(f)
+        id_patterns = [p for key in ("idPatterns", "Migration") for p in mappings.get(key, []) if p.get("pattern")]
+
+        recognizer = cls(schema_records, codes, id_patterns)
+        print(f"✅ Entity recognizer ready: {len(recognizer.attributes)} attributes, "
+              f"{len(recognizer.codes)} record class codes, {len(recognizer.id_patterns)} ID patterns")
+        return recognizer
+
+    def recognize(self, text):
+        """Schema records and prompt notes for every exact mention in `text`"""
+        schema, notes, seen = [], [], set()
+
+        def add_schema(record):
+            key = (record["object_type"], record["attribute"])
+            if key not in seen:
+                seen.add(key)
+                schema.append(record)
+
+        for _, _, keyword in self.matcher.find(text.lower()):
+            if keyword in self.codes:
+                code = self.codes[keyword]
+                notes.append({"content": f"{code} is a record class code (record_class.record_class_code, "
+                                         f"business_cab.record_class_codes)"})
+                for key in CODE_ATTRIBUTES:
+                    if key in self.schema_by_key:
+                        add_schema(self.schema_by_key[key])
+            if keyword in self.attributes:
+                for record in self.attributes[keyword]:
+                    add_schema(record)
+
+        for regex, pattern in self.id_patterns:
+            for value in dict.fromkeys(m.group(0) for m in regex.finditer(text)):
+                notes.append({"content": f"{value} matches ID pattern {pattern['pattern']}: {pattern.get('description', '')}".strip()})
+
+        return {"schema": schema, "notes": list({n["content"]: n for n in notes}.values())}
+
+
+def merge_exact_schema(exact, retrieved, quota):
+    """Exact attribute matches first, then kNN hits not among them, up to `quota` in total.
+
+    Exact matches are flagged with "exact_match" so later stages (rerank) keep them.
+    """
+    keys = {(r["object_type"], r["attribute"]) for r in exact}
+    retrieved = [doc for doc in retrieved if (doc.get("object_type"), doc.get("attribute")) not in keys]
+    return [dict(r, exact_match=True) for r in exact] + retrieved[:max(quota - len(exact), 0)]
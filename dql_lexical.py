@@ -0,0 +1,57 @@
+# dql_lexical.py
+#
+# Local lexical retrieval for hybrid search: a small BM25 inverted index over
+# the same documents as the local vector index, plus reciprocal rank fusion
+# (RRF) to merge lexical and vector rankings. Mirrors what the Elasticsearch
+# backend does with a multi_match query and the rrf retriever.
+
+import math
+import os
+import re
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+RRF_RANK_CONSTANT = 60
+# How many vector and lexical candidates per section are fused
+RRF_WINDOW = int(os.getenv("RRF_WINDOW", "20"))
+
+
+def tokenize(text):
+    # Like the standard analyzer, underscores stay inside tokens so cabinet_id is one term
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class BM25Index:
+    def __init__(self, docs, fields, k1=1.2, b=0.75):
+        self.k1, self.b = k1, b
+        self.postings = {}
+        self.doc_lengths = []
+        for row, doc in enumerate(docs):
+            terms = Counter(t for field in fields if doc.get(field) for t in tokenize(doc[field]))
+            self.doc_lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, []).append((row, tf))
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        self.doc_count = len(self.doc_lengths)
+
+    def scores(self, query):
+        """BM25 score of every document sharing at least one term with the query"""
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (self.doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[row] / self.avg_length)
+                scores[row] = scores.get(row, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+
+def rrf_fuse(rankings, rank_constant=RRF_RANK_CONSTANT):
+    """Merge ranked lists of ids into one list ordered by reciprocal rank fusion score"""
+    fused = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (rank_constant + rank)
+    return sorted(fused, key=fused.get, reverse=True)
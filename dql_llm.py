@@ -0,0 +1,210 @@
+# dql_llm.py
+#
+# Bounded LLM call scheduler. Every generate call gets a hard deadline, waits
+# on a per-model token bucket sized to our quota, sends one hedged duplicate
+# when the primary is slower than its recent p95, and fails over to the
+# fallback model on errors or timeouts. Per-model latencies and failures are
+# tracked so a degraded primary is routed around until it recovers, and a
+# model whose p95 no longer fits its share of the deadline is tried after one
+# that does.
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_BURST = int(os.getenv("LLM_BURST", "5"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") == "1"
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "16"))
+# Server processes sharing the quota (set by gunicorn.conf.py); each gets an equal share
+LLM_WORKERS = max(int(os.getenv("LLM_WORKERS", "1")), 1)
+
+# Share of the deadline held back for the fallback model when the first choice stalls
+FALLBACK_RESERVE = float(os.getenv("LLM_FALLBACK_RESERVE", "0.3"))
+
+# Latency samples needed before hedging kicks in, and failures before a model is skipped
+MIN_SAMPLES_FOR_HEDGE = 20
+FAILURES_BEFORE_COOLDOWN = 3
+COOLDOWN_SECONDS = 60
+
+
+class LLMUnavailableError(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second, burst):
+        self.rate = rate_per_second
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout):
+        """Take one token, waiting at most `timeout` seconds; False if none became available"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait_for = (1 - self.tokens) / self.rate
+            if now + wait_for > deadline:
+                return False
+            time.sleep(wait_for)
+
+
+class ModelStats:
+    def __init__(self, window=200):
+        self.latencies = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.lock = threading.Lock()
+
+    def record_success(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= FAILURES_BEFORE_COOLDOWN:
+                self.cooldown_until = time.monotonic() + COOLDOWN_SECONDS
+
+    def percentile(self, q):
+        """Latency percentile in seconds, or None until enough calls have been seen"""
+        with self.lock:
+            if len(self.latencies) < MIN_SAMPLES_FOR_HEDGE:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[max(int(len(ordered) * q) - 1, 0)]
+
+    def p50(self):
+        return self.percentile(0.5)
+
+    def p95(self):
+        return self.percentile(0.95)
+
+    def healthy(self):
+        return time.monotonic() >= self.cooldown_until
+
+
+class LLMScheduler:
+    def __init__(self, clients, primary, fallback=None, deadline=LLM_DEADLINE_SECONDS,
+                 requests_per_minute=LLM_REQUESTS_PER_MINUTE, burst=LLM_BURST, hedge=LLM_HEDGE,
+                 workers=LLM_WORKERS):
+        """`clients` maps model name -> callable(prompt, timeout) returning the response text.
+
+        `requests_per_minute` and `burst` are the quota of the whole deployment; with
+        `workers` server processes, this process's buckets get 1/workers of it.
+        """
+        self.clients = clients
+        self.primary = primary
+        self.fallback = fallback if fallback and fallback != primary else None
+        self.deadline = deadline
+        self.hedge = hedge
+        rate, burst = requests_per_minute / 60.0 / workers, max(round(burst / workers), 1)
+        self.buckets = {name: TokenBucket(rate, burst) for name in clients}
+        self.stats = {name: ModelStats() for name in clients}
+        self.executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="llm")
+
+    def route(self, preferred=None):
+        """Models to try in order: preferred/primary first unless it is cooling down or too slow.
+
+        A model whose recent p95 would not fit the first attempt's share of the deadline
+        goes after the models that would (or have no latency history yet).
+        """
+        first = preferred or self.primary
+        order = [first] + [m for m in (self.primary, self.fallback) if m and m != first]
+        budget = self.deadline * (1 - FALLBACK_RESERVE) if len(order) > 1 else self.deadline
+
+        def rank(model_name):
+            stats = self.stats[model_name]
+            p95 = stats.p95()
+            return (not stats.healthy(), p95 is not None and p95 > budget)
+        return sorted(order, key=rank)
+
+    def _call(self, model_name, prompt, deadline_at):
+        """(text, latency); outcomes are recorded by _attempt, so a late, abandoned call counts for nothing"""
+        # A call that waited in the pool past the deadline is dropped, not sent
+        start = time.monotonic()
+        timeout = deadline_at - start
+        if timeout <= 0:
+            raise TimeoutError(f"{model_name} call expired in the queue")
+        text = self.clients[model_name](prompt, timeout)
+        return text, time.monotonic() - start
+
+    def _attempt(self, model_name, prompt, deadline_at):
+        """Run one model with an optional hedged duplicate; returns text or raises"""
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0 or not self.buckets[model_name].acquire(remaining):
+            raise TimeoutError(f"No {model_name} capacity before the deadline")
+
+        stats = self.stats[model_name]
+        pending = {self.executor.submit(self._call, model_name, prompt, deadline_at)}
+        hedge_after = stats.p95() if self.hedge else None
+        errors = []
+
+        try:
+            while pending:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                timeout = remaining
+                if hedge_after is not None:
+                    timeout = min(remaining, hedge_after)
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    try:
+                        text, latency = future.result()
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+                    stats.record_success(latency)
+                    return text
+
+                if not done and hedge_after is not None:
+                    # Primary is slower than its p95: race one duplicate against it, unless
+                    # a typical (p50) call could no longer finish before the deadline
+                    hedge_after = None
+                    p50 = stats.p50()
+                    can_finish = p50 is None or p50 < deadline_at - time.monotonic()
+                    if can_finish and self.buckets[model_name].acquire(0):
+                        print(f"⏱️ {model_name} exceeded p95, sending hedged request")
+                        pending.add(self.executor.submit(self._call, model_name, prompt, deadline_at))
+        finally:
+            # Calls still queued behind a saturated pool must not reach the model after we gave up
+            for future in pending:
+                future.cancel()
+
+        # One failure per attempt, whether every call errored or the deadline passed first
+        stats.record_failure()
+        if errors and not pending:
+            raise errors[-1]
+        raise TimeoutError(f"{model_name} did not answer before the deadline")
+
+    def generate(self, prompt, preferred=None):
+        """(text, model name) from the first model that answers within the deadline"""
+        deadline_at = time.monotonic() + self.deadline
+        failures = []
+        models = self.route(preferred)
+        for i, model_name in enumerate(models):
+            attempt_deadline = deadline_at
+            if i < len(models) - 1:
+                attempt_deadline -= (deadline_at - time.monotonic()) * FALLBACK_RESERVE
+            try:
+                return self._attempt(model_name, prompt, attempt_deadline), model_name
+            except Exception as e:
+                print(f"⚠️ {model_name} failed: {e}")
+                failures.append(f"{model_name}: {e}")
+            if time.monotonic() >= deadline_at:
+                break
+        raise LLMUnavailableError("No model answered: " + "; ".join(failures))
@@ -0,0 +1,123 @@
+# dql_local_index.py
+#
+# In-process stand-in for the dql_schema Elasticsearch index. Loads the
+# consolidated output of backend/generate_embeddings.py into one normalized
+# matrix so grouped retrieval is a single matrix-vector product. The matrix
+# can be PCA-truncated and stored as float16/int8 (LOCAL_VECTOR_DTYPE), and
+# memory-mapped from LOCAL_MATRIX_FILE so server workers share one copy.
+
+import json
+import os
+import numpy as np
+
+from dql_lexical import RRF_WINDOW, BM25Index, rrf_fuse
+from dql_scope import ScopeMasks
+from dql_sections import LEXICAL_FIELDS, SECTIONS, section_of
+from dql_vectors import PCA_FILE, dot_scores, mapped_matrix, normalize, project, quantize
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_EMBEDDINGS_FILE = os.path.join(PROJECT_ROOT, "context", "all_embeddings.json")
+LOCAL_VECTOR_DTYPE = os.getenv("LOCAL_VECTOR_DTYPE", "float32")
+# e.g. context/local_matrix.npy; rebuilt automatically when the embeddings or PCA change
+LOCAL_MATRIX_FILE = os.getenv("LOCAL_MATRIX_FILE")
+
+
+class LocalIndex:
+    def __init__(self, docs, vectors, dtype=LOCAL_VECTOR_DTYPE, pca=None, matrix_file=None, sources=()):
+        """`vectors` are raw model embeddings; queries must already be projected with the same `pca`.
+
+        With `matrix_file`, the matrix is memory-mapped from that file, rebuilding it if it is
+        older than any of `sources`.
+        """
+        # Rows are ordered by section and then object type, so every section and every
+        # schema type is a contiguous slice of the matrix that can be scored on its own
+        sections = [section_of(doc) for doc in docs]
+        order = sorted(
+            (i for i, section in enumerate(sections) if section),
+            key=lambda i: (SECTIONS.index(sections[i]), docs[i].get("object_type") or "")
+        )
+        self.docs = [docs[i] for i in order]
+        build = lambda: quantize(project([vectors[i] for i in order], pca), dtype)
+        self.matrix = mapped_matrix(matrix_file, build, len(order), dtype, sources) if matrix_file else build()
+
+        self.section_slices = {}
+        self.type_slices = {}
+        for row, doc in enumerate(self.docs):
+            section = section_of(doc)
+            start, _ = self.section_slices.get(section, (row, row))
+            self.section_slices[section] = (start, row + 1)
+            if section == "schema":
+                start, _ = self.type_slices.get(doc["object_type"], (row, row))
+                self.type_slices[doc["object_type"]] = (start, row + 1)
+
+        self.lexical = BM25Index(self.docs, LEXICAL_FIELDS)
+        self.scopes = ScopeMasks(self.docs)
+
+    @classmethod
+    def load(cls, path=DEFAULT_EMBEDDINGS_FILE, vector_field="embedding", dtype=LOCAL_VECTOR_DTYPE, pca=None,
+             matrix_file=LOCAL_MATRIX_FILE):
+        with open(path, "r", encoding="utf-8") as f:
+            all_data = json.load(f)
+
+        docs, vectors = [], []
+        for records in all_data.values():
+            if not isinstance(records, list):
+                continue
+            for doc in records:
+                if not isinstance(doc, dict) or not isinstance(doc.get(vector_field), list):
+                    continue
+                doc = dict(doc)
+                vectors.append(doc.pop(vector_field))
+                doc.pop("embedding", None)
+                doc.pop("embedding_nl", None)
+                docs.append(doc)
+
+        index = cls(docs, vectors, dtype=dtype, pca=pca, matrix_file=matrix_file, sources=(path, PCA_FILE))
+        print(f"✅ Loaded {len(index.docs)} documents into the local index from {path} "
+              f"({index.matrix.shape[1]} dims, {dtype}, {index.matrix.nbytes / 1e6:.1f} MB)")
+        return index
+
+    def search_sections(self, query_vector, quotas, schema_types=None, query_text=None, scope=None):
+        """Top hits per section, scoring each row at most once.
+
+        With `schema_types`, the schema section only scores those object types' rows.
+        With `query_text`, vector and BM25 rankings are merged with reciprocal rank fusion.
+        Rows outside the request `scope` are dropped before ranking.
+        """
+        query = normalize(query_vector)
+        visible = self.scopes.mask(scope)
+        lexical_scores = self.lexical.scores(query_text) if query_text else None
+        results = {}
+        for section, quota in quotas.items():
+            if section == "schema" and schema_types:
+                spans = [self.type_slices[t] for t in schema_types if t in self.type_slices]
+            else:
+                spans = [self.section_slices[section]] if section in self.section_slices else []
+            if quota <= 0 or not spans:
+                results[section] = []
+                continue
+
+            rows = np.concatenate([np.arange(a, b) for a, b in spans])
+            scores = np.concatenate([dot_scores(self.matrix[a:b], query) for a, b in spans])
+            if visible is not None:
+                rows, scores = rows[visible[rows]], scores[visible[rows]]
+            window = max(quota, RRF_WINDOW) if lexical_scores is not None else quota
+            ranked = [int(rows[i]) for i in self._top(scores, window)]
+
+            if lexical_scores is not None:
+                lexical = [(row, score) for row, score in lexical_scores.items()
+                           if any(a <= row < b for a, b in spans) and (visible is None or visible[row])]
+                lexical.sort(key=lambda item: item[1], reverse=True)
+                ranked = rrf_fuse([ranked, [row for row, _ in lexical[:window]]])
+
+            results[section] = [self.docs[row] for row in ranked[:quota]]
+        return results
+
+    @staticmethod
+    def _top(scores, k):
+        """Indices of the k highest scores, best first"""
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        return top[np.argsort(-scores[top])]
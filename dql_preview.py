@@ -0,0 +1,469 @@
+# dql_preview.py
+#
+# Local preview of generated DQL. The supported subset is translated to SQL
+# and run against a SQLite snapshot of sampled repository metadata
+# (backend/build_preview_snapshot.py). The subset is:
+#   - SELECT [DISTINCT] / COUNT(*)
+#   - WHERE with comparisons, LIKE, IN and IS NULL
+#   - FOLDER/CABINET('/path'[, DESCEND])
+#   - DATE(NOW +/- n), DATE(TODAY), USER
+#   - ORDER BY and ENABLE(RETURN_TOP n)
+# A preview returns a row count scaled up from the sample and a few sample
+# rows in milliseconds. References to attributes the type does not have are
+# reported as errors (InvalidDQL) before the query ever reaches the Content
+# Server. Valid DQL outside the subset (functions, aliases, GROUP BY,
+# subqueries, positional ORDER BY, ...) raises UnsupportedDQL instead.
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
+SCHEMA_FILE = os.path.join(PROJECT_ROOT, "context/schema_catalog.jsonl")
+PREVIEW_SNAPSHOT_FILE = os.getenv("PREVIEW_SNAPSHOT_FILE", os.path.join(PROJECT_ROOT, "context", "preview_snapshot.sqlite"))
+PREVIEW_TIMEOUT_MS = int(os.getenv("PREVIEW_TIMEOUT_MS", "500"))
+PREVIEW_SAMPLE_ROWS = 10
+
+FOLDERS_TABLE = "preview_folders"
+META_TABLE = "preview_meta"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# dm_sysobject attributes shared by dm_document, cabinets and their subtypes; type-specific
+# attributes come from the schema catalog and the exported columns
+SYSOBJECT_ATTRIBUTES = {
+    "r_object_id": "ID",
+    "object_name": "Char (255)",
+    "title": "Char (400)",
+    "subject": "Char (192)",
+    "r_object_type": "Char (32)",
+    "owner_name": "Char (32)",
+    "r_creator_name": "Char (32)",
+    "r_modifier": "Char (32)",
+    "r_creation_date": "Time/Date",
+    "r_modify_date": "Time/Date",
+    "r_access_date": "Time/Date",
+    "r_content_size": "Integer",
+    "a_content_type": "Char (32)",
+    "a_status": "Char (16)",
+    "r_lock_owner": "Char (32)",
+    "i_cabinet_id": "ID"
+}
+
+
+class PreviewError(ValueError):
+    pass
+
+
+class UnsupportedDQL(PreviewError):
+    """Valid DQL outside the subset the preview engine understands"""
+
+
+class InvalidDQL(PreviewError):
+    """DQL that would fail or misbehave on the Content Server"""
+
+
+def sqlite_type(datatype):
+    """SQLite column type for a schema datatype such as 'Char (32)' or 'Time/ Date'"""
+    datatype = re.sub(r"\s+", "", str(datatype)).lower()
+    if datatype.startswith(("integer", "boolean")):
+        return "INTEGER"
+    if datatype.startswith(("double", "float")):
+        return "REAL"
+    return "TEXT"
+
+
+def is_date_type(datatype):
+    return re.sub(r"\s+", "", str(datatype)).lower().startswith(("time", "date"))
+
+
+def load_schema_types(path=SCHEMA_FILE):
+    """{object_type: {attribute: datatype}} from the schema catalog (backend/ingest_schema.py)"""
+    types = {}
+    with open(path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    for record in records:
+        if record.get("object_type") and record.get("attribute"):
+            types.setdefault(record["object_type"].lower(), {})[record["attribute"].lower()] = record.get("type", "")
+    return types
+
+
+TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<string>'(?:[^']|'')*')
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<op><>|!=|<=|>=|=|<|>|\(|\)|,|\*|\+|-|;)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+)""", re.VERBOSE)
+
+COMPARISONS = {"=": "=", "<>": "<>", "!=": "<>", "<": "<", ">": ">", "<=": "<=", ">=": ">="}
+DATE_KEYWORDS = {"today": 0, "yesterday": -1, "tomorrow": 1}
+DATE_INPUT_FORMATS = {"mm/dd/yyyy": "%m/%d/%Y", "dd/mm/yyyy": "%d/%m/%Y", "yyyy-mm-dd": "%Y-%m-%d",
+                      "mm/dd/yyyy hh:mi:ss": "%m/%d/%Y %H:%M:%S", "yyyy/mm/dd": "%Y/%m/%d"}
+
+
+def tokenize(dql):
+    tokens, pos = [], 0
+    # Model output sometimes keeps its markdown code fence
+    text = re.sub(r"^```\w*|```$", "", dql.strip()).strip()
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            raise UnsupportedDQL(f"Unsupported syntax at position {pos}: {text[pos:pos + 10]!r}")
+        kind = match.lastgroup
+        if kind is None:
+            break
+        value = match.group(kind)
+        tokens.append((kind, value.lower() if kind == "word" else value))
+        pos = match.end()
+    return tokens
+
+
+class Translator:
+    """Recursive-descent translation of one DQL statement into SQLite SQL and parameters"""
+
+    def __init__(self, dql, tables, user=None, now=None):
+        """`tables` maps snapshot object types to {attribute: datatype}"""
+        self.tokens = tokenize(dql)
+        self.pos = 0
+        self.tables = tables
+        self.user = user
+        self.now = now or datetime.now()
+        self.params = []
+        self.table = None
+        self.columns = {}
+
+    # --- token helpers ---
+
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else (None, None)
+
+    def accept(self, value):
+        if self.peek()[1] == value:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, value):
+        if not self.accept(value):
+            found = self.peek()[1]
+            raise InvalidDQL(f"Expected {value.upper()!r} but found {found!r}" if found else f"Expected {value.upper()!r}")
+
+    def next(self, kind=None):
+        token = self.peek()
+        if token[0] is None or (kind and token[0] != kind):
+            raise InvalidDQL(f"Expected a {kind or 'token'} but found {token[1]!r}")
+        self.pos += 1
+        return token[1]
+
+    def column(self, name):
+        if name not in self.columns:
+            raise InvalidDQL(f"{self.table} has no attribute '{name}'")
+        return f'"{name}"'
+
+    # --- grammar ---
+
+    def translate(self):
+        """(sql, params, query info) for the statement"""
+        if not self.accept("select"):
+            raise UnsupportedDQL("Only SELECT statements can be previewed")
+        distinct = self.accept("distinct")
+        select_start = self.pos
+        while self.peek()[1] not in ("from", None):
+            self.pos += 1
+        select_end = self.pos
+        self.expect("from")
+        self.table = self.next("word")
+        if self.table not in self.tables:
+            raise UnsupportedDQL(f"Type '{self.table}' is not in the preview snapshot")
+        self.columns = self.tables[self.table]
+        if self.accept("("):
+            raise UnsupportedDQL("Type modifiers such as (ALL) are not supported in previews")
+
+        after_from = self.pos
+        self.pos = select_start
+        select_sql, is_count, output_columns = self.select_list(select_end)
+        self.pos = after_from
+
+        sql = f"SELECT {'DISTINCT ' if distinct else ''}{select_sql} FROM \"{self.table}\""
+        if self.accept("where"):
+            sql += " WHERE " + self.expression()
+        if self.peek()[1] in ("group", "having", "union"):
+            raise UnsupportedDQL(f"{self.peek()[1].upper()} is not supported in previews")
+        if self.accept("order"):
+            self.expect("by")
+            sql += " ORDER BY " + self.order_list()
+
+        return_top = None
+        if self.accept("enable"):
+            self.expect("(")
+            hint = self.next("word")
+            if hint != "return_top":
+                raise UnsupportedDQL(f"Hint {hint.upper()} is not supported in previews")
+            return_top = int(self.next("number"))
+            self.expect(")")
+        self.accept(";")
+        if self.peek()[0] is not None:
+            raise UnsupportedDQL(f"Unsupported clause starting at {self.peek()[1]!r}")
+
+        return sql, self.params, {"table": self.table, "count": is_count, "columns": output_columns,
+                                  "return_top": return_top}
+
+    def select_list(self, end):
+        if self.peek()[1] == "*" and self.pos + 1 == end:
+            self.pos += 1
+            return "*", False, list(self.columns)
+        if self.peek()[1] == "count":
+            self.next()
+            self.expect("(")
+            if self.accept("*"):
+                inner = "*"
+            else:
+                inner = ("DISTINCT " if self.accept("distinct") else "") + self.column(self.next("word"))
+            self.expect(")")
+            if self.pos != end:
+                raise UnsupportedDQL("COUNT can only be previewed on its own (no aliases, other columns or GROUP BY)")
+            return f"COUNT({inner})", True, ["count"]
+
+        names = []
+        while True:
+            kind, name = self.peek()
+            if kind != "word":
+                raise UnsupportedDQL(f"Select list item {name!r} is not supported in previews")
+            self.pos += 1
+            if self.peek()[1] == "(":
+                raise UnsupportedDQL(f"Functions and aggregates such as {name.upper()}() are not supported in previews")
+            self.column(name)
+            names.append(name)
+            if self.pos == end:
+                break
+            if self.peek()[1] == "as":
+                raise UnsupportedDQL("Column aliases (AS) are not supported in previews")
+            if not self.accept(","):
+                raise UnsupportedDQL(f"Unsupported select list syntax at {self.peek()[1]!r}")
+        return ", ".join(f'"{n}"' for n in names), False, names
+
+    def order_list(self):
+        parts = []
+        while True:
+            kind, name = self.peek()
+            if kind == "number":
+                raise UnsupportedDQL("Positional ORDER BY is not supported in previews")
+            if kind == "word" and self.peek(1)[1] == "(":
+                raise UnsupportedDQL(f"Ordering by {name.upper()}() is not supported in previews")
+            part = self.column(self.next("word"))
+            if self.accept("desc"):
+                part += " DESC"
+            else:
+                self.accept("asc")
+            parts.append(part)
+            if not self.accept(","):
+                return ", ".join(parts)
+
+    def expression(self):
+        parts = [self.conjunction()]
+        while self.accept("or"):
+            parts.append(self.conjunction())
+        return " OR ".join(parts)
+
+    def conjunction(self):
+        parts = [self.negation()]
+        while self.accept("and"):
+            parts.append(self.negation())
+        return " AND ".join(parts)
+
+    def negation(self):
+        if self.accept("not"):
+            return f"NOT ({self.negation()})"
+        return self.predicate()
+
+    def predicate(self):
+        if self.accept("("):
+            inner = self.expression()
+            self.expect(")")
+            return f"({inner})"
+        word = self.peek()[1]
+        if word in ("folder", "cabinet") and self.peek(1)[1] == "(":
+            return self.folder_predicate()
+        if word == "any":
+            raise UnsupportedDQL("Repeating attribute predicates (ANY) are not supported in previews")
+
+        left, left_type = self.operand()
+        negated = self.accept("not")
+        if self.accept("like"):
+            return f"{left} {'NOT ' if negated else ''}LIKE {self.operand(left_type)[0]}"
+        if self.accept("in"):
+            self.expect("(")
+            values = [self.operand(left_type)[0]]
+            while self.accept(","):
+                values.append(self.operand(left_type)[0])
+            self.expect(")")
+            return f"{left} {'NOT ' if negated else ''}IN ({', '.join(values)})"
+        if negated:
+            raise InvalidDQL("NOT must be followed by LIKE or IN here")
+        if self.accept("is"):
+            negated = self.accept("not")
+            null = self.next("word")
+            if null not in ("null", "nulldate", "nullstring", "nullint"):
+                raise InvalidDQL(f"Expected NULL after IS but found {null!r}")
+            return f"{left} IS {'NOT ' if negated else ''}NULL"
+
+        kind, op = self.peek()
+        if kind == "word":
+            raise UnsupportedDQL(f"{op.upper()} predicates are not supported in previews")
+        op = self.next("op")
+        if op not in COMPARISONS:
+            raise InvalidDQL(f"Expected a comparison operator but found {op!r}")
+        right, right_type = self.operand(left_type)
+        if left_type and right_type and is_date_type(left_type) != is_date_type(right_type):
+            raise InvalidDQL(f"Comparing a date with a non-date value in '{left} {op} {right}'")
+        return f"{left} {COMPARISONS[op]} {right}"
+
+    def folder_predicate(self):
+        function = self.next("word")
+        self.expect("(")
+        if self.peek()[0] != "string":
+            raise UnsupportedDQL(f"{function.upper()}() is only previewed with a path, e.g. {function.upper()}('/Cabinet')")
+        path = self.string_value(self.next("string")).rstrip("/") or "/"
+        descend = False
+        if self.accept(","):
+            descend = self.next("word") == "descend"
+        self.expect(")")
+        if function == "cabinet" and path.count("/") > 1:
+            raise InvalidDQL(f"CABINET() takes a cabinet path, not a folder path: {path}")
+
+        condition = "folder_path = ?"
+        self.params.append(path)
+        if descend:
+            condition = "(folder_path = ? OR folder_path LIKE ? ESCAPE '\\')"
+            self.params.append(path.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "/%")
+        self.params.append(self.table)
+        return (f"r_object_id IN (SELECT r_object_id FROM {FOLDERS_TABLE} "
+                f"WHERE {condition} AND object_type = ?)")
+
+    def operand(self, expected_type=None):
+        """(sql fragment, datatype or None) for a column, literal, DATE(...) or USER"""
+        kind, value = self.peek()
+        if kind == "string":
+            self.pos += 1
+            self.params.append(self.string_value(value))
+            return "?", None
+        if kind == "number" or (kind == "op" and value == "-" and self.peek(1)[0] == "number"):
+            sign = -1 if self.accept("-") else 1
+            number = self.next("number")
+            self.params.append(sign * (float(number) if "." in number else int(number)))
+            return "?", "Double" if "." in number else "Integer"
+        if kind != "word":
+            raise InvalidDQL(f"Expected a value but found {value!r}")
+
+        self.pos += 1
+        if value == "date" and self.peek()[1] == "(":
+            self.params.append(self.date_value())
+            return "?", "Time/Date"
+        if value == "user":
+            if self.user is None:
+                raise UnsupportedDQL("USER needs the requesting user name to be previewed")
+            self.params.append(self.user)
+            return "?", None
+        if value in ("true", "false"):
+            self.params.append(1 if value == "true" else 0)
+            return "?", "Boolean"
+        if value == "select":
+            raise UnsupportedDQL("Subqueries are not supported in previews")
+        if self.peek()[1] == "(":
+            raise UnsupportedDQL(f"Functions such as {value.upper()}() are not supported in previews")
+        return self.column(value), self.columns.get(value)
+
+    def date_value(self):
+        self.expect("(")
+        word = self.peek()[1]
+        if word == "now":
+            self.next()
+            moment = self.now
+            if self.peek()[1] in ("+", "-"):
+                sign = 1 if self.next() == "+" else -1
+                moment += timedelta(days=sign * float(self.next("number")))
+        elif word in DATE_KEYWORDS:
+            self.next()
+            moment = datetime.combine(self.now.date(), datetime.min.time()) + timedelta(days=DATE_KEYWORDS[word])
+        elif self.peek()[0] == "string":
+            text = self.string_value(self.next())
+            date_format = "mm/dd/yyyy"
+            if self.accept(","):
+                date_format = self.string_value(self.next("string")).lower()
+            if date_format not in DATE_INPUT_FORMATS:
+                raise UnsupportedDQL(f"Date format '{date_format}' is not supported in previews")
+            try:
+                moment = datetime.strptime(text, DATE_INPUT_FORMATS[date_format])
+            except ValueError:
+                raise InvalidDQL(f"'{text}' does not match date format '{date_format}'")
+        else:
+            raise UnsupportedDQL(f"DATE({word}) is not supported in previews")
+        self.expect(")")
+        return moment.strftime(DATE_FORMAT)
+
+    @staticmethod
+    def string_value(token):
+        return token[1:-1].replace("''", "'")
+
+
+class PreviewEngine:
+    def __init__(self, path=PREVIEW_SNAPSHOT_FILE, timeout_ms=PREVIEW_TIMEOUT_MS):
+        self.path = path
+        self.timeout_ms = timeout_ms
+        self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+
+        self.tables, self.sample_fraction = {}, {}
+        for object_type, columns, sampled, total in self.db.execute(
+                f"SELECT object_type, columns, sampled, total FROM {META_TABLE}"):
+            self.tables[object_type] = json.loads(columns)
+            self.sample_fraction[object_type] = sampled / total if total else 1.0
+        print(f"✅ Preview snapshot ready: " + ", ".join(
+            f"{t} ({self.sample_fraction[t]:.1%} sample)" for t in self.tables))
+
+    def _run(self, sql, params):
+        deadline = time.monotonic() + self.timeout_ms / 1000
+        with self.lock:
+            # Abort previews that would scan too long instead of holding the connection
+            self.db.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+            try:
+                return self.db.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                if "interrupted" in str(e):
+                    raise UnsupportedDQL(f"Preview exceeded {self.timeout_ms} ms")
+                raise InvalidDQL(f"Query failed on the snapshot: {e}")
+            finally:
+                self.db.set_progress_handler(None, 0)
+
+    def preview(self, dql, user=None, limit=PREVIEW_SAMPLE_ROWS):
+        """Estimated row count and sample rows for `dql`; raises UnsupportedDQL or InvalidDQL"""
+        start = time.perf_counter()
+        sql, params, info = Translator(dql, self.tables, user=user).translate()
+        fraction = self.sample_fraction[info["table"]]
+
+        if info["count"]:
+            matched = self._run(sql, params)[0][0]
+            estimate = round(matched / fraction)
+            rows = [{"count": estimate}]
+        else:
+            matched = self._run(f"SELECT COUNT(*) FROM ({sql})", params)[0][0]
+            estimate = round(matched / fraction)
+            if info["return_top"] is not None:
+                estimate = min(estimate, info["return_top"])
+            row_limit = min(limit, info["return_top"]) if info["return_top"] is not None else limit
+            rows = [dict(row) for row in self._run(f"{sql} LIMIT {int(row_limit)}", params)]
+
+        return {
+            "sql": sql,
+            "estimated_count": estimate,
+            "sample_matches": matched,
+            "sample_fraction": round(fraction, 4),
+            "columns": info["columns"],
+            "rows": rows,
+            "took_ms": round((time.perf_counter() - start) * 1000, 2)
+        }
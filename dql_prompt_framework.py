@@ -3,64 +3,317 @@
 import requests
 from sentence_transformers import SentenceTransformer
 import google.generativeai as genai
+import json
 import os
 from dotenv import load_dotenv
+from dql_sections import (
+    ES_LEXICAL_FIELDS, SECTIONS, SECTION_FIELDS, empty_context, load_quotas, section_filter, section_of
+)
+from dql_lexical import RRF_WINDOW
+from dql_cassette import CASSETTE_MODE, cassette
+from dql_llm import LLMScheduler
+from dql_vectors import load_pca, project
+from dql_corpus import corpus_lock, refresh_corpus, source_files
+from dql_entities import INPUT_FILES as ENTITY_FILES, merge_exact_schema
+from dql_reload import CONTEXT_RELOAD, SnapshotReloader
+from dql_scope import RequestScope
 load_dotenv()
 
 # --- Configuration ---
 ELASTIC_URL = os.getenv("ELASTIC_URL")
 INDEX_NAME = "dql_schema"
 TOP_K = 5
+# Dense vector field created by backend/upload_to_elasticsearch.py (quantized, PCA-projected)
+VECTOR_FIELD = "embedding"
+
+# "elastic" searches the dql_schema index, "local" searches context/all_embeddings.json in-process
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "elastic")
+SECTION_QUOTAS = load_quotas(TOP_K)
+# Smaller quotas for follow-up turns in a session; only unseen documents reach the prompt
+REFINE_QUOTAS = load_quotas(0, env_var="REFINE_QUOTAS", defaults={
+    "schema": 3, "example": 1, "guideline": 1, "pattern": 1, "feedback_example": 1
+})
+
+# Optional id -> document table written by backend/upload_to_elasticsearch.py (and by
+# hot reload's index sync, see dql_elastic_index.py). When set, searches return only ids
+# and scores and hits are hydrated in-process. It is part of the retrieval snapshot,
+# so a re-upload is picked up by hot reload.
+DOC_METADATA_FILE = os.getenv("DOC_METADATA_FILE")
+HYDRATE_HITS = bool(DOC_METADATA_FILE) and RETRIEVAL_BACKEND != "local"
+
+# Per-type summary index from backend/build_type_summaries.py. When set, schema attributes
+# are only searched within the object types that best match the request.
+TYPE_SUMMARIES_FILE = os.getenv("TYPE_SUMMARIES_FILE")
+
+# Hybrid retrieval: BM25 over attribute/description/source_text fused with kNN by
+# reciprocal rank fusion, in the same single round trip
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "0") == "1"
+
+# Cross-encoder rerank of retrieved candidates before prompt building (see dql_rerank.py).
+# Raise SECTION_QUOTAS when enabling it so there are candidates to choose from.
+RERANK = os.getenv("RERANK", "0") == "1"
+
+# Exact matching of record class codes, attribute names and ID patterns in the request.
+# Matched schema records are injected ahead of the schema kNN hits, which fill the rest
+# of the schema quota.
+ENTITY_RECOGNITION = os.getenv("ENTITY_RECOGNITION", "1") == "1"
 
 # Load embedding model
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+embed_model = SentenceTransformer(EMBEDDING_MODEL)
+
+# PCA truncation the index was built with (PCA_FILE); queries are projected the same way
+pca = load_pca()
 
 # Load Gemini config from environment
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL")
+# Faster/cheaper model used when GEMINI_MODEL errors, times out or is rate limited
+GEMINI_FALLBACK_MODEL = os.getenv("GEMINI_FALLBACK_MODEL")
+# Fast model for requests the local router classifies as simple (see dql_router.py);
+# unset, every request goes to GEMINI_MODEL
+GEMINI_FAST_MODEL = os.getenv("GEMINI_FAST_MODEL")
 
-# Setup Gemini API
-if not GEMINI_API_KEY:
+# Setup Gemini API (replaying a cassette needs no key)
+if not GEMINI_API_KEY and CASSETTE_MODE != "replay":
     raise ValueError("Missing GEMINI_API_KEY environment variable")
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel(GEMINI_MODEL)
-
-def retrieve_context(user_input, k=TOP_K):
-    query_vector = embed_model.encode(user_input).tolist()
-
-    es_query = {
-        "size": 20,
-        "knn": {
-            "field": "embedding_nl",
-            "query_vector": query_vector,
-            "k": k,
-            "num_candidates": 100
-        }
+if GEMINI_API_KEY:
+    genai.configure(api_key=GEMINI_API_KEY)
+
+def gemini_client(model_name):
+    model = genai.GenerativeModel(model_name)
+    def call(prompt, timeout):
+        return model.generate_content(prompt, request_options={"timeout": timeout}).text
+    return cassette.wrap(f"llm:{model_name}", call, key_fn=lambda prompt, timeout: prompt)
+
+llm_models = list(dict.fromkeys(m for m in (GEMINI_MODEL, GEMINI_FALLBACK_MODEL, GEMINI_FAST_MODEL) if m))
+llm = LLMScheduler({m: gemini_client(m) for m in llm_models}, GEMINI_MODEL, GEMINI_FALLBACK_MODEL)
+
+class RetrievalSnapshot:
+    """Everything retrieval reads from context files; replaced as a whole on hot reload"""
+
+    def __init__(self, local_index=None, type_index=None, entity_recognizer=None, doc_metadata=None):
+        self.local_index = local_index
+        self.type_index = type_index
+        self.entity_recognizer = entity_recognizer
+        self.doc_metadata = doc_metadata
+
+def load_local_index():
+    from dql_local_index import LocalIndex
+    if not rebuild_corpus:
+        return LocalIndex.load(pca=pca)
+    # Reload: the first worker to get the lock re-embeds changed records, rewrites
+    # all_embeddings.json and (via LocalIndex.load) the matrix file; the others find
+    # both fresh and only load and map them
+    with corpus_lock():
+        if refresh_corpus(embed_model.encode, EMBEDDING_MODEL):
+            return LocalIndex.load(pca=pca)
+    return LocalIndex.load(pca=pca)
+
+def refresh_elastic_index():
+    # Reload: the first worker to get the lock re-embeds changed records and syncs only
+    # the changed documents into the live index; the others find both stamps current
+    from dql_elastic_index import refresh_index
+    with corpus_lock():
+        refresh_corpus(embed_model.encode, EMBEDDING_MODEL)
+        refresh_index(pca)
+
+def build_snapshot():
+    local_index = load_local_index() if RETRIEVAL_BACKEND == "local" else None
+    if rebuild_corpus and RETRIEVAL_BACKEND != "local":
+        # Before loading doc metadata, which the sync rewrites
+        refresh_elastic_index()
+
+    type_index = None
+    if TYPE_SUMMARIES_FILE:
+        from dql_type_index import TypeSummaryIndex
+        type_index = TypeSummaryIndex.load(TYPE_SUMMARIES_FILE, pca=pca)
+
+    entity_recognizer = None
+    if ENTITY_RECOGNITION:
+        from dql_entities import EntityRecognizer
+        entity_recognizer = EntityRecognizer.load()
+
+    doc_metadata = None
+    if HYDRATE_HITS:
+        with open(DOC_METADATA_FILE, "r", encoding="utf-8") as f:
+            doc_metadata = json.load(f)
+        print(f"✅ Loaded metadata for {len(doc_metadata)} indexed documents from {DOC_METADATA_FILE}")
+
+    return RetrievalSnapshot(local_index, type_index, entity_recognizer, doc_metadata)
+
+# Hot reload (CONTEXT_RELOAD=1, see dql_reload.py). Changed records are re-embedded (the
+# embedding cache covers the rest); the local backend reloads its matrix, and with
+# Elasticsearch only changed documents are upserted into the live index, never recreated.
+# Rebuilding is enabled after the initial load, so startup reads all_embeddings.json as-is.
+rebuild_corpus = False
+retrieval = SnapshotReloader(build_snapshot, source_files() + ENTITY_FILES + [TYPE_SUMMARIES_FILE, DOC_METADATA_FILE])
+rebuild_corpus = CONTEXT_RELOAD
+
+router = None
+if GEMINI_FAST_MODEL and GEMINI_FAST_MODEL != GEMINI_MODEL:
+    from dql_router import ComplexityRouter
+    router = ComplexityRouter.load(lambda texts: project(embed_model.encode(texts), pca))
+
+reranker = None
+if RERANK:
+    from dql_rerank import Reranker
+    reranker = Reranker()
+
+def hit_source(hit, doc_metadata=None):
+    """Document for a search hit, from the snapshot's metadata table when hits carry no _source"""
+    if doc_metadata is None:
+        return hit.get("_source")
+    doc = doc_metadata.get(str(hit.get("_id")))
+    if doc is None:
+        print(f"⚠️ Document {hit.get('_id')} missing from {DOC_METADATA_FILE}; re-run the upload to refresh it")
+    return doc
+
+def _es_msearch(ndjson_body):
+    # filter_path trims the response envelope down to what search_elastic_sections reads
+    res = requests.post(
+        f"{ELASTIC_URL}/{INDEX_NAME}/_msearch",
+        params={"filter_path": "responses.error,responses.hits.hits._id,responses.hits.hits._score,responses.hits.hits._source"},
+        headers={"Content-Type": "application/x-ndjson"},
+        data=ndjson_body
+    )
+    return res.json()
+
+es_msearch = cassette.wrap(
+    "elastic:msearch", _es_msearch,
+    key_fn=lambda body: [INDEX_NAME, [json.loads(line) for line in body.splitlines() if line]]
+)
+
+def section_search_body(section, quota, query_vector, schema_types=None, query_text=None, scope=None):
+    """kNN search for one section, or with `query_text` an RRF of kNN and BM25 results.
+
+    The section filter and the request `scope` are both applied as kNN pre-filters.
+    """
+    section_filter_query = {"bool": {"filter": [section_filter(section, schema_types)] +
+                                               (scope or RequestScope()).es_filters()}}
+    body = {
+        "size": quota,
+        "_source": False if HYDRATE_HITS else {"includes": SECTION_FIELDS[section]}
+    }
+    knn = {
+        "field": VECTOR_FIELD,
+        "query_vector": query_vector,
+        "k": quota,
+        "num_candidates": max(100, quota * 10),
+        "filter": section_filter_query
     }
+    if not query_text:
+        body["knn"] = knn
+        return body
 
-    res = requests.post(f"{ELASTIC_URL}/{INDEX_NAME}/_search", json=es_query)
-    hits = res.json().get("hits", {}).get("hits", [])
-
-    grouped_context = {
-        "schema": [],
-        "example": [],
-        "guideline": [],
-        "pattern": [],
-        "mapping": [],
-        "glossary": [],
-        "intent_hint": [],
-        "policy": [],
-        "user_context": [],
-        "feedback_example": []
+    window = max(quota, RRF_WINDOW)
+    body["retriever"] = {
+        "rrf": {
+            "retrievers": [
+                {"knn": dict(knn, k=window)},
+                {"standard": {"query": {"bool": {
+                    "must": {"multi_match": {"query": query_text, "fields": ES_LEXICAL_FIELDS}},
+                    "filter": section_filter_query
+                }}}}
+            ],
+            "rank_window_size": window
+        }
     }
+    return body
+
+def search_elastic_sections_batch(searches, doc_metadata=None):
+    """One _msearch round trip for several requests, with a type-filtered sub-query per section.
+
+    `searches` holds (query_vector, quotas, schema_types, query_text, scope) tuples;
+    `doc_metadata` hydrates hits when HYDRATE_HITS (defaults to the current snapshot's).
+    """
+    if doc_metadata is None:
+        doc_metadata = retrieval.current.doc_metadata
+    plans, lines = [], []
+    for query_vector, quotas, schema_types, query_text, scope in searches:
+        sections = [s for s in SECTIONS if quotas.get(s, 0) > 0]
+        plans.append(sections)
+        for section in sections:
+            lines.append("{}")
+            lines.append(json.dumps(section_search_body(section, quotas[section], query_vector, schema_types, query_text, scope)))
+
+    results = [empty_context() for _ in searches]
+    if not lines:
+        return results
+
+    responses = iter(es_msearch("\n".join(lines) + "\n").get("responses", []))
+
+    for grouped_context, sections in zip(results, plans):
+        for section in sections:
+            response = next(responses, {})
+            if "error" in response:
+                print(f"⚠️ Retrieval for section '{section}' failed: {response['error']}")
+                continue
+            for hit in response.get("hits", {}).get("hits", []):
+                doc = hit_source(hit, doc_metadata)
+                if doc is None:
+                    continue
+                # Guard against index documents the section filter and section_of() disagree on
+                if section_of(doc) == section:
+                    grouped_context[section].append(doc)
+    return results
+
+def search_elastic_sections(query_vector, quotas, schema_types=None, query_text=None, scope=None):
+    return search_elastic_sections_batch([(query_vector, quotas, schema_types, query_text, scope)])[0]
+
+def embed_queries(user_inputs, pool=None):
+    """Query vectors for a batch of requests, optionally spread over a SentenceTransformer process pool"""
+    if pool is not None:
+        vectors = embed_model.encode_multi_process(user_inputs, pool)
+    else:
+        vectors = embed_model.encode(user_inputs)
+    return project(vectors, pca).tolist()
+
+def retrieve_contexts(user_inputs, quotas=None, query_vectors=None, scope=None):
+    """Grouped context for several requests, fetched from Elasticsearch in a single round trip.
+
+    `scope` (a RequestScope) limits retrieval to the documents the requester may see.
+    """
+    quotas = quotas or SECTION_QUOTAS
+    if query_vectors is None:
+        query_vectors = embed_queries(user_inputs)
+
+    # One snapshot for the whole request, even if a reload swaps in a new one meanwhile
+    snapshot = retrieval.current
+    entity_recognizer, type_index = snapshot.entity_recognizer, snapshot.type_index
+
+    plans = []
+    for user_input, query_vector in zip(user_inputs, query_vectors):
+        entities = entity_recognizer.recognize(user_input) if entity_recognizer else {"schema": [], "notes": []}
+        if entities["schema"]:
+            print(f"\U0001F3AF Exact attribute matches: {', '.join(s['attribute'] for s in entities['schema'])}")
+
+        schema_types = None
+        if type_index is not None and quotas.get("schema", 0) > 0:
+            schema_types = type_index.select(query_vector)
+            print(f"\U0001F5C2️ Schema search scoped to types: {', '.join(schema_types)}")
+
+        query_text = user_input if HYBRID_RETRIEVAL else None
+        plans.append((entities, (query_vector, quotas, schema_types, query_text, scope)))
+
+    if snapshot.local_index is not None:
+        contexts = []
+        for _, search in plans:
+            grouped_context = empty_context()
+            grouped_context.update(snapshot.local_index.search_sections(*search))
+            contexts.append(grouped_context)
+    else:
+        contexts = search_elastic_sections_batch([search for _, search in plans], snapshot.doc_metadata)
+
+    for (entities, _), grouped_context in zip(plans, contexts):
+        grouped_context["schema"] = merge_exact_schema(entities["schema"], grouped_context["schema"],
+                                                       quotas.get("schema", 0))
+        grouped_context["exact_match"] = entities["notes"]
+    return contexts
 
-    for hit in hits:
-        doc = hit["_source"]
-        doc_type = doc.get("type")
-        if doc_type in grouped_context:
-            grouped_context[doc_type].append(doc)
-        elif doc.get("source") == "feedback":
-            grouped_context["feedback_example"].append(doc)
+def retrieve_context(user_input, quotas=None, scope=None, query_vector=None):
+    query_vectors = [query_vector] if query_vector is not None else None
+    grouped_context = retrieve_contexts([user_input], quotas, query_vectors, scope)[0]
 
     print("\U0001F50E Retrieved feedback examples:")
     for fb in grouped_context["feedback_example"]:
@@ -72,17 +325,10 @@ def retrieve_context(user_input, k=TOP_K):
 
     return grouped_context
 
-def build_prompt(user_input, context):
+def format_context(context):
+    """Prompt lines for the retrieved context sections (everything but user context)"""
     parts = []
 
-    parts.append("You are a Documentum DQL assistant.")
-    parts.append("Use the following schemas, guidelines, and examples to answer accurately.")
-
-    if context["user_context"]:
-        parts.append("\nUser context:")
-        for item in context["user_context"]:
-            parts.append(f"- {item['content']}")
-
     if context["glossary"]:
         parts.append("\nGlossary:")
         for item in context["glossary"]:
@@ -93,6 +339,17 @@ def build_prompt(user_input, context):
         for g in context["guideline"] + context["pattern"] + context["policy"]:
             parts.append(f"- {g['content']}")
 
+    hints = context.get("intent_hint", []) + context.get("mapping", [])
+    if hints:
+        parts.append("\nIntent hints and mappings:")
+        for item in hints:
+            parts.append(f"- {item['title']}: {item['content']}" if item.get("title") else f"- {item['content']}")
+
+    if context.get("exact_match"):
+        parts.append("\nExact matches in the request:")
+        for item in context["exact_match"]:
+            parts.append(f"- {item['content']}")
+
     if context["schema"]:
         parts.append("\nSchema attributes:")
         for s in context["schema"]:
@@ -115,13 +372,94 @@ def build_prompt(user_input, context):
         for ex in context["example"][:3]:
             parts.append(f"- NL: {ex['nl']}\n  DQL: {ex['dql']}")
 
+    return parts
+
+def build_prompt(user_input, context):
+    parts = []
+
+    parts.append("You are a Documentum DQL assistant.")
+    parts.append("Use the following schemas, guidelines, and examples to answer accurately.")
+
+    if context["user_context"]:
+        parts.append("\nUser context:")
+        for item in context["user_context"]:
+            parts.append(f"- {item['content']}")
+
+    parts.extend(format_context(context))
+
     parts.append(f"\nUser request:\n\"{user_input}\"")
     parts.append("\nDQL query:")
 
     return "\n".join(parts)
 
-def generate_dql(user_input):
-    context = retrieve_context(user_input)
+def build_refine_prompt(user_input, session, delta_context):
+    """Compact follow-up prompt: previous turns, current DQL and only newly retrieved context"""
+    parts = []
+
+    parts.append("You are a Documentum DQL assistant refining a query in an ongoing conversation.")
+    parts.append("Apply the refinement to the current DQL query and keep everything else unchanged.")
+
+    user_context = session.user_context + delta_context.get("user_context", [])
+    if user_context:
+        parts.append("\nUser context:")
+        for item in user_context:
+            parts.append(f"- {item['content']}")
+
+    parts.append("\nConversation so far:")
+    for turn in session.turns:
+        parts.append(f"- NL: {turn['nl']}\n  DQL: {turn['dql']}")
+
+    extra = format_context(delta_context)
+    if extra:
+        parts.append("\nAdditional context for this refinement:")
+        parts.extend(extra)
+
+    parts.append(f"\nCurrent DQL query:\n{session.last_dql}")
+    parts.append(f"\nRefinement request:\n\"{user_input}\"")
+    parts.append("\nUpdated DQL query:")
+
+    return "\n".join(parts)
+
+def refine_dql(user_input, session, scope=None):
+    """Follow-up turn: retrieve only what the session has not seen and send a refine prompt"""
+    context = retrieve_context(user_input, REFINE_QUOTAS, scope)
+    if reranker is not None:
+        context = reranker.rerank(user_input, context)
+    delta = session.merge_context(context)
+    delta["exact_match"] = context.get("exact_match", [])
+    prompt = build_refine_prompt(user_input, session, delta)
+
+    print("\n\U0001F501 Refine prompt for Gemini:")
+    print("=" * 40)
+    print(prompt)
+    print("=" * 40)
+
+    text, model_used = llm.generate(prompt)
+    print(f"\U0001F916 Answered by {model_used}")
+    dql = text.strip()
+    session.add_turn(user_input, dql)
+    return dql, prompt
+
+def choose_model(user_input, query_vector):
+    """Model for a new request: the fast one if the router deems it simple, else None (the default)"""
+    if router is None:
+        return None
+    decision = router.classify(user_input, query_vector, retrieval.current.entity_recognizer)
+    model_name = GEMINI_FAST_MODEL if decision.simple else GEMINI_MODEL
+    router.log(user_input, decision, model_name)
+    return model_name
+
+def generate_dql(user_input, session=None, scope=None, refine=False):
+    """DQL for a new request; with `refine`, a change to the session's previous DQL instead"""
+    if refine and session is not None and session.last_dql:
+        return refine_dql(user_input, session, scope)
+
+    query_vector = embed_queries([user_input])[0]
+    context = retrieve_context(user_input, scope=scope, query_vector=query_vector)
+    if reranker is not None:
+        context = reranker.rerank(user_input, context)
+    if session is not None:
+        context["user_context"] = session.user_context + context["user_context"]
     prompt = build_prompt(user_input, context)
 
     print("\n\U0001F50E Prompt used for Gemini:")
@@ -133,8 +471,13 @@ def generate_dql(user_input):
     for item in context["user_context"]:
         print("-", item["content"])
 
-    response = model.generate_content(prompt)
-    return response.text.strip(), prompt
+    text, model_used = llm.generate(prompt, preferred=choose_model(user_input, query_vector))
+    print(f"\U0001F916 Answered by {model_used}")
+    dql = text.strip()
+    if session is not None:
+        session.merge_context(context)
+        session.add_turn(user_input, dql)
+    return dql, prompt
 
 # Example usage
 if __name__ == "__main__":
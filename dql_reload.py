@@ -0,0 +1,91 @@
+# dql_reload.py
+#
+# Hot reload of the retrieval context. A daemon thread polls the context files
+# (size and mtime). Once a change has settled for one poll interval, a new
+# snapshot is built in the background and swapped in with a single reference
+# assignment. Requests read `current` once and keep that snapshot to the end,
+# so in-flight requests never see a half-built one. A snapshot that fails to
+# build (e.g. a file saved mid-edit) is logged and the old one stays live.
+#
+#   CONTEXT_RELOAD=1                  enable watching (off by default)
+#   CONTEXT_RELOAD_INTERVAL_SECONDS=2
+
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+
+CONTEXT_RELOAD = os.getenv("CONTEXT_RELOAD", "0") == "1"
+RELOAD_INTERVAL_SECONDS = float(os.getenv("CONTEXT_RELOAD_INTERVAL_SECONDS", "2"))
+
+
+def file_signature(paths):
+    signature = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature[path] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature[path] = None
+    return signature
+
+
+def signature_version(signature):
+    """Short stable id for a set of file signatures, equal in every process that sees the same files"""
+    text = json.dumps(sorted(signature.items()), default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+class SnapshotReloader:
+    def __init__(self, build, paths, interval=RELOAD_INTERVAL_SECONDS):
+        """`build()` returns a new snapshot from the files in `paths`; the first one is built now"""
+        self.build = build
+        self.paths = [p for p in paths if p]
+        self.interval = interval
+        self.loaded = file_signature(self.paths)
+        self.current = build()
+        # Changes with every swap; part of cache keys for answers built from the snapshot
+        self.version = signature_version(self.loaded)
+        self.thread = None
+
+    def start(self):
+        """Start watching in this process; a no-op if already running (threads do not survive fork)"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._watch, name="context-reload", daemon=True)
+        self.thread.start()
+        print(f"\U0001F440 Watching {len(self.paths)} context files for changes")
+
+    def _watch(self):
+        pending = None
+        while True:
+            time.sleep(self.interval)
+            signature = file_signature(self.paths)
+            if signature == self.loaded:
+                pending = None
+            elif signature != pending:
+                # Changed since the last poll: wait until the writes settle
+                pending = signature
+            else:
+                self.reload(signature)
+                pending = None
+
+    def reload(self, signature=None):
+        signature = signature or file_signature(self.paths)
+        changed = [os.path.basename(p) for p in self.paths if signature.get(p) != self.loaded.get(p)]
+        print(f"\U0001F504 Context changed ({', '.join(changed) or 'forced'}), rebuilding retrieval snapshot...")
+        start = time.monotonic()
+        try:
+            snapshot = self.build()
+        except Exception:
+            print(f"⚠️ Reload failed, keeping the current snapshot:\n{traceback.format_exc()}")
+            # Retry once the files change again rather than on every poll
+            self.loaded = signature
+            return False
+        self.current = snapshot
+        self.loaded = signature
+        self.version = signature_version(signature)
+        print(f"✅ Retrieval snapshot swapped in after {time.monotonic() - start:.1f}s")
+        return True
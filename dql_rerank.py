@@ -0,0 +1,88 @@
+# dql_rerank.py
+#
+# Optional rerank stage between retrieve_context and build_prompt. A small
+# local cross-encoder scores every retrieved candidate against the request in
+# one batched forward pass, and only the best few per section reach the
+# prompt. Scores are cached per (request, document text) pair. Exact matches
+# injected by dql_entities.py (flagged "exact_match") are always kept.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from sentence_transformers import CrossEncoder
+
+from dql_sections import load_quotas
+
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+
+# How many candidates per section survive reranking (override with RERANK_KEEP="schema=5")
+DEFAULT_KEEP = {
+    "schema": 4,
+    "example": 2,
+    "guideline": 2,
+    "pattern": 1,
+    "mapping": 1,
+    "glossary": 1,
+    "intent_hint": 1,
+    "policy": 1,
+    "user_context": 2,
+    "feedback_example": 3
+}
+
+
+def doc_text(doc):
+    """Text the cross-encoder compares with the request, matching what build_prompt shows"""
+    if doc.get("attribute"):
+        return f"{doc['attribute']}: {doc.get('description', '')}"
+    if doc.get("nl"):
+        return doc["nl"]
+    if doc.get("title"):
+        return f"{doc['title']}: {doc.get('content', '')}"
+    return str(doc.get("content", ""))
+
+
+class Reranker:
+    def __init__(self, model_name=RERANK_MODEL, cache_size=RERANK_CACHE_SIZE):
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.keep = load_quotas(1, env_var="RERANK_KEEP", defaults=DEFAULT_KEEP)
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        # Server requests and bulk_translate.py rerank from several threads at once
+        self.lock = threading.Lock()
+
+    def score(self, query, texts):
+        scores = {}
+        with self.lock:
+            for text in texts:
+                if (query, text) in self.cache:
+                    self.cache.move_to_end((query, text))
+                    scores[text] = self.cache[(query, text)]
+        missing = list(dict.fromkeys(t for t in texts if t not in scores))
+        if missing:
+            # Predict outside the lock; two threads may occasionally score the same pair
+            predicted = self.model.predict([(query, t) for t in missing], batch_size=max(len(missing), 1))
+            with self.lock:
+                for text, score in zip(missing, predicted):
+                    scores[text] = self.cache[(query, text)] = float(score)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return [scores[text] for text in texts]
+
+    def rerank(self, query, context):
+        """Copy of `context` with each section cut to its exact matches plus the best of the rest, `keep` in total"""
+        start = time.perf_counter()
+        candidates = [(section, doc) for section in self.keep for doc in context.get(section, [])
+                      if not doc.get("exact_match")]
+        scores = self.score(query, [doc_text(doc) for _, doc in candidates])
+
+        reranked = dict(context)
+        for section, keep in self.keep.items():
+            pinned = [doc for doc in context.get(section, []) if doc.get("exact_match")]
+            scored = [(s, doc) for (sec, doc), s in zip(candidates, scores) if sec == section]
+            scored.sort(key=lambda item: item[0], reverse=True)
+            reranked[section] = pinned + [doc for _, doc in scored[:max(keep - len(pinned), 0)]]
+
+        print(f"\U0001F3C5 Reranked {len(candidates)} candidates in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return reranked
@@ -0,0 +1,151 @@
+# dql_router.py
+#
+# Complexity-based model routing. Simple requests (a single-table count, one
+# date filter) go to a fast, cheap model and everything else to the strong
+# model. The decision is made locally from:
+#   - how complex the DQL of the most similar known examples is, weighted by
+#     embedding similarity;
+#   - clause keywords in the request (per, group, latest, audit, ...);
+#   - how many schema attributes the request names exactly;
+#   - request length.
+# A request that resembles no known example is treated as complex.
+#
+#   ROUTER_SIMPLE_MAX=1.0        highest score still routed to the fast model
+#   ROUTER_MIN_SIMILARITY=0.5    nearest example must be at least this similar
+#   ROUTING_LOG=logs/routing.jsonl   optional decision log
+
+import json
+import os
+import re
+import threading
+import time
+import numpy as np
+
+from dql_vectors import normalize
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
+EXAMPLE_FILES = [
+    os.path.join(PROJECT_ROOT, "context", "examples_revised.json"),
+    os.path.join(PROJECT_ROOT, "context", "feedback_examples.json")
+]
+
+SIMPLE_MAX = float(os.getenv("ROUTER_SIMPLE_MAX", "1.0"))
+MIN_SIMILARITY = float(os.getenv("ROUTER_MIN_SIMILARITY", "0.5"))
+NEIGHBORS = int(os.getenv("ROUTER_K", "5"))
+ROUTING_LOG = os.getenv("ROUTING_LOG")
+
+KEYWORD_WEIGHT = 0.75
+ATTRIBUTE_WEIGHT = 0.5
+LONG_REQUEST_WORDS = 25
+LONG_REQUEST_WEIGHT = 1.0
+
+# Phrases that usually mean grouping, ordering, several conditions or system types
+COMPLEX_KEYWORDS = [
+    "per", "each", "group", "grouped", "by type", "by owner", "sorted", "order by", "top", "latest",
+    "most recent", "oldest", "largest", "audit", "history", "versions", "acl", "permission",
+    "who changed", "except", "excluding", "not in", "between", "compare", "both", "either",
+    "join", "related", "average", "sum", "duplicate"
+]
+KEYWORD_RE = re.compile(r"\b(" + "|".join(re.escape(k) for k in COMPLEX_KEYWORDS) + r")\b", re.IGNORECASE)
+SYSTEM_TYPES_RE = re.compile(r"\b(dm_audittrail|dm_acl|dmr_content|dm_relation|dmi_queue_item|dm_user|dm_group)\b",
+                             re.IGNORECASE)
+
+
+def dql_complexity(dql):
+    """Structural complexity of a DQL statement; 0-1 is a simple single-table query"""
+    text = re.sub(r"'(?:[^']|'')*'", "''", str(dql)).upper()
+    score = 2 * max(len(re.findall(r"\bSELECT\b", text)) - 1, 0)
+    from_clause = re.search(r"\bFROM\b(.*?)(\bWHERE\b|\bORDER\b|\bGROUP\b|\bENABLE\b|;|$)", text, re.DOTALL)
+    if from_clause:
+        score += 2 * from_clause.group(1).count(",")
+    score += len(re.findall(r"\b(AND|OR)\b", text))
+    score += len(re.findall(r"\b(GROUP BY|HAVING|ORDER BY|UNION|ANY|EXISTS|ENABLE)\b", text))
+    if SYSTEM_TYPES_RE.search(text):
+        score += 1
+    return score
+
+
+def load_examples(paths=EXAMPLE_FILES):
+    """(nl, dql) pairs from the curated examples and compacted good feedback"""
+    pairs = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        pairs += [(r["nl"], r["dql"]) for r in records
+                  if r.get("nl") and r.get("dql") and r.get("score", 1) > 0]
+    return pairs
+
+
+class RouteDecision:
+    def __init__(self, simple, score, similarity, features):
+        self.simple = simple
+        self.score = score
+        self.similarity = similarity
+        self.features = features
+
+    def describe(self):
+        details = ", ".join(f"{k} {v:.2f}" if isinstance(v, float) else f"{k} {v}" for k, v in self.features.items())
+        return f"{'simple' if self.simple else 'complex'} (score {self.score:.2f}, nearest {self.similarity:.2f}: {details})"
+
+
+class ComplexityRouter:
+    def __init__(self, examples, vectors, simple_max=SIMPLE_MAX, min_similarity=MIN_SIMILARITY,
+                 neighbors=NEIGHBORS, log_path=ROUTING_LOG):
+        """`examples` are (nl, dql) pairs and `vectors` their embeddings, in the same space as query vectors"""
+        self.examples = examples
+        self.matrix = normalize(vectors) if len(examples) else np.zeros((0, 0), dtype=np.float32)
+        self.complexity = np.asarray([dql_complexity(dql) for _, dql in examples], dtype=np.float32)
+        self.simple_max = simple_max
+        self.min_similarity = min_similarity
+        self.neighbors = neighbors
+        self.log_path = log_path
+        self.log_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, embed_fn, paths=EXAMPLE_FILES, **kwargs):
+        examples = load_examples(paths)
+        vectors = embed_fn([nl for nl, _ in examples]) if examples else []
+        router = cls(examples, vectors, **kwargs)
+        simple = int((router.complexity <= router.simple_max).sum())
+        print(f"✅ Model router ready: {len(examples)} examples ({simple} simple), "
+              f"threshold {router.simple_max}, min similarity {router.min_similarity}")
+        return router
+
+    def classify(self, user_input, query_vector, recognizer=None):
+        features = {}
+        similarity = 0.0
+        if len(self.examples):
+            scores = self.matrix @ normalize(query_vector)
+            top = np.argsort(-scores)[:self.neighbors]
+            weights = np.clip(scores[top], 0, None)
+            similarity = float(scores[top[0]])
+            if weights.sum() > 0:
+                features["neighbors"] = float((weights * self.complexity[top]).sum() / weights.sum())
+            else:
+                features["neighbors"] = float(self.complexity[top].mean())
+
+        features["keywords"] = len({m.lower() for m in KEYWORD_RE.findall(user_input)})
+        if recognizer is not None:
+            features["attributes"] = len(recognizer.recognize(user_input)["schema"])
+        features["words"] = len(user_input.split())
+
+        score = (features.get("neighbors", self.simple_max + 1)
+                 + KEYWORD_WEIGHT * features["keywords"]
+                 + ATTRIBUTE_WEIGHT * max(features.get("attributes", 0) - 1, 0)
+                 + (LONG_REQUEST_WEIGHT if features["words"] > LONG_REQUEST_WORDS else 0))
+        simple = score <= self.simple_max and similarity >= self.min_similarity
+        return RouteDecision(simple, score, similarity, features)
+
+    def log(self, user_input, decision, model_name):
+        print(f"\U0001F9ED Routed to {model_name}: {decision.describe()}")
+        if not self.log_path:
+            return
+        entry = {"time": time.time(), "input": user_input, "model": model_name, "simple": decision.simple,
+                 "score": round(decision.score, 3), "similarity": round(decision.similarity, 3),
+                 "features": decision.features}
+        with self.log_lock:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
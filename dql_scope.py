@@ -0,0 +1,119 @@
+# dql_scope.py
+#
+# Per-request retrieval scope. Context documents can be restricted to users
+# or groups and tagged with the cabinet prefixes they apply to (pp, RIMA_,
+# ...). These keyword fields are added at embedding time (dql_corpus.py). At
+# query time they become pre-filters inside the kNN search, either in
+# Elasticsearch or as row masks in the local index, so a team's few
+# documents are found without widening num_candidates.
+#
+# Visibility rules:
+# - Documents without users/groups are visible to everyone.
+# - Restricted documents are visible only to a listed user or a member of a
+#   listed group.
+# - A request naming cabinet prefixes sees untagged documents plus documents
+#   tagged with one of those prefixes.
+
+import numpy as np
+
+USERS_FIELD = "scope_users"
+GROUPS_FIELD = "scope_groups"
+CABINETS_FIELD = "cabinet_prefixes"
+SCOPE_FIELDS = (USERS_FIELD, GROUPS_FIELD, CABINETS_FIELD)
+
+# Record keys accepted for each scope field in the context files
+FIELD_ALIASES = {
+    USERS_FIELD: ["scope_users", "users", "user", "owner"],
+    GROUPS_FIELD: ["scope_groups", "groups", "group", "team"],
+    CABINETS_FIELD: ["cabinet_prefixes", "cabinet_prefix", "prefix"]
+}
+
+
+def keywords(value):
+    """Normalized keyword list from a string or list value"""
+    if value is None:
+        return []
+    values = value if isinstance(value, (list, tuple, set)) else [value]
+    return sorted({str(v).strip().lower() for v in values if str(v).strip()})
+
+
+def scope_metadata(record):
+    """Scope keyword fields for an indexed document, taken from its source record"""
+    metadata = {}
+    for field, aliases in FIELD_ALIASES.items():
+        values = [v for alias in aliases for v in keywords(record.get(alias))]
+        if values:
+            metadata[field] = sorted(set(values))
+    return metadata
+
+
+class RequestScope:
+    def __init__(self, user=None, groups=(), cabinet_prefixes=()):
+        self.user = (keywords(user) or [None])[0]
+        self.groups = keywords(groups)
+        self.cabinet_prefixes = keywords(cabinet_prefixes)
+
+    def key(self):
+        """Stable identity for cache keys: requests with different scopes must not share answers"""
+        return f"{self.user or ''}|{','.join(self.groups)}|{','.join(self.cabinet_prefixes)}"
+
+    def es_filters(self):
+        """Elasticsearch filter clauses to AND with a section filter"""
+        unrestricted = {"bool": {"must_not": [{"exists": {"field": USERS_FIELD}},
+                                              {"exists": {"field": GROUPS_FIELD}}]}}
+        access = [unrestricted]
+        if self.user:
+            access.append({"term": {USERS_FIELD: self.user}})
+        if self.groups:
+            access.append({"terms": {GROUPS_FIELD: self.groups}})
+        filters = [{"bool": {"should": access, "minimum_should_match": 1}}]
+
+        if self.cabinet_prefixes:
+            filters.append({"bool": {"should": [
+                {"bool": {"must_not": {"exists": {"field": CABINETS_FIELD}}}},
+                {"terms": {CABINETS_FIELD: self.cabinet_prefixes}}
+            ], "minimum_should_match": 1}})
+        return filters
+
+
+class ScopeMasks:
+    """Inverted keyword index over the local index rows, turning a scope into a row mask"""
+
+    def __init__(self, docs):
+        self.rows = len(docs)
+        self.postings = {field: {} for field in SCOPE_FIELDS}
+        self.restricted = np.zeros(self.rows, dtype=bool)
+        self.tagged = np.zeros(self.rows, dtype=bool)
+        for row, doc in enumerate(docs):
+            for field in SCOPE_FIELDS:
+                for value in keywords(doc.get(field)):
+                    self.postings[field].setdefault(value, []).append(row)
+            self.restricted[row] = bool(doc.get(USERS_FIELD) or doc.get(GROUPS_FIELD))
+            self.tagged[row] = bool(doc.get(CABINETS_FIELD))
+        self.postings = {
+            field: {value: np.asarray(rows) for value, rows in values.items()}
+            for field, values in self.postings.items()
+        }
+
+    def _rows(self, field, values):
+        mask = np.zeros(self.rows, dtype=bool)
+        for value in values:
+            rows = self.postings[field].get(value)
+            if rows is not None:
+                mask[rows] = True
+        return mask
+
+    def mask(self, scope=None):
+        """Boolean mask of visible rows, or None when every row is visible"""
+        scope = scope or RequestScope()
+        if not self.restricted.any() and not (scope.cabinet_prefixes and self.tagged.any()):
+            return None
+
+        visible = ~self.restricted
+        if scope.user:
+            visible |= self._rows(USERS_FIELD, [scope.user])
+        if scope.groups:
+            visible |= self._rows(GROUPS_FIELD, scope.groups)
+        if scope.cabinet_prefixes:
+            visible &= ~self.tagged | self._rows(CABINETS_FIELD, scope.cabinet_prefixes)
+        return visible
@@ -0,0 +1,105 @@
+# dql_sections.py
+#
+# Prompt sections shared by the Elasticsearch and local retrieval backends.
+# Every indexed document belongs to exactly one section; the ES filters below
+# and section_of() must agree so both backends fill the prompt the same way.
+
+import os
+
+SECTIONS = [
+    "schema",
+    "example",
+    "guideline",
+    "pattern",
+    "mapping",
+    "glossary",
+    "intent_hint",
+    "policy",
+    "user_context",
+    "feedback_example"
+]
+
+# How many hits each section gets from its own kNN sub-query
+DEFAULT_QUOTAS = {
+    "schema": 8,
+    "example": 3,
+    "guideline": 3,
+    "pattern": 2,
+    "mapping": 2,
+    "glossary": 2,
+    "intent_hint": 2,
+    "policy": 2,
+    "user_context": 3,
+    "feedback_example": 5
+}
+
+# _source fields build_prompt reads from each section (plus what section_of() needs);
+# everything else, above all the embedding vectors, stays on the server
+_ROUTING_FIELDS = ["type", "source", "object_type"]
+SECTION_FIELDS = {
+    "schema": _ROUTING_FIELDS + ["attribute", "description"],
+    "example": _ROUTING_FIELDS + ["nl", "dql"],
+    "guideline": _ROUTING_FIELDS + ["title", "content"],
+    "pattern": _ROUTING_FIELDS + ["title", "content"],
+    "mapping": _ROUTING_FIELDS + ["title", "content"],
+    "glossary": _ROUTING_FIELDS + ["title", "content"],
+    "intent_hint": _ROUTING_FIELDS + ["title", "content"],
+    "policy": _ROUTING_FIELDS + ["title", "content"],
+    "user_context": _ROUTING_FIELDS + ["content"],
+    "feedback_example": _ROUTING_FIELDS + ["nl", "dql", "score", "comment"]
+}
+
+# Text fields matched lexically in hybrid retrieval (attribute.text is the analyzed
+# sub-field of the attribute keyword, see backend/upload_to_elasticsearch.py)
+LEXICAL_FIELDS = ["attribute", "description", "source_text", "title", "content", "nl"]
+ES_LEXICAL_FIELDS = ["attribute.text^2", "description", "source_text", "title", "content", "nl"]
+
+
+def load_quotas(default_k=5, env_var="SECTION_QUOTAS", defaults=DEFAULT_QUOTAS):
+    """Section quotas, overridable with e.g. SECTION_QUOTAS="schema=10,example=5" """
+    quotas = {section: defaults.get(section, default_k) for section in SECTIONS}
+    overrides = os.getenv(env_var, "")
+    for pair in filter(None, (p.strip() for p in overrides.split(","))):
+        name, _, value = pair.partition("=")
+        if name.strip() in quotas and value.strip().isdigit():
+            quotas[name.strip()] = int(value)
+    return quotas
+
+
+def empty_context():
+    return {section: [] for section in SECTIONS}
+
+
+def section_of(doc):
+    """Section a document is grouped under, or None if it is not prompt material"""
+    # Schema records carry their datatype in "type", so detect them by object_type
+    if doc.get("object_type"):
+        return "schema"
+    if doc.get("source") == "feedback":
+        return "feedback_example"
+    doc_type = doc.get("type")
+    if doc_type in SECTIONS:
+        return doc_type
+    return None
+
+
+def section_filter(section, schema_types=None):
+    """Elasticsearch pre-filter selecting the documents section_of() puts in `section`.
+
+    `schema_types` narrows the schema section to attributes of those object types.
+    """
+    if section == "schema":
+        if schema_types:
+            return {"terms": {"object_type": list(schema_types)}}
+        return {"exists": {"field": "object_type"}}
+    if section == "feedback_example":
+        return {"term": {"source": "feedback"}}
+    return {
+        "bool": {
+            "filter": [{"term": {"type": section}}],
+            "must_not": [
+                {"exists": {"field": "object_type"}},
+                {"term": {"source": "feedback"}}
+            ]
+        }
+    }
@@ -1,11 +1,21 @@
 # dql_server.py
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from dql_prompt_framework import generate_dql
+from typing import List, Optional
+from dql_prompt_framework import embed_model, generate_dql, retrieval
+from dql_auth import AuthError, Principal, authenticate
+from dql_cache import RESPONSE_CACHE_TTL_SECONDS, make_cache
+from dql_llm import LLMUnavailableError
+from dql_preview import PREVIEW_SNAPSHOT_FILE, InvalidDQL, PreviewEngine, UnsupportedDQL
+from dql_reload import CONTEXT_RELOAD
+from dql_scope import RequestScope
+from dql_sessions import SESSION_TTL_SECONDS, SessionStore
+from dql_suggest import SuggestIndex
 import datetime
 import csv
+import hashlib
 import os
 
 app = FastAPI()
@@ -19,8 +29,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+sessions = SessionStore(cache=make_cache("session", ttl=SESSION_TTL_SECONDS))
+suggest_index = SuggestIndex.load(embed_model.encode)
+# Built by backend/build_preview_snapshot.py; /preview is unavailable without it
+preview_engine = PreviewEngine() if os.path.isfile(PREVIEW_SNAPSHOT_FILE) else None
+# Answers to new questions, shared by all workers when REDIS_URL is set (off unless RESPONSE_CACHE_TTL_SECONDS > 0)
+response_cache = make_cache("response") if RESPONSE_CACHE_TTL_SECONDS > 0 else None
+
+def response_key(query, user_context, scope=None):
+    text = " ".join(query.lower().split()) + "\n" + "\n".join(sorted(item["content"] for item in user_context))
+    text += "\n" + (scope or RequestScope()).key()
+    # Answers built from older context files stop matching once a reload swaps them out
+    text += "\n" + retrieval.version
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
 class QueryRequest(BaseModel):
     query: str
+    session_id: Optional[str] = None  # Pass back the returned id to keep the session's user context
+    refine: bool = False  # Treat the query as a change to the session's previous DQL
+    user_context: List[str] = []  # Facts about the user, kept for the whole session
+    # Narrow the retrieval scope, which comes from the signed-in user (see dql_auth.py):
+    # only these of the user's groups, and only context for these cabinet prefixes
+    groups: List[str] = []
+    cabinet_prefixes: List[str] = []
+
+class SessionSeed(BaseModel):
+    input: str
+    dql: str
+
+class PreviewRequest(BaseModel):
+    dql: str  # USER in the query is the signed-in user
 
 class FeedbackRequest(BaseModel):
     input: str
@@ -28,16 +66,82 @@ class FeedbackRequest(BaseModel):
     timestamp: str
     feedback: str  # 'good' or 'bad'
     comment: str = ""  # Optional comment
+    cache_key: Optional[str] = None  # As returned by /generate; a bad rating evicts that cached answer
+
+@app.on_event("startup")
+def start_context_reload():
+    # Runs in every worker after the fork. Each worker swaps in its own snapshot, but shared
+    # files (all_embeddings.json, the embedding cache, the matrix file) and the Elasticsearch
+    # index are rebuilt or synced by one worker under a file lock; the others only load them.
+    if CONTEXT_RELOAD:
+        retrieval.start()
 
 @app.get("/")
 def read_root():
     return {"message": "DQL Assistant API is running..."}
 
+def current_principal(authorization: Optional[str] = Header(None)) -> Principal:
+    try:
+        return authenticate(authorization)
+    except AuthError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
 @app.post("/generate")
-def generate(request: QueryRequest):
-    dql, _ = generate_dql(request.query)
+def generate(request: QueryRequest, principal: Principal = Depends(current_principal)):
+    session = sessions.get_or_create(request.session_id)
+    known = {item["content"] for item in session.user_context}
+    session.user_context += [{"content": c} for c in request.user_context if c not in known]
+
+    # Identity from the verified token; the cache key includes it, so answers are not shared across scopes
+    scope = principal.scope(request.groups, request.cabinet_prefixes)
+    refine = request.refine and session.last_dql is not None
+    # Refinements depend on the session's previous DQL, so only new questions are answered from the cache
+    key = response_key(request.query, session.user_context, scope) if response_cache and not refine else None
+    cached = response_cache.get(key) if key else None
+    try:
+        if cached:
+            dql = cached["dql"]
+            session.add_turn(request.query, dql)
+        else:
+            dql, _ = generate_dql(request.query, session, scope, refine=refine)
+            if key:
+                response_cache.set(key, {"dql": dql})
+    except LLMUnavailableError as e:
+        print(f"LLM unavailable: {e}")
+        raise HTTPException(status_code=503, detail="The DQL model is temporarily unavailable, please retry.")
+    sessions.save(session)
     timestamp = datetime.datetime.now().strftime("%m/%d/%Y %I:%M %p")
-    return {"dql": dql, "timestamp": timestamp}
+    return {"dql": dql, "timestamp": timestamp, "session_id": session.id, "cache_key": key}
+
+@app.post("/session")
+def start_session(seed: SessionSeed):
+    # A session whose previous turn is a known answer (e.g. a picked suggestion), ready to refine
+    session = sessions.get_or_create()
+    session.add_turn(seed.input, seed.dql)
+    sessions.save(session)
+    return {"session_id": session.id}
+
+@app.delete("/session/{session_id}")
+def end_session(session_id: str):
+    sessions.drop(session_id)
+    return {"status": "Session ended"}
+
+@app.get("/suggest")
+def suggest(q: str = ""):
+    suggestions, took_ms = suggest_index.suggest(q)
+    return {"suggestions": suggestions, "took_ms": round(took_ms, 2)}
+
+@app.post("/preview")
+def preview(request: PreviewRequest, principal: Principal = Depends(current_principal)):
+    if preview_engine is None:
+        raise HTTPException(status_code=503, detail="No preview snapshot is available.")
+    try:
+        result = preview_engine.preview(request.dql, user=principal.user)
+    except UnsupportedDQL as e:
+        return {"supported": False, "reason": str(e)}
+    except InvalidDQL as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"supported": True, **result}
 
 @app.post("/feedback")
 def receive_feedback(request: FeedbackRequest):
@@ -63,6 +167,12 @@ def receive_feedback(request: FeedbackRequest):
                 'feedback': request.feedback,
                 'comment': request.comment
             })
+        if request.feedback.lower() == 'good':
+            # Other workers pick the pair up from feedback.csv on their next /suggest
+            suggest_index.refresh(force=True)
+        elif response_cache and request.cache_key:
+            # Do not keep serving an answer that was rated bad
+            response_cache.delete(request.cache_key)
         return {"status": "Feedback received"}
     except Exception as e:
         print(f"Error writing feedback: {e}")
@@ -0,0 +1,111 @@
+# dql_sessions.py
+#
+# Server-side conversation state for multi-turn refinement ("documents in
+# cabinet X" -> "only PDFs" -> "modified this week"). A session keeps the
+# previous DQL and the context already retrieved for it, so follow-ups only
+# fetch what is new and send a compact refine prompt. Sessions expire after
+# SESSION_TTL_SECONDS of inactivity. Given a shared cache (REDIS_URL, see
+# dql_cache.py), sessions are stored there so any server worker can continue them.
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "10000"))
+# Turns kept per session; older ones are dropped
+MAX_TURNS = 5
+
+
+class Session:
+    def __init__(self, session_id):
+        self.id = session_id
+        self.turns = []           # [{"nl": ..., "dql": ...}], oldest first
+        self.context = {}         # section -> docs already shown to the model
+        self.seen = set()         # keys of those docs, for delta retrieval
+        self.user_context = []    # [{"content": ...}] facts about the user for this session
+        self.touched = time.monotonic()
+
+    @property
+    def last_dql(self):
+        return self.turns[-1]["dql"] if self.turns else None
+
+    def add_turn(self, nl, dql):
+        self.turns = (self.turns + [{"nl": nl, "dql": dql}])[-MAX_TURNS:]
+
+    def merge_context(self, context):
+        """Add retrieved docs to the session; returns only the docs it had not seen yet"""
+        delta = {}
+        for section, docs in context.items():
+            if not isinstance(docs, list):
+                continue
+            new = []
+            for doc in docs:
+                key = json.dumps(doc, sort_keys=True, default=str)
+                if key not in self.seen:
+                    self.seen.add(key)
+                    new.append(doc)
+            self.context.setdefault(section, []).extend(new)
+            delta[section] = new
+        return delta
+
+    def to_dict(self):
+        return {"id": self.id, "turns": self.turns, "context": self.context, "user_context": self.user_context}
+
+    @classmethod
+    def from_dict(cls, data):
+        session = cls(data["id"])
+        session.turns = data.get("turns", [])
+        session.user_context = data.get("user_context", [])
+        session.merge_context(data.get("context", {}))
+        return session
+
+
+class SessionStore:
+    def __init__(self, ttl=SESSION_TTL_SECONDS, max_sessions=MAX_SESSIONS, cache=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # Only a cache shared between workers is worth the serialization round trip
+        self.cache = cache if cache is not None and cache.shared else None
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _evict(self, now):
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            if now - oldest.touched < self.ttl and len(self.sessions) <= self.max_sessions:
+                break
+            self.sessions.popitem(last=False)
+
+    def get_or_create(self, session_id=None):
+        """Live session for `session_id`, or a fresh one if it is missing or expired"""
+        if self.cache is not None:
+            data = self.cache.get(session_id) if session_id else None
+            return Session.from_dict(data) if data else Session(session_id or uuid.uuid4().hex)
+
+        now = time.monotonic()
+        with self.lock:
+            self._evict(now)
+            session = self.sessions.get(session_id) if session_id else None
+            if session is None:
+                session = Session(session_id or uuid.uuid4().hex)
+                self.sessions[session.id] = session
+            session.touched = now
+            self.sessions.move_to_end(session.id)
+            # A new session may have pushed the store past its limit
+            self._evict(now)
+            return session
+
+    def save(self, session):
+        """Publish a session's changes to the other workers; in-process sessions are already live"""
+        if self.cache is not None:
+            self.cache.set(session.id, session.to_dict())
+
+    def drop(self, session_id):
+        if self.cache is not None:
+            self.cache.delete(session_id)
+        with self.lock:
+            self.sessions.pop(session_id, None)
@@ -0,0 +1,168 @@
+# dql_suggest.py
+#
+# Type-ahead suggestions for the UI. Known NL -> DQL pairs (examples_revised.json
+# plus well-rated feedback) are indexed at startup by character trigrams and by
+# their embeddings; each keystroke is matched with a trigram lookup, and the few
+# lexical candidates are re-scored against a cached query embedding. No Gemini
+# call is made, so a picked suggestion costs nothing. Every server worker tails
+# feedback.csv, so a pair rated good in one worker is suggested by all of them.
+
+import csv
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
+EXAMPLES_FILE = os.path.join(PROJECT_ROOT, "context", "examples_revised.json")
+FEEDBACK_FILE = "feedback.csv"
+
+SUGGEST_LIMIT = 5
+MIN_QUERY_CHARS = 3
+MIN_SCORE = float(os.getenv("SUGGEST_MIN_SCORE", "0.35"))
+# Lexical candidates re-scored with embeddings per request
+CANDIDATE_POOL = 30
+EMBEDDING_CACHE_SIZE = 2048
+# How often suggest() checks feedback.csv for pairs rated good by any worker
+FEEDBACK_POLL_SECONDS = 1.0
+FEEDBACK_FIELDS = ["input", "query", "feedback", "comment"]
+
+
+def normalize_text(text):
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9_ ]", " ", str(text).lower())).strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestIndex:
+    def __init__(self, embed_fn, pairs):
+        """`embed_fn` maps a list of texts to vectors; `pairs` are (nl, dql) tuples"""
+        self.embed_fn = embed_fn
+        self.lock = threading.Lock()
+        self.items = []
+        self.keys = set()
+        self.grams = {}
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.query_cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.feedback_file = None
+        self.feedback_offset = 0
+        self.feedback_checked = 0.0
+        self.feedback_lock = threading.Lock()
+        self.add_many(pairs)
+
+    @classmethod
+    def load(cls, embed_fn, examples_file=EXAMPLES_FILE, feedback_file=FEEDBACK_FILE):
+        with open(examples_file, "r", encoding="utf-8") as f:
+            pairs = [(e["nl"], e["dql"]) for e in json.load(f) if e.get("nl") and e.get("dql")]
+        index = cls(embed_fn, pairs)
+        index.feedback_file = feedback_file
+        index.refresh(force=True)
+        print(f"✅ Suggestion index ready with {len(index.items)} NL -> DQL pairs")
+        return index
+
+    def refresh(self, force=False):
+        """Index good-rated pairs appended to the feedback file since the last read (by any worker)"""
+        if not self.feedback_file:
+            return
+        now = time.monotonic()
+        if not force and now - self.feedback_checked < FEEDBACK_POLL_SECONDS:
+            return
+        with self.feedback_lock:
+            self.feedback_checked = now
+            try:
+                if os.path.getsize(self.feedback_file) <= self.feedback_offset:
+                    return
+                with open(self.feedback_file, "rb") as f:
+                    f.seek(self.feedback_offset)
+                    data = f.read()
+            except FileNotFoundError:
+                return
+            # Only complete rows; a row still being written is picked up next time
+            data = data[:data.rfind(b"\n") + 1]
+            if not data:
+                return
+            lines = data.decode("utf-8").splitlines(keepends=True)
+            fieldnames = None if self.feedback_offset == 0 else FEEDBACK_FIELDS
+            self.feedback_offset += len(data)
+            self.add_many([
+                (row["input"], row["query"]) for row in csv.DictReader(lines, fieldnames=fieldnames, escapechar="\\")
+                if str(row.get("feedback", "")).lower() == "good" and row.get("input") and row.get("query")
+            ])
+
+    def add_many(self, pairs):
+        new = []
+        for nl, dql in pairs:
+            key = normalize_text(nl)
+            if key and key not in self.keys:
+                self.keys.add(key)
+                new.append({"nl": nl.strip(), "dql": dql.strip(), "key": key})
+        if not new:
+            return
+        vectors = np.asarray(self.embed_fn([item["nl"] for item in new]), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+        with self.lock:
+            start = len(self.items)
+            self.items = self.items + new
+            self.vectors = vectors if not len(self.vectors) else np.vstack([self.vectors, vectors])
+            for offset, item in enumerate(new):
+                for gram in trigrams(item["key"]):
+                    self.grams.setdefault(gram, []).append(start + offset)
+
+    def add(self, nl, dql):
+        """Index a newly validated pair (e.g. a 'good' feedback rating)"""
+        self.add_many([(nl, dql)])
+
+    def _embed_query(self, text):
+        with self.cache_lock:
+            vector = self.query_cache.get(text)
+            if vector is not None:
+                self.query_cache.move_to_end(text)
+                return vector
+        vector = np.asarray(self.embed_fn([text])[0], dtype=np.float32)
+        vector /= max(np.linalg.norm(vector), 1e-9)
+        with self.cache_lock:
+            self.query_cache[text] = vector
+            if len(self.query_cache) > EMBEDDING_CACHE_SIZE:
+                self.query_cache.popitem(last=False)
+        return vector
+
+    def suggest(self, text, limit=SUGGEST_LIMIT):
+        self.refresh()
+        start = time.perf_counter()
+        key = normalize_text(text)
+        if len(key) < MIN_QUERY_CHARS:
+            return [], 0.0
+
+        with self.lock:
+            items, vectors, grams = self.items, self.vectors, self.grams
+        query_grams = trigrams(key)
+        overlap = {}
+        for gram in query_grams:
+            for i in grams.get(gram, ()):
+                # Posting lists can run ahead of the items snapshot while a pair is being added
+                if i < len(items):
+                    overlap[i] = overlap.get(i, 0) + 1
+        if not overlap:
+            return [], (time.perf_counter() - start) * 1000
+
+        # Share of the typed text found in the candidate, with a bonus for a literal prefix match
+        pool = sorted(overlap, key=overlap.get, reverse=True)[:CANDIDATE_POOL]
+        lexical = np.asarray([overlap[i] / len(query_grams) for i in pool], dtype=np.float32)
+        prefix = np.asarray([items[i]["key"].startswith(key) for i in pool], dtype=np.float32)
+        semantic = vectors[pool] @ self._embed_query(key)
+        scores = 0.45 * lexical + 0.45 * semantic + 0.1 * prefix
+
+        order = np.argsort(-scores)[:limit]
+        suggestions = [
+            {"nl": items[pool[i]]["nl"], "dql": items[pool[i]]["dql"], "score": round(float(scores[i]), 3)}
+            for i in order if scores[i] >= MIN_SCORE
+        ]
+        return suggestions, (time.perf_counter() - start) * 1000
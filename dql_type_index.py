@@ -0,0 +1,42 @@
+# dql_type_index.py
+#
+# First stage of type-scoped schema retrieval: a small in-process index with
+# one summary vector per Documentum object type (backend/build_type_summaries.py).
+# The query is matched against types first, and only the selected types'
+# attributes are searched, so schema retrieval cost follows the number of
+# relevant types rather than the size of the catalog.
+
+import json
+import os
+import numpy as np
+
+from dql_vectors import dot_scores, normalize, project
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_SUMMARIES_FILE = os.path.join(PROJECT_ROOT, "context", "type_summaries.json")
+MAX_TYPES = int(os.getenv("TYPE_SELECT_MAX", "3"))
+# Types scoring further than this below the best type are dropped
+SCORE_MARGIN = float(os.getenv("TYPE_SELECT_MARGIN", "0.15"))
+
+
+class TypeSummaryIndex:
+    def __init__(self, object_types, vectors, pca=None):
+        self.object_types = object_types
+        self.matrix = project(vectors, pca)
+
+    @classmethod
+    def load(cls, path=DEFAULT_SUMMARIES_FILE, pca=None):
+        with open(path, "r", encoding="utf-8") as f:
+            summaries = json.load(f)
+        summaries = [s for s in summaries if s.get("object_type") and isinstance(s.get("embedding"), list)]
+        print(f"✅ Loaded {len(summaries)} object type summaries from {path}")
+        return cls([s["object_type"] for s in summaries], [s["embedding"] for s in summaries], pca=pca)
+
+    def select(self, query_vector, max_types=MAX_TYPES, margin=SCORE_MARGIN):
+        """Object types most likely to hold the attributes the query is about, best first"""
+        if not self.object_types:
+            return []
+        scores = dot_scores(self.matrix, normalize(query_vector))
+        order = np.argsort(-scores)[:max_types]
+        best = scores[order[0]]
+        return [self.object_types[i] for i in order if scores[i] >= best - margin]
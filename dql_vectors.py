@@ -0,0 +1,94 @@
+# dql_vectors.py
+#
+# Vector compression shared by indexing and query time: optional PCA
+# truncation trained on our corpus (backend/train_pca.py) and float16/int8
+# storage for the local index. Whatever projection the corpus was indexed
+# with must also be applied to query vectors, so both sides read PCA_FILE.
+
+import os
+import numpy as np
+
+PCA_FILE = os.getenv("PCA_FILE")
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+# int8 stores unit-vector components scaled to [-127, 127]
+INT8_SCALE = 127.0
+
+
+def normalize(vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        norm = np.linalg.norm(matrix)
+        return matrix / norm if norm else matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def fit_pca(vectors, dims):
+    """Mean and top `dims` principal components of the corpus vectors"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    mean = matrix.mean(axis=0)
+    _, _, components = np.linalg.svd(matrix - mean, full_matrices=False)
+    return mean, components[:dims]
+
+
+def save_pca(path, pca):
+    mean, components = pca
+    np.savez(path, mean=mean, components=components)
+
+
+def load_pca(path=PCA_FILE):
+    if not path:
+        return None
+    data = np.load(path)
+    return data["mean"], data["components"]
+
+
+def project(vectors, pca):
+    """Apply PCA truncation (if any) and re-normalize for cosine similarity"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if pca is not None:
+        mean, components = pca
+        matrix = (matrix - mean) @ components.T
+    return normalize(matrix)
+
+
+def quantize(unit_vectors, dtype="float32"):
+    """Store normalized vectors as float32, float16 or int8"""
+    if dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unsupported vector dtype '{dtype}', expected one of {VECTOR_DTYPES}")
+    if dtype == "int8":
+        return np.clip(np.rint(unit_vectors * INT8_SCALE), -127, 127).astype(np.int8)
+    return np.asarray(unit_vectors, dtype=dtype)
+
+
+def dot_scores(matrix, query, block_rows=65536):
+    """Similarity of a (possibly quantized) matrix to a float32 query, scored in blocks
+    so int8/float16 rows are never upcast all at once"""
+    query = np.asarray(query, dtype=np.float32)
+    if matrix.dtype == np.float32:
+        return matrix @ query
+    scale = INT8_SCALE if matrix.dtype == np.int8 else 1.0
+    scores = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), block_rows):
+        block = matrix[start:start + block_rows].astype(np.float32)
+        scores[start:start + block_rows] = block @ query
+    return scores / scale
+
+
+def mapped_matrix(path, build, rows, dtype, sources=()):
+    """Read-only memory map of the matrix stored at `path`, rebuilt with `build()` when it is
+    missing or older than any of `sources`. Processes mapping the same file share its pages."""
+    if os.path.exists(path):
+        built_at = os.path.getmtime(path)
+        matrix = np.load(path, mmap_mode="r")
+        fresh = all(built_at >= os.path.getmtime(s) for s in sources if s and os.path.exists(s))
+        if fresh and matrix.shape[0] == rows and matrix.dtype == np.dtype(dtype):
+            return matrix
+
+    # Written under a temporary name so concurrently starting workers never map a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, build())
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode="r")
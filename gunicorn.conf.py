@@ -0,0 +1,44 @@
+# gunicorn.conf.py
+#
+# Multi-worker serving for dql_server:
+#
+#   gunicorn dql_server:app -c gunicorn.conf.py
+#
+# The app (SentenceTransformer, local index, entity recognizer, suggestion
+# index) is imported once in the master and shared with the forked workers
+# copy-on-write, so adding workers adds only their private memory. Set
+# REDIS_URL so sessions and cached responses are shared between workers, and
+# LOCAL_MATRIX_FILE so the local index matrix is a read-only memory map.
+# See "MULTI-WORKER DEPLOYMENT" in dql_project_summary.txt for the memory
+# budget and backend/measure_worker_memory.py to check it.
+
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "8"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+pidfile = os.getenv("GUNICORN_PIDFILE", "/tmp/dql_server.pid")
+
+# The Gemini quota (LLM_REQUESTS_PER_MINUTE, LLM_BURST) is for the whole
+# deployment. This file is read before the preloaded app imports dql_llm, so
+# every worker's rate limiter takes 1/workers of it
+os.environ.setdefault("LLM_WORKERS", str(workers))
+
+# Each worker mostly waits on Elasticsearch and Gemini; one torch thread per
+# worker keeps 8+ workers from oversubscribing the CPU during query embedding
+TORCH_THREADS = int(os.getenv("WORKER_TORCH_THREADS", "1"))
+
+
+def when_ready(server):
+    # Move everything loaded by the preloaded app out of the garbage collector's
+    # reach, so collections in the workers do not touch (and copy) shared pages
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import torch
+    torch.set_num_threads(TORCH_THREADS)
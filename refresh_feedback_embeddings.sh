@@ -7,6 +7,12 @@ echo "🔄 Rebuilding feedback-based embeddings..."
 echo "📥 Converting feedback to embedding JSON..."
 python3 backend/convert_feedback_to_embeddings.py
 
+echo "🗜️ Compacting near-duplicate feedback examples..."
+python3 backend/compact_feedback_examples.py
+
+echo "📚 Ingesting schema sources into the catalog..."
+python3 backend/ingest_schema.py
+
 echo "🧠 Generating all embeddings..."
 mkdir -p logs
 python3 backend/generate_embeddings.py > logs/generate.log 2>&1
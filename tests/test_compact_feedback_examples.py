@@ -0,0 +1,118 @@
+import json
+import os
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "backend"))
+import compact_feedback_examples as compaction
+from compact_feedback_examples import assign, compact, example_key
+
+COUNT_DQL = "SELECT COUNT(*) FROM dm_document WHERE owner_name = USER"
+PDF_DQL = "SELECT object_name FROM dm_document WHERE a_content_type = 'pdf'"
+
+# Unit-ish embeddings: the first three are near-duplicates (cosine ~0.99), the fourth is unrelated
+COUNT_MINE = [1.0, 0.0, 0.0]
+COUNT_DOCS = [0.99, 0.1, 0.0]
+HOW_MANY = [0.98, 0.0, 0.15]
+PDFS = [0.0, 1.0, 0.0]
+
+
+def example(nl, dql, embedding, score=1, timestamp="2026-10-01T00:00:00"):
+    return {"nl": nl, "dql": dql, "embedding": embedding, "score": score, "timestamp": timestamp}
+
+
+def run(tmp_path, entries, **kwargs):
+    examples_file, clusters_file = tmp_path / "feedback_examples.json", tmp_path / "feedback_clusters.json"
+    examples_file.write_text(json.dumps(entries))
+    compact(examples_file=str(examples_file), clusters_file=str(clusters_file), **kwargs)
+    state = json.loads(clusters_file.read_text())
+    return json.loads(examples_file.read_text()), state
+
+
+def by_nl(compacted):
+    return {e["nl"]: e for e in compacted}
+
+
+def test_near_duplicates_collapse_into_the_best_rated():
+    keys = ["mine", "docs", "pdfs", "how"]
+    examples = {k: {"embedding": v} for k, v in zip(keys, [COUNT_MINE, COUNT_DOCS, PDFS, HOW_MANY])}
+    clusters = []
+    assign(keys, examples, clusters, threshold=0.92)
+    assert clusters == [["mine", "docs", "how"], ["pdfs"]]
+
+
+def test_clusters_do_not_depend_on_the_block_size(monkeypatch):
+    keys = [f"k{i}" for i in range(7)]
+    vectors = [COUNT_MINE, PDFS, COUNT_DOCS, [0.0, 0.0, 1.0], HOW_MANY, [0.0, 0.99, 0.1], [0.1, 0.0, 0.99]]
+    examples = {k: {"embedding": v} for k, v in zip(keys, vectors)}
+
+    one_block = []
+    assign(keys, examples, one_block, threshold=0.92)
+    monkeypatch.setattr(compaction, "BLOCK_ROWS", 2)
+    small_blocks = []
+    assign(keys, examples, small_blocks, threshold=0.92)
+    assert one_block == small_blocks == [["k0", "k2", "k4"], ["k1", "k5"], ["k3", "k6"]]
+
+
+def test_compaction_sums_scores_and_keeps_good_and_bad_apart(tmp_path):
+    compacted, state = run(tmp_path, [
+        example("count my documents", COUNT_DQL, COUNT_MINE, score=1, timestamp="2026-10-01"),
+        example("how many docs do I own", COUNT_DQL, COUNT_DOCS, score=1, timestamp="2026-10-03"),
+        example("how many documents are mine", COUNT_DQL, HOW_MANY, score=-1),
+        example("pdf documents", PDF_DQL, PDFS, score=1),
+    ])
+    assert len(compacted) == 3
+    # Equal scores: the newest member represents the cluster
+    representative = by_nl(compacted)["how many docs do I own"]
+    assert (representative["score"], representative["cluster_size"]) == (2, 2)
+    assert by_nl(compacted)["how many documents are mine"]["score"] == -1
+    assert by_nl(compacted)["pdf documents"]["cluster_size"] == 1
+    assert state["threshold"] == compaction.CLUSTER_THRESHOLD
+    assert sorted(len(members) for members in state["clusters"]) == [1, 1, 2]
+
+
+def test_exact_repeats_are_folded_before_clustering(tmp_path):
+    compacted, _ = run(tmp_path, [
+        example("Count my documents", COUNT_DQL, COUNT_MINE, score=1),
+        example("count  my documents", COUNT_DQL, COUNT_MINE, score=2),
+        example("no embedding", COUNT_DQL, [], score=5),
+    ])
+    assert [(e["score"], e["cluster_size"]) for e in compacted] == [(3, 2)]
+
+
+def test_new_feedback_joins_existing_clusters_incrementally(tmp_path):
+    first = example("count my documents", COUNT_DQL, COUNT_MINE, score=3)
+    pdfs = example("pdf documents", PDF_DQL, PDFS)
+    _, state = run(tmp_path, [first, pdfs])
+
+    # The next run sees the raw feedback again plus one new near-duplicate
+    compacted, state = run(tmp_path, [first, pdfs, example("how many docs do I own", COUNT_DQL, COUNT_DOCS)])
+    count_cluster = next(members for members in state["clusters"] if example_key(first) in members)
+    assert count_cluster[0] == example_key(first)
+    assert len(count_cluster) == 2
+    assert by_nl(compacted)["count my documents"]["score"] == 4
+
+
+def test_removed_feedback_drops_out_and_a_new_threshold_reclusters(tmp_path):
+    run(tmp_path, [example("count my documents", COUNT_DQL, COUNT_MINE),
+                   example("how many docs do I own", COUNT_DQL, COUNT_DOCS)])
+    compacted, state = run(tmp_path, [example("count my documents", COUNT_DQL, COUNT_MINE)])
+    assert state["clusters"] == [[example_key(compacted[0])]]
+
+    entries = [example("count my documents", COUNT_DQL, COUNT_MINE),
+               example("how many docs do I own", COUNT_DQL, COUNT_DOCS)]
+    _, state = run(tmp_path, entries, threshold=0.999)
+    assert len(state["clusters"]) == 2
+
+
+@pytest.mark.parametrize("full", [False, True])
+def test_compacting_compacted_output_changes_nothing(tmp_path, full):
+    compacted, _ = run(tmp_path, [
+        example("count my documents", COUNT_DQL, COUNT_MINE, score=2),
+        example("how many docs do I own", COUNT_DQL, COUNT_DOCS),
+        example("pdf documents", PDF_DQL, PDFS),
+    ])
+    again, _ = run(tmp_path, compacted, full=full)
+    assert again == compacted
@@ -0,0 +1,43 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+from dql_corpus import build_documents, load_items
+
+RULES = {"type": "rules", "text_field": "source_text"}
+
+
+def embed(texts):
+    if any("unembeddable" in text for text in texts):
+        raise ValueError("encoder rejected the batch")
+    return [[1.0, 0.0] for _ in texts]
+
+
+def test_bad_records_are_skipped_not_the_whole_source():
+    items = [
+        {"source_text": "first rule"},
+        "not a record",
+        {"source_text": "unembeddable rule"},
+        {"source_text": None},
+        {"source_text": "last rule"},
+    ]
+    documents = build_documents(RULES, items, embed)
+    assert [d["source_text"] for d in documents] == ["first rule", "last rule"]
+    assert all(d["type"] == "rules" and d["embedding"] == [1.0, 0.0] for d in documents)
+
+
+def test_bad_feedback_entries_are_skipped():
+    items = [
+        {"nl": "good", "dql": "SELECT * FROM dm_document", "score": 1},
+        {"nl": "bad score", "dql": "SELECT * FROM dm_document", "score": "high"},
+        {"nl": "no dql"},
+    ]
+    documents = build_documents({"type": "feedback"}, items, embed)
+    assert [(d["nl"], d["type"]) for d in documents] == [("good", "feedback_positive")]
+
+
+def test_malformed_jsonl_lines_are_skipped(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    path.write_text('{"attribute": "a"}\n{"attribute": \n\n{"attribute": "b"}\n')
+    assert [item["attribute"] for item in load_items(str(path))] == ["a", "b"]
@@ -0,0 +1,96 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+from dql_entities import AhoCorasick, EntityRecognizer, merge_exact_schema
+
+
+def schema(object_type, attribute):
+    return {"object_type": object_type, "attribute": attribute, "type": "Char (32)"}
+
+
+SCHEMA = [
+    schema("business_cab", "cabinet_id"),
+    schema("business_cab", "record_class_codes"),
+    schema("record_class", "record_class_code"),
+    schema("dm_sysobject", "title"),
+]
+PATTERNS = [
+    {"pattern": r"pp\d+", "description": "Cabinet ID"},
+    {"pattern": r"fin\d{4}", "description": "Finance cabinet"},
+    {"pattern": r"RIMA_\d+", "description": "Migrated document"},
+]
+
+
+def recognizer():
+    return EntityRecognizer(SCHEMA, ["ADM100", "AUD140"], PATTERNS)
+
+
+def keys(records):
+    return [(r["object_type"], r["attribute"]) for r in records]
+
+
+def test_matcher_only_reports_whole_words():
+    matcher = AhoCorasick(["cabinet_id", "record_class_code", "record_class_codes"])
+    text = "cabinet_id, record_class_codes and my_cabinet_id or cabinet_ids"
+    assert [m[2] for m in matcher.find(text)] == ["cabinet_id", "record_class_codes"]
+    assert matcher.find(text)[0][:2] == (0, len("cabinet_id"))
+
+
+def test_matcher_finds_overlapping_keywords():
+    matcher = AhoCorasick(["adm1", "adm100", "dm100"])
+    assert [m[2] for m in matcher.find("adm100")] == ["adm100"]
+    assert [m[2] for m in matcher.find("adm1 dm100")] == ["adm1", "dm100"]
+
+
+def test_only_identifier_like_attributes_are_matched():
+    found = recognizer().recognize("Show the title and Cabinet_ID of every cabinet")
+    assert keys(found["schema"]) == [("business_cab", "cabinet_id")]
+    assert found["notes"] == []
+
+
+def test_record_class_code_adds_note_and_code_attributes():
+    found = recognizer().recognize("documents classified ADM100, or adm100 again")
+    assert keys(found["schema"]) == [("record_class", "record_class_code"), ("business_cab", "record_class_codes")]
+    assert len(found["notes"]) == 1
+    assert found["notes"][0]["content"].startswith("ADM100 is a record class code")
+
+
+def test_id_patterns_are_noted_once_per_value():
+    found = recognizer().recognize("Files in pp12 and PP12, fin2024, RIMA_7 but not app12 or fin20245")
+    notes = [n["content"] for n in found["notes"]]
+    assert notes == [
+        "pp12 matches ID pattern pp\\d+: Cabinet ID",
+        "PP12 matches ID pattern pp\\d+: Cabinet ID",
+        "fin2024 matches ID pattern fin\\d{4}: Finance cabinet",
+        "RIMA_7 matches ID pattern RIMA_\\d+: Migrated document",
+    ]
+    assert found["schema"] == []
+
+
+def test_merge_puts_exact_matches_first_without_duplicates():
+    exact = [schema("business_cab", "cabinet_id")]
+    retrieved = [schema("dm_sysobject", "title"), dict(schema("business_cab", "cabinet_id"), score=0.9),
+                 schema("dm_sysobject", "subject"), schema("dm_sysobject", "keywords")]
+    merged = merge_exact_schema(exact, retrieved, quota=3)
+    assert keys(merged) == [("business_cab", "cabinet_id"), ("dm_sysobject", "title"), ("dm_sysobject", "subject")]
+    assert merged[0]["exact_match"] is True
+    assert "exact_match" not in merged[1]
+    assert "exact_match" not in exact[0]
+
+
+def test_merge_keeps_every_exact_match_over_quota():
+    exact = [schema("business_cab", "cabinet_id"), schema("record_class", "record_class_code")]
+    merged = merge_exact_schema(exact, [schema("dm_sysobject", "title")], quota=1)
+    assert keys(merged) == keys(exact)
+
+
+def test_load_reads_the_context_files():
+    loaded = EntityRecognizer.load()
+    assert "cabinet_id" in loaded.attributes
+    assert "adm100" in loaded.codes
+    found = loaded.recognize("ADM100 documents in pp12 with cabinet_id set")
+    assert ("business_cab", "cabinet_id") in keys(found["schema"])
+    assert ("record_class", "record_class_code") in keys(found["schema"])
+    assert any(n["content"].startswith("pp12 matches") for n in found["notes"])
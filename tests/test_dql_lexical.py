@@ -0,0 +1,86 @@
+import os
+import sys
+
+import numpy as np
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+from dql_lexical import RRF_RANK_CONSTANT, BM25Index, rrf_fuse, tokenize
+from dql_local_index import LocalIndex
+from dql_scope import RequestScope
+
+SCHEMA = [
+    {"object_type": "business_cab", "attribute": "cabinet_id", "description": "Cabinet ID"},
+    {"object_type": "business_cab", "attribute": "cabinet_name", "description": "Name of the cabinet"},
+    {"object_type": "record_class", "attribute": "record_class_code", "description": "Record class code"},
+    {"object_type": "record_class", "attribute": "retention_period", "description": "Retention period in years"},
+]
+
+
+def test_tokens_keep_underscored_identifiers_whole():
+    assert tokenize("Where is Cabinet_ID, pp12?") == ["where", "is", "cabinet_id", "pp12"]
+
+
+def test_bm25_ranks_rare_exact_terms_first():
+    index = BM25Index(SCHEMA, ["attribute", "description"])
+    scores = index.scores("cabinet cabinet_id")
+    assert max(scores, key=scores.get) == 0
+    assert set(scores) == {0, 1}
+    assert set(index.scores("CABINET_ID")) == {0}
+    assert index.scores("nothing matches") == {}
+
+
+def test_bm25_prefers_shorter_documents_for_the_same_term():
+    docs = [{"text": "retention"}, {"text": "retention period with many other words in it"}]
+    scores = BM25Index(docs, ["text"]).scores("retention")
+    assert scores[0] > scores[1] > 0
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    assert rrf_fuse([["a", "b", "c"], ["b", "d"]]) == ["b", "a", "d", "c"]
+    assert rrf_fuse([["a", "b"]]) == ["a", "b"]
+    assert rrf_fuse([]) == []
+
+
+def test_rrf_scores_use_the_rank_constant():
+    # Rank 1 in one list beats rank 2 in one list, but not rank 2 in two lists
+    assert rrf_fuse([["x", "y"], ["z"]], rank_constant=RRF_RANK_CONSTANT)[-1] == "y"
+    assert rrf_fuse([["x", "y"], ["y"]])[0] == "y"
+
+
+def local_index():
+    docs = SCHEMA + [
+        {"type": "example", "nl": "list cabinets", "dql": "SELECT * FROM business_cab"},
+        {"type": "example", "nl": "finance retention rules", "dql": "SELECT * FROM record_class",
+         "scope_groups": ["finance"]},
+    ]
+    # Vectors put retention_period and the finance example closest to the query vector
+    vectors = [[0.1, 1.0], [0.2, 1.0], [0.3, 1.0], [1.0, 0.1], [0.1, 1.0], [1.0, 0.0]]
+    return LocalIndex(docs, vectors, dtype="float32")
+
+
+def test_hybrid_search_fuses_an_exact_term_into_the_vector_ranking():
+    index = local_index()
+    query = np.array([1.0, 0.0])
+    vector_only = index.search_sections(query, {"schema": 1})
+    assert vector_only["schema"][0]["attribute"] == "retention_period"
+    # Last by vector, first lexically: fused above the vector-only favourite
+    hybrid = index.search_sections(query, {"schema": 2}, query_text="cabinet_id")
+    assert [d["attribute"] for d in hybrid["schema"]] == ["cabinet_id", "retention_period"]
+
+
+def test_scope_mask_applies_before_ranking_in_both_rankings():
+    index = local_index()
+    query = np.array([1.0, 0.0])
+    anonymous = index.search_sections(query, {"example": 2}, query_text="finance retention")
+    assert [d["nl"] for d in anonymous["example"]] == ["list cabinets"]
+    finance = index.search_sections(query, {"example": 2}, query_text="finance retention",
+                                    scope=RequestScope(groups=["finance"]))
+    assert finance["example"][0]["nl"] == "finance retention rules"
+
+
+def test_schema_types_restrict_the_lexical_candidates_too():
+    index = local_index()
+    hits = index.search_sections(np.array([0.0, 1.0]), {"schema": 4}, schema_types=["record_class"],
+                                 query_text="cabinet_id")
+    assert {d["object_type"] for d in hits["schema"]} == {"record_class"}
@@ -0,0 +1,151 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+from dql_llm import FAILURES_BEFORE_COOLDOWN, MIN_SAMPLES_FOR_HEDGE, LLMScheduler, LLMUnavailableError, TokenBucket
+
+
+class FakeModel:
+    """Client whose n-th call sleeps delays[n] seconds (the last delay repeats), then answers or raises"""
+
+    def __init__(self, name, delays=(0,), error=None):
+        self.name = name
+        self.delays = list(delays)
+        self.error = error
+        self.calls = 0
+        self.finished = threading.Event()
+        self.lock = threading.Lock()
+
+    def __call__(self, prompt, timeout):
+        with self.lock:
+            delay = self.delays[min(self.calls, len(self.delays) - 1)]
+            self.calls += 1
+        time.sleep(delay)
+        self.finished.set()
+        if self.error:
+            raise self.error
+        return f"{self.name}: {prompt}"
+
+
+def scheduler(*models, deadline=1.0, hedge=False, **kwargs):
+    return LLMScheduler({m.name: m for m in models}, models[0].name,
+                        models[1].name if len(models) > 1 else None,
+                        deadline=deadline, requests_per_minute=6000, burst=10, hedge=hedge, **kwargs)
+
+
+def seed_latencies(llm, model_name, latency):
+    for _ in range(MIN_SAMPLES_FOR_HEDGE):
+        llm.stats[model_name].record_success(latency)
+
+
+def test_answers_from_the_primary():
+    llm = scheduler(FakeModel("strong"), FakeModel("fast"))
+    assert llm.generate("q") == ("strong: q", "strong")
+    assert len(llm.stats["strong"].latencies) == 1
+
+
+def test_errors_fail_over_to_the_fallback():
+    strong = FakeModel("strong", error=RuntimeError("503"))
+    llm = scheduler(strong, FakeModel("fast"))
+    assert llm.generate("q") == ("fast: q", "fast")
+    assert llm.stats["strong"].consecutive_failures == 1
+
+
+def test_a_stalled_primary_leaves_the_fallback_its_reserve():
+    strong = FakeModel("strong", delays=[0.5])
+    llm = scheduler(strong, FakeModel("fast"), deadline=0.3)
+    start = time.monotonic()
+    assert llm.generate("q") == ("fast: q", "fast")
+    assert time.monotonic() - start < 0.3
+
+
+def test_a_deadline_miss_counts_once_and_the_late_answer_is_ignored():
+    slow = FakeModel("strong", delays=[0.3])
+    llm = scheduler(slow, deadline=0.1)
+    with pytest.raises(LLMUnavailableError):
+        llm.generate("q")
+    assert slow.finished.wait(1)
+    time.sleep(0.05)
+    stats = llm.stats["strong"]
+    assert stats.consecutive_failures == 1
+    assert len(stats.latencies) == 0
+
+
+def test_an_erroring_call_counts_once():
+    llm = scheduler(FakeModel("strong", error=RuntimeError("boom")), deadline=0.5)
+    with pytest.raises(LLMUnavailableError):
+        llm.generate("q")
+    assert llm.stats["strong"].consecutive_failures == 1
+
+
+def test_a_hedged_duplicate_wins_when_the_primary_is_slower_than_its_p95():
+    strong = FakeModel("strong", delays=[0.5, 0])
+    llm = scheduler(strong, deadline=1.0, hedge=True)
+    seed_latencies(llm, "strong", 0.02)
+    start = time.monotonic()
+    assert llm.generate("q") == ("strong: q", "strong")
+    assert time.monotonic() - start < 0.3
+    assert strong.calls == 2
+    assert len(llm.stats["strong"].latencies) == MIN_SAMPLES_FOR_HEDGE + 1
+
+
+def test_no_hedge_when_a_typical_call_could_not_finish_in_time():
+    strong = FakeModel("strong", delays=[0.25, 0])
+    llm = scheduler(strong, deadline=0.35, hedge=True)
+    # The hedge point (p95 = 0.2s) leaves 0.15s, less than a typical (p50 = 0.2s) call
+    seed_latencies(llm, "strong", 0.2)
+    assert llm.generate("q") == ("strong: q", "strong")
+    assert strong.calls == 1
+
+
+def test_a_cooling_down_model_is_tried_last():
+    llm = scheduler(FakeModel("strong"), FakeModel("fast"))
+    for _ in range(FAILURES_BEFORE_COOLDOWN):
+        llm.stats["strong"].record_failure()
+    assert llm.route() == ["fast", "strong"]
+    assert llm.route(preferred="strong") == ["fast", "strong"]
+
+
+def test_a_model_too_slow_for_its_deadline_share_is_tried_last():
+    llm = scheduler(FakeModel("strong"), FakeModel("fast"), deadline=10.0)
+    assert llm.route() == ["strong", "fast"]
+    seed_latencies(llm, "strong", 9.0)
+    assert llm.route() == ["fast", "strong"]
+    seed_latencies(llm, "fast", 9.5)
+    assert llm.route() == ["strong", "fast"]
+
+
+def test_preferred_model_goes_first():
+    llm = scheduler(FakeModel("strong"), FakeModel("fast"))
+    assert llm.route(preferred="fast") == ["fast", "strong"]
+
+
+def test_no_capacity_before_the_deadline_fails_without_calling():
+    strong = FakeModel("strong")
+    llm = scheduler(strong, deadline=0.2)
+    llm.buckets["strong"] = TokenBucket(rate_per_second=0.1, burst=1)
+    llm.generate("first")
+    with pytest.raises(LLMUnavailableError):
+        llm.generate("second")
+    assert strong.calls == 1
+    assert llm.stats["strong"].consecutive_failures == 0
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate_per_second=20, burst=1)
+    assert bucket.acquire(0)
+    assert not bucket.acquire(0)
+    assert bucket.acquire(0.2)
+
+
+def test_the_quota_is_split_between_server_workers():
+    llm = LLMScheduler({"strong": FakeModel("strong")}, "strong", requests_per_minute=60, burst=5, workers=8)
+    bucket = llm.buckets["strong"]
+    assert bucket.rate == pytest.approx(60 / 60 / 8)
+    assert bucket.capacity == 1
+    assert LLMScheduler({"strong": FakeModel("strong")}, "strong", burst=5, workers=2).buckets["strong"].capacity == 2
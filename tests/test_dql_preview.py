@@ -0,0 +1,75 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+from dql_preview import FOLDERS_TABLE, SYSOBJECT_ATTRIBUTES, InvalidDQL, Translator, UnsupportedDQL
+
+TABLES = {"dm_document": dict(SYSOBJECT_ATTRIBUTES)}
+NOW = datetime(2026, 10, 19, 12, 0, 0)
+IN_FOLDER = f"r_object_id IN (SELECT r_object_id FROM {FOLDERS_TABLE} WHERE folder_path = ? AND object_type = ?)"
+
+
+def translate(dql, user=None):
+    return Translator(dql, TABLES, user=user, now=NOW).translate()
+
+
+@pytest.mark.parametrize("dql, sql, params", [
+    ("SELECT * FROM dm_document",
+     'SELECT * FROM "dm_document"', []),
+    ("SELECT COUNT(*) FROM dm_document WHERE owner_name = 'jsmith'",
+     'SELECT COUNT(*) FROM "dm_document" WHERE "owner_name" = ?', ["jsmith"]),
+    ("SELECT DISTINCT object_name, title FROM dm_document WHERE object_name LIKE 'inv%' OR title IS NULL",
+     'SELECT DISTINCT "object_name", "title" FROM "dm_document" WHERE "object_name" LIKE ? OR "title" IS NULL',
+     ["inv%"]),
+    ("SELECT object_name FROM dm_document WHERE a_content_type NOT IN ('pdf', 'msw8') ORDER BY r_modify_date DESC",
+     'SELECT "object_name" FROM "dm_document" WHERE "a_content_type" NOT IN (?, ?) ORDER BY "r_modify_date" DESC',
+     ["pdf", "msw8"]),
+    ("SELECT object_name FROM dm_document WHERE r_modify_date >= DATE(NOW - 7) AND r_content_size > 1000",
+     'SELECT "object_name" FROM "dm_document" WHERE "r_modify_date" >= ? AND "r_content_size" > ?',
+     ["2026-10-12 12:00:00", 1000]),
+    ("SELECT object_name FROM dm_document WHERE owner_name = USER",
+     'SELECT "object_name" FROM "dm_document" WHERE "owner_name" = ?', ["jsmith"]),
+    ("SELECT object_name FROM dm_document WHERE FOLDER('/pp12/')",
+     f'SELECT "object_name" FROM "dm_document" WHERE {IN_FOLDER}', ["/pp12", "dm_document"]),
+    ("```sql\nSELECT object_name FROM dm_document ENABLE(RETURN_TOP 5);\n```",
+     'SELECT "object_name" FROM "dm_document"', []),
+])
+def test_translates_supported_subset(dql, sql, params):
+    translated_sql, translated_params, _ = translate(dql, user="jsmith")
+    assert translated_sql == sql
+    assert translated_params == params
+
+
+@pytest.mark.parametrize("dql", [
+    "SELECT object_name AS name FROM dm_document",
+    "SELECT UPPER(object_name) FROM dm_document",
+    "SELECT object_name FROM dm_document WHERE UPPER(object_name) = 'X'",
+    "SELECT object_name FROM dm_document WHERE r_modify_date > DATEADD(day, -7, DATE(TODAY))",
+    "SELECT owner_name, COUNT(*) FROM dm_document GROUP BY owner_name",
+    "SELECT object_name FROM dm_document GROUP BY object_name",
+    "SELECT object_name FROM dm_document WHERE owner_name IN (SELECT user_name FROM dm_user)",
+    "SELECT object_name FROM dm_document ORDER BY 1",
+    "SELECT object_name FROM dm_document WHERE FOLDER(ID('0b0000018000a1b2'))",
+    "SELECT object_name FROM dm_document WHERE ANY keywords = 'x'",
+    "SELECT object_name FROM dm_folder",
+    "UPDATE dm_document OBJECTS SET title = 'x'",
+])
+def test_outside_the_subset_is_unsupported(dql):
+    with pytest.raises(UnsupportedDQL):
+        translate(dql)
+
+
+@pytest.mark.parametrize("dql", [
+    "SELECT no_such_attribute FROM dm_document",
+    "SELECT object_name FROM dm_document WHERE no_such_attribute = 'x'",
+    "SELECT object_name FROM dm_document ORDER BY no_such_attribute",
+    "SELECT object_name FROM dm_document WHERE r_modify_date > 5",
+    "SELECT object_name FROM dm_document WHERE CABINET('/pp12/sub')",
+])
+def test_invalid_queries_are_reported(dql):
+    with pytest.raises(InvalidDQL):
+        translate(dql)
@@ -0,0 +1,107 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+import dql_auth
+from dql_auth import AuthError, Principal, authenticate
+from dql_scope import RequestScope, ScopeMasks, keywords, scope_metadata
+
+DOCS = [
+    {"source_text": "public rule"},
+    {"source_text": "jsmith's note", "scope_users": ["jsmith"]},
+    {"source_text": "finance rule", "scope_groups": ["finance"]},
+    {"source_text": "pp cabinets", "cabinet_prefixes": ["pp"]},
+    {"source_text": "finance RIMA cabinets", "scope_groups": ["finance"], "cabinet_prefixes": ["rima_"]},
+]
+
+
+def visible(scope=None):
+    mask = ScopeMasks(DOCS).mask(scope)
+    return [d["source_text"] for d, shown in zip(DOCS, mask if mask is not None else [True] * len(DOCS)) if shown]
+
+
+def test_scope_metadata_normalizes_record_aliases():
+    record = {"owner": " JSmith ", "team": ["Finance", "finance", ""], "prefix": "PP"}
+    assert scope_metadata(record) == {"scope_users": ["jsmith"], "scope_groups": ["finance"],
+                                      "cabinet_prefixes": ["pp"]}
+    assert keywords(None) == []
+
+
+def test_anonymous_requests_see_only_unrestricted_documents():
+    assert visible() == ["public rule", "pp cabinets"]
+
+
+def test_users_and_groups_unlock_their_documents():
+    assert visible(RequestScope(user="JSmith")) == ["public rule", "jsmith's note", "pp cabinets"]
+    assert visible(RequestScope(groups=["finance"])) == [
+        "public rule", "finance rule", "pp cabinets", "finance RIMA cabinets"]
+
+
+def test_cabinet_prefixes_keep_untagged_and_matching_documents():
+    assert visible(RequestScope(groups=["finance"], cabinet_prefixes=["RIMA_"])) == [
+        "public rule", "finance rule", "finance RIMA cabinets"]
+
+
+def test_no_mask_when_nothing_is_restricted_or_tagged():
+    assert ScopeMasks([{"source_text": "a"}, {"source_text": "b"}]).mask(RequestScope(cabinet_prefixes=["pp"])) is None
+
+
+def test_es_filters_mirror_the_masks():
+    filters = RequestScope(user="jsmith", groups=["finance"], cabinet_prefixes=["pp"]).es_filters()
+    access, cabinets = filters
+    should = access["bool"]["should"]
+    assert {"term": {"scope_users": "jsmith"}} in should
+    assert {"terms": {"scope_groups": ["finance"]}} in should
+    assert {"terms": {"cabinet_prefixes": ["pp"]}} in cabinets["bool"]["should"]
+    assert len(RequestScope().es_filters()) == 1
+
+
+def test_scope_key_differs_by_identity():
+    assert RequestScope("jsmith").key() != RequestScope("adoe").key()
+    assert RequestScope(groups=["b", "a"]).key() == RequestScope(groups=["a", "b"]).key()
+
+
+def test_principal_from_token_claims():
+    principal = Principal.from_claims({"preferred_username": "JSmith@corp.example",
+                                       "groups": ["Finance"], "roles": ["DQL.Admin"]})
+    assert principal.user == "jsmith"
+    assert principal.groups == ["dql.admin", "finance"]
+
+
+def test_body_groups_only_narrow_the_principal_scope():
+    principal = Principal("jsmith", ["finance", "legal"])
+    assert principal.scope().groups == ["finance", "legal"]
+    assert principal.scope(groups=["legal", "admins"]).groups == ["legal"]
+    scope = principal.scope(cabinet_prefixes=["pp"])
+    assert (scope.user, scope.cabinet_prefixes) == ("jsmith", ["pp"])
+
+
+def test_without_a_tenant_requests_are_anonymous(monkeypatch):
+    monkeypatch.setattr(dql_auth, "verifier", None)
+    principal = authenticate("Bearer anything")
+    assert principal.user is None and principal.groups == []
+
+
+class FakeVerifier:
+    def claims(self, token):
+        if token != "good":
+            raise AuthError("Invalid access token")
+        return {"preferred_username": "jsmith@corp.example", "groups": ["finance"]}
+
+
+@pytest.mark.parametrize("header", [None, "", "Basic good", "Bearer ", "Bearer forged"])
+def test_missing_or_bad_tokens_are_rejected(monkeypatch, header):
+    monkeypatch.setattr(dql_auth, "verifier", FakeVerifier())
+    with pytest.raises(AuthError):
+        authenticate(header)
+
+
+def test_verified_tokens_give_the_principal(monkeypatch):
+    monkeypatch.setattr(dql_auth, "verifier", FakeVerifier())
+    principal = authenticate("Bearer good")
+    assert (principal.user, principal.groups) == ("jsmith", ["finance"])
+    assert np.array_equal(ScopeMasks(DOCS).mask(principal.scope()), [True, True, True, True, True])
@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+from dql_cache import LocalCache
+from dql_sessions import MAX_TURNS, Session, SessionStore
+
+CABINET_RULE = {"source_text": "Cabinets are dm_cabinet objects"}
+PDF_RULE = {"source_text": "a_content_type = 'pdf' selects PDFs"}
+
+
+class SharedCache(LocalCache):
+    """Stands in for RedisCache: shared, and values go through JSON like they would over the wire"""
+    shared = True
+
+    def get(self, key):
+        value = super().get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        super().set(key, json.dumps(value))
+
+
+def test_merge_returns_only_unseen_docs():
+    session = Session("s")
+    assert session.merge_context({"rules": [CABINET_RULE], "schema": []}) == {"rules": [CABINET_RULE], "schema": []}
+    delta = session.merge_context({"rules": [dict(CABINET_RULE), PDF_RULE], "formatted": "ignored"})
+    assert delta == {"rules": [PDF_RULE]}
+    assert session.context == {"rules": [CABINET_RULE, PDF_RULE], "schema": []}
+
+
+def test_turns_are_capped_to_the_most_recent():
+    session = Session("s")
+    for i in range(MAX_TURNS + 2):
+        session.add_turn(f"nl {i}", f"dql {i}")
+    assert len(session.turns) == MAX_TURNS
+    assert session.turns[0]["nl"] == "nl 2"
+    assert session.last_dql == f"dql {MAX_TURNS + 1}"
+
+
+def test_round_trip_keeps_what_was_seen():
+    session = Session("s")
+    session.add_turn("documents in pp12", "SELECT * FROM dm_document WHERE FOLDER('/pp12')")
+    session.merge_context({"rules": [CABINET_RULE]})
+    session.user_context = [{"content": "works in finance"}]
+
+    restored = Session.from_dict(json.loads(json.dumps(session.to_dict())))
+    assert restored.turns == session.turns
+    assert restored.user_context == session.user_context
+    assert restored.merge_context({"rules": [CABINET_RULE, PDF_RULE]}) == {"rules": [PDF_RULE]}
+
+
+def test_sessions_continue_until_idle_past_the_ttl():
+    store = SessionStore(ttl=0.1)
+    session = store.get_or_create()
+    session.add_turn("q", "SELECT 1")
+    time.sleep(0.06)
+    assert store.get_or_create(session.id) is session
+    time.sleep(0.06)
+    # Touched 0.06s ago, so still live
+    assert store.get_or_create(session.id).last_dql == "SELECT 1"
+    time.sleep(0.12)
+    expired = store.get_or_create(session.id)
+    assert expired is not session
+    assert expired.id == session.id and expired.turns == []
+
+
+def test_least_recently_used_sessions_are_evicted_past_the_limit():
+    store = SessionStore(max_sessions=2)
+    first, second = store.get_or_create("a"), store.get_or_create("b")
+    store.get_or_create("a")
+    store.get_or_create("c")
+    store.get_or_create("d")
+    assert list(store.sessions) == ["c", "d"]
+    assert store.get_or_create("a") is not first
+    assert second.id not in store.sessions
+
+
+def test_drop_forgets_the_session():
+    store = SessionStore()
+    session = store.get_or_create()
+    store.drop(session.id)
+    assert store.get_or_create(session.id) is not session
+
+
+def test_shared_sessions_continue_on_another_worker():
+    cache = SharedCache("sessions", ttl=60)
+    worker_a, worker_b = SessionStore(cache=cache), SessionStore(cache=cache)
+
+    session = worker_a.get_or_create()
+    session.add_turn("documents in pp12", "SELECT * FROM dm_document WHERE FOLDER('/pp12')")
+    session.merge_context({"rules": [CABINET_RULE]})
+    worker_a.save(session)
+
+    continued = worker_b.get_or_create(session.id)
+    assert continued.last_dql == session.last_dql
+    assert continued.merge_context({"rules": [CABINET_RULE]}) == {"rules": []}
+
+    worker_b.drop(session.id)
+    assert worker_a.get_or_create(session.id).turns == []
+
+
+def test_shared_sessions_expire_with_the_cache():
+    cache = SharedCache("sessions", ttl=0.05)
+    store = SessionStore(cache=cache)
+    session = store.get_or_create()
+    session.add_turn("q", "SELECT 1")
+    store.save(session)
+    time.sleep(0.08)
+    assert store.get_or_create(session.id).turns == []
+
+
+def test_a_local_cache_is_not_used_for_sessions():
+    store = SessionStore(cache=LocalCache("sessions", ttl=60))
+    assert store.cache is None
+    session = store.get_or_create()
+    assert store.get_or_create(session.id) is session
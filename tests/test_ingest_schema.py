@@ -0,0 +1,98 @@
+import json
+import os
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "backend"))
+from ingest_schema import SCHEMA_INPUTS, ingest_schema, iter_rows, normalize_datatype, normalize_name, normalize_row
+
+BUSINESS_DOC_SCHEMA = os.path.join(PROJECT_ROOT, "context", "business_doc_schema.json")
+
+
+@pytest.mark.parametrize("value, length, expected", [
+    ("|char(128)", None, "Char (128)"),
+    ("Char (14 )", None, "Char (14)"),
+    (" |Char(8)| ", None, "Char (8)"),
+    ("“Ichar(5)", None, "Char (5)"),
+    ("Time/ Date", None, "Time/Date"),
+    ("2", "32", "Char (32)"),
+    ("4", None, "Time/Date"),
+    ("|||)", None, None),
+    ("char", None, None),
+])
+def test_normalize_datatype(value, length, expected):
+    assert normalize_datatype(value, length) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("]edm_cd_quarter", "edm_cd_quarter"),
+    ("Object_Name ", "object_name"),
+    ("aucopromote||", "aucopromote"),
+    ("[Samia", "samia"),
+    ("comments.", "comments"),
+    ("edm cd", "edmcd"),
+    ("'", None),
+])
+def test_normalize_name(value, expected):
+    assert normalize_name(value) == expected
+
+
+def test_pipe_prefixed_rows_of_the_real_business_doc_schema_survive():
+    records = [r for r in map(normalize_row, iter_rows(BUSINESS_DOC_SCHEMA)) if r]
+    types = {r["attribute"]: r["type"] for r in records}
+    assert types["axtifact_id"] == "Char (128)"
+    assert types["edm_cd_quarter"] == "Char (10)"
+    assert types["jedm_cd_au_no"] == "Char (8)"
+    assert types["doc_cat_cd"] == "Char (5)"
+    assert all(r["object_type"] == "business_doc" for r in records)
+
+
+def test_base_inputs_are_ingested(tmp_path):
+    output = tmp_path / "catalog.jsonl"
+    stats = ingest_schema(output_path=str(output))
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert stats["written"] == len(records)
+    assert {r["object_type"] for r in records} >= {"business_cab", "record_class", "business_doc"}
+    assert len({(r["object_type"], r["attribute"]) for r in records}) == len(records)
+    assert all(set(r) == {"object_type", "attribute", "type", "description", "source_text"} for r in records)
+    assert len(SCHEMA_INPUTS) == 2
+
+
+def write_dump(path, rows):
+    path.write_text("\n".join(json.dumps(row) for row in rows) + "\n")
+    return str(path)
+
+
+def ingest(tmp_path, rows):
+    output = tmp_path / "catalog.jsonl"
+    ingest_schema([write_dump(tmp_path / "dump.jsonl", rows)], str(output), include_defaults=False)
+    return [(r["object_type"], r["attribute"]) for r in map(json.loads, output.read_text().splitlines())]
+
+
+SUBTYPES_FIRST = [
+    {"type_name": "business_doc", "super_name": "dm_document", "attr_name": "object_name", "attr_type": "2", "attr_length": "255"},
+    {"type_name": "business_doc", "super_name": "dm_document", "attr_name": "doc_cat_cd", "attr_type": "2", "attr_length": "5"},
+    {"type_name": "dm_document", "super_name": "dm_sysobject", "attr_name": "object_name", "attr_type": "2", "attr_length": "255"},
+    {"type_name": "dm_document", "super_name": "dm_sysobject", "attr_name": "a_content_type", "attr_type": "2", "attr_length": "32"},
+    {"type_name": "dm_sysobject", "attr_name": "object_name", "attr_type": "2", "attr_length": "255"},
+]
+
+
+@pytest.mark.parametrize("rows", [SUBTYPES_FIRST, list(reversed(SUBTYPES_FIRST))])
+def test_inherited_attributes_are_dropped_whatever_the_row_order(tmp_path, rows):
+    assert sorted(ingest(tmp_path, rows)) == [
+        ("business_doc", "doc_cat_cd"),
+        ("dm_document", "a_content_type"),
+        ("dm_sysobject", "object_name"),
+    ]
+
+
+def test_explicitly_inherited_rows_and_duplicates_are_dropped(tmp_path):
+    rows = [
+        {"type_name": "business_doc", "attr_name": "r_object_id", "attr_type": "3", "inherited": "1"},
+        {"type_name": "business_doc", "attr_name": "doc_cat_cd", "attr_type": "|char(5)"},
+        {"type_name": "business_doc", "attr_name": "doc_cat_cd", "attr_type": "Char(5)"},
+    ]
+    assert ingest(tmp_path, rows) == [("business_doc", "doc_cat_cd")]